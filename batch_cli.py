@@ -0,0 +1,222 @@
+# batch_cli.py
+"""
+Headless batch scanner: runs the full Sentinel analysis over many videos with a pool of
+worker processes and streams one JSON line per clip to the output file.
+
+    python batch_cli.py /data/incoming -o results.jsonl -j 4
+    python batch_cli.py "clips/**/*.mp4" manifest.jsonl -o results.jsonl --parquet results.parquet
+
+Inputs can be directories (scanned recursively), glob patterns, video files, or JSONL
+manifests whose lines carry a "path" (or "video") field. Re-running with the same output
+file resumes: clips that already have an "ok" record are skipped.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from modules.orchestrator import analyze_video, init_batch_worker
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"}
+# Fields of the analysis that go into each output record (embeddings stay out of the JSONL)
+STAGE_FIELDS = ["face_score", "gaze_score", "zsl_anomaly_score", "sync_score", "content_risk_score", "face_report"]
+
+
+def _is_video(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def _read_manifest(path):
+    videos = []
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"!! [Batch] Skipping malformed line {line_number} of {path}")
+                continue
+            video = entry.get("path") or entry.get("video")
+            if not video:
+                print(f"!! [Batch] Line {line_number} of {path} has no 'path' field")
+                continue
+            videos.append(video if os.path.isabs(video) else os.path.join(base, video))
+    return videos
+
+
+def collect_videos(inputs):
+    """Expands directories, globs, files and JSONL manifests into a de-duplicated list of video paths."""
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                videos += sorted(os.path.join(root, name) for name in files if _is_video(name))
+        elif item.endswith(".jsonl") and os.path.isfile(item):
+            videos += _read_manifest(item)
+        elif os.path.isfile(item):
+            videos.append(item)
+        else:
+            matches = sorted(p for p in glob.glob(item, recursive=True) if os.path.isfile(p) and _is_video(p))
+            if not matches:
+                print(f"!! [Batch] No videos found for '{item}'")
+            videos += matches
+    seen, unique = set(), []
+    for video in videos:
+        key = os.path.abspath(video)
+        if key not in seen:
+            seen.add(key)
+            unique.append(key)
+    return unique
+
+
+def completed_paths(output_path):
+    """Paths that already have a successful record in the output file (the resume log)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # A line cut short by an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["path"])
+    return done
+
+
+def _analyze(path, max_frames_to_check, shard_workers):
+    """Runs inside a worker process. Never raises, so one bad clip can't take the run down."""
+    record = {"path": path, "worker_pid": os.getpid()}
+    try:
+        summary, results, seconds = analyze_video(path, max_frames_to_check=max_frames_to_check,
+                                                  shard_workers=shard_workers)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+        return record
+    record.update(status="ok", seconds=round(seconds, 2), content_hash=results["content_hash"],
+                  technical_score=summary["technical_score"], confidence=round(summary["confidence"], 1),
+                  transcribed_text=summary["transcribed_text"], risk_justification=summary["risk_justification"],
+                  risk_windows=summary["risk_windows"], shard_breakdown=summary["shard_breakdown"])
+    record.update({field: results.get(field) for field in STAGE_FIELDS})
+    return record
+
+
+def export_parquet(output_path, parquet_path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("!! [Batch] Parquet export needs pyarrow (pip install pyarrow); the JSONL output is complete.")
+        return False
+    latest = {}
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            latest[record["path"]] = record # Later records (e.g. a successful retry) win
+    # Nested fields are stored as JSON strings so every row shares one flat schema
+    rows = [{k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in r.items()} for r in latest.values()]
+    pq.write_table(pa.Table.from_pylist(rows), parquet_path)
+    print(f"-> [Batch] Wrote {len(rows)} records to {parquet_path}")
+    return True
+
+
+def default_workers():
+    # Every worker holds its own copy of TensorFlow, Whisper and MediaPipe, and runs them with
+    # a few threads each, so one worker per 4 cores keeps both memory and cores in check.
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+def run_batch(videos, output_path, workers, max_frames_to_check=48, warm_up=True, shard_workers=1):
+    """Analyzes `videos` across `workers` processes, appending each record to `output_path` as it finishes."""
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_batch_worker,
+        initargs=(threads, warm_up),
+    )
+    print(f"-> [Batch] Analyzing {len(videos)} videos with {workers} worker(s) x {threads} thread(s)...")
+
+    start = time.perf_counter()
+    succeeded = failed = 0
+    queue = iter(videos)
+    pending = set()
+    try:
+        with open(output_path, "a") as out:
+            while True:
+                # Keep a bounded number of clips in flight so huge batches don't pile up futures
+                while len(pending) < workers * 2:
+                    path = next(queue, None)
+                    if path is None:
+                        break
+                    pending.add(executor.submit(_analyze, path, max_frames_to_check, shard_workers))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    out.write(json.dumps(record) + "\n")
+                    out.flush() # Every finished clip is durable, so an interrupted run resumes from here
+                    if record["status"] == "ok":
+                        succeeded += 1
+                        print(f"-> [Batch] {record['path']}: technical {record['technical_score']}/100, "
+                              f"content risk {record['content_risk_score']}/100 ({record['seconds']}s)")
+                    else:
+                        failed += 1
+                        print(f"!! [Batch] {record['path']}: {record['error']}")
+    except KeyboardInterrupt:
+        print("!! [Batch] Interrupted; re-run the same command to resume.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    clips_per_hour = (succeeded + failed) / elapsed * 3600 if elapsed > 0 else 0.0
+    print(f"-> [Batch] Done: {succeeded} ok, {failed} failed in {elapsed:.0f}s "
+          f"({clips_per_hour:.0f} clips/hour with {workers} worker(s)).")
+    return succeeded, failed, clips_per_hour
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Sentinel's analysis headlessly over many videos.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns, video files or JSONL manifests")
+    parser.add_argument("-o", "--output", default="sentinel_results.jsonl", help="JSONL output (also the resume log)")
+    parser.add_argument("-j", "--workers", type=int, default=default_workers(), help="Worker processes")
+    parser.add_argument("--parquet", help="Also export the results to this Parquet file (needs pyarrow)")
+    parser.add_argument("--max-frames", type=int, default=48, help="Frame budget of the facial consistency check")
+    parser.add_argument("--shard-workers", type=int, default=1,
+                        help="Processes per long recording; long clips are analyzed in time shards (modules/sharding.py)")
+    parser.add_argument("--no-resume", action="store_true", help="Re-analyze clips that already have a result")
+    parser.add_argument("--no-warm-up", action="store_true", help="Load models on first use instead of at worker start")
+    args = parser.parse_args(argv)
+
+    videos = collect_videos(args.inputs)
+    if not args.no_resume:
+        done = completed_paths(args.output)
+        if done:
+            print(f"-> [Batch] Resuming: {len(done)} clips already have results in {args.output}")
+        videos = [v for v in videos if v not in done]
+
+    if videos:
+        run_batch(videos, args.output, max(1, args.workers), args.max_frames, warm_up=not args.no_warm_up,
+                  shard_workers=max(1, args.shard_workers))
+    else:
+        print("-> [Batch] Nothing to analyze.")
+    if args.parquet and os.path.exists(args.output):
+        export_parquet(args.output, args.parquet)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
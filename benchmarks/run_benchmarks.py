@@ -0,0 +1,317 @@
+# benchmarks/run_benchmarks.py
+"""
+Times every analysis module, and the whole pipeline, on synthetic clips against a stub
+Ollama server, and stores the numbers as JSON so regressions can be compared across commits.
+
+    python -m benchmarks.run_benchmarks                          # quick preset, 3 warm iterations
+    python -m benchmarks.run_benchmarks --preset full -n 5 --targets face gaze full_analysis
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<baseline>.json
+
+Run it from the repository root. Every (target, clip) pair runs in a fresh worker process,
+so model loading is measured (cold_seconds) and peak RSS is per target; the first call is
+the cold one and the next `-n` calls give the p50/p95 latencies. Video targets report clip
+seconds processed per second (comparable across sampling changes) and the frames each analyzer
+actually examined, from its telemetry annotations; the face and gaze targets also report those
+examined frames per second. Audio targets report the real-time factor (p50 over clip length,
+below 1 is faster than real time). Result caches are bypassed and the in-process LLM memo
+is cleared before every call, so each iteration does the full work.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+from .synthetic_media import PRESETS, ensure_media
+from .stub_ollama import DEFAULT_LATENCY_SECONDS, DEFAULT_TOKEN_DELAY_SECONDS, start_stub_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+RESULT_SCHEMA = 2
+# A target counts as regressed when its p50 (or peak RSS) grows by more than this fraction
+REGRESSION_THRESHOLD = 0.10
+WORKER_TIMEOUT_SECONDS = 3600
+
+# The LLM targets score these: the alarmist one takes the local-triage fast path, the others escalate
+SAMPLE_TEXTS = [
+    "According to the ministry, the quarterly report was published on Monday and shows flat revenue.",
+    "URGENT!!! The banks are collapsing, withdraw your money NOW before it's too late! Share this!",
+    "People are saying the new policy might change things for families, and some are worried about it.",
+]
+
+
+# --- Targets (each runs inside a worker process) ---
+# A target factory does the untimed setup for one clip and returns the callable that is timed.
+
+def _face_target(clip):
+    from modules.face_analyzer import analyze_facial_consistency
+    # The app's settings: adaptive sampling with a 48-frame budget
+    return lambda: analyze_facial_consistency(clip["path"], max_frames_to_check=48, adaptive=True)
+
+
+def _gaze_target(clip):
+    from modules.gaze_analyzer import analyze_gaze_and_blinking_mediapipe
+    return lambda: analyze_gaze_and_blinking_mediapipe(clip["path"], fast=True)
+
+
+def _clip_audio(clip):
+    from modules.audio_buffer import decode_audio, silent_audio
+    samples = decode_audio(clip["path"])
+    return samples if samples is not None else silent_audio()
+
+
+def _zero_shot_target(clip):
+    from modules.zero_shot_analyzer import run_zero_shot_detection
+    samples = _clip_audio(clip)
+    return lambda: run_zero_shot_detection(samples)
+
+
+def _audio_content_target(clip):
+    from modules.intelligence_analyzer import analyze_audio_and_content
+    samples = _clip_audio(clip)
+    return lambda: analyze_audio_and_content(samples)
+
+
+def _interrogation_target(clip):
+    from modules.interrogator import run_interrogation
+    return lambda: [run_interrogation(text) for text in SAMPLE_TEXTS]
+
+
+def _virality_target(clip):
+    from modules.spread_predictor import predict_virality
+    return lambda: [predict_virality(text) for text in SAMPLE_TEXTS]
+
+
+def _full_analysis_target(clip):
+    from modules.orchestrator import run_full_analysis
+    return lambda: run_full_analysis(clip["path"], report=lambda message: None, use_cache=False)
+
+
+# name -> (factory, kind); "video" and "audio" targets run once per clip, "text" targets once
+TARGETS = {
+    "face": (_face_target, "video"),
+    "gaze": (_gaze_target, "video"),
+    "zero_shot": (_zero_shot_target, "audio"),
+    "audio_content": (_audio_content_target, "audio"),
+    "interrogation": (_interrogation_target, "text"),
+    "virality": (_virality_target, "text"),
+    "full_analysis": (_full_analysis_target, "video"),
+}
+
+
+def _peak_rss_mb(who):
+    import resource
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB on Linux
+
+
+def _clear_memos():
+    llm_client = sys.modules.get("modules.llm_client")
+    if llm_client is not None:
+        llm_client._memo.clear()
+
+
+def _frames_examined(trace):
+    """Frames the face and gaze analyzers actually examined in one run, from their telemetry annotations."""
+    from modules import telemetry
+    counts = {}
+    for _, node in telemetry.flatten(trace):
+        for attribute, analyzer in (("face_frames_examined", "face"), ("gaze_frames_analyzed", "gaze")):
+            if attribute in node["attributes"]:
+                counts[analyzer] = counts.get(analyzer, 0) + node["attributes"][attribute]
+    return counts
+
+
+def run_worker(target, clip, iterations, result_path):
+    """Runs one target cold once and warm `iterations` times, and writes the timings to result_path."""
+    import resource
+    from modules import telemetry
+    factory, _ = TARGETS[target]
+    run = factory(clip)
+    timings = []
+    for _ in range(iterations + 1):
+        _clear_memos()
+        start = time.perf_counter()
+        with telemetry.span("benchmark", export=False) as trace:
+            run()
+        timings.append(time.perf_counter() - start)
+    if target == "full_analysis":
+        from modules.orchestrator import shutdown_stages
+        shutdown_stages() # Reaps the stage processes, so their peak RSS shows up in RUSAGE_CHILDREN
+    with open(result_path, "w") as f:
+        json.dump({"cold_seconds": timings[0], "warm_seconds": timings[1:],
+                   "frames_examined": _frames_examined(trace.to_dict()),
+                   "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+                   "peak_child_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN)}, f)
+
+
+# --- Driver ---
+
+def percentile(values, q):
+    """Linearly interpolated q-th percentile (0-100) of a non-empty list."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(status) if status is not None else None}
+
+
+def _run_in_worker(target, clip, iterations, env, verbose):
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = os.path.join(tmp, "result.json")
+        cmd = [sys.executable, "-m", "benchmarks.run_benchmarks", "--worker", target,
+               "--clip", json.dumps(clip), "-n", str(iterations), "--result-file", result_path]
+        output = None if verbose else subprocess.PIPE
+        proc = subprocess.run(cmd, cwd=REPO_ROOT, env=env, stdout=output, stderr=subprocess.STDOUT if output else None,
+                              text=True, timeout=WORKER_TIMEOUT_SECONDS)
+        if proc.returncode != 0 or not os.path.exists(result_path):
+            tail = (proc.stdout or "").strip().splitlines()[-5:]
+            return {"error": f"worker exited with {proc.returncode}: " + " | ".join(tail)}
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def run_suite(targets, clips, iterations, stub=None, ollama_url=None, verbose=False):
+    """Runs every target on its clips and returns the list of result records."""
+    cache_dir = tempfile.mkdtemp(prefix="sentinel-bench-cache-")
+    env = dict(os.environ, OLLAMA_URL=ollama_url or stub.url, SENTINEL_CACHE_DIR=cache_dir)
+    env.pop("SENTINEL_WARMUP", None)
+    try:
+        return [record for target in targets for record in _run_target(target, clips, iterations, env, stub, verbose)]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _run_target(target, clips, iterations, env, stub, verbose):
+    """Runs one target on each of its clips (or once, for text targets) and returns its records."""
+    records = []
+    kind = TARGETS[target][1]
+    for clip in (clips if kind != "text" else [None]):
+        label = f"{target} on {clip['name']}" if clip else target
+        print(f"-> [Bench] {label}...")
+        requests_before = stub.requests_served if stub else 0
+        measured = _run_in_worker(target, clip, iterations, env, verbose)
+        record = {"target": target, "clip": clip["name"] if clip else None, "iterations": iterations}
+        if "error" in measured:
+            print(f"!! [Bench] {label} failed: {measured['error']}")
+            records.append(dict(record, error=measured["error"]))
+            continue
+        warm = measured["warm_seconds"] or [measured["cold_seconds"]]
+        p50 = percentile(warm, 50)
+        record.update(cold_seconds=round(measured["cold_seconds"], 4), p50_seconds=round(p50, 4),
+                      p95_seconds=round(percentile(warm, 95), 4), mean_seconds=round(sum(warm) / len(warm), 4),
+                      peak_rss_mb=round(measured["peak_rss_mb"], 1), peak_child_rss_mb=round(measured["peak_child_rss_mb"], 1))
+        if clip:
+            record["realtime_factor"] = round(p50 / clip["seconds"], 4)
+            if kind == "video":
+                record["clip_seconds_per_second"] = round(clip["seconds"] / p50, 2)
+                frames = measured.get("frames_examined") or {}
+                if frames:
+                    record["frames_examined"] = frames
+                if frames.get(target): # The face and gaze targets: their own analyzer's throughput
+                    record["frames_per_second"] = round(frames[target] / p50, 1)
+        if stub:
+            record["llm_requests_per_call"] = round((stub.requests_served - requests_before) / (iterations + 1), 2)
+        records.append(record)
+        print(f"-> [Bench] {label}: p50 {p50:.3f}s, p95 {record['p95_seconds']:.3f}s, "
+              f"cold {record['cold_seconds']:.2f}s, peak RSS {record['peak_rss_mb']:.0f} MB")
+    return records
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Prints a per-target comparison against a baseline run. Returns the list of regressed keys."""
+    def key(record):
+        return (record["target"], record.get("clip"))
+    previous = {key(r): r for r in baseline["results"] if "error" not in r}
+    print(f"-> [Bench] Comparing with {(baseline['git'].get('commit') or '?')[:10]} (threshold {threshold:.0%}):")
+    regressions = []
+    for record in current["results"]:
+        old = previous.get(key(record))
+        if old is None or "error" in record:
+            continue
+        name = f"{record['target']}" + (f" [{record['clip']}]" if record.get("clip") else "")
+        time_ratio = record["p50_seconds"] / old["p50_seconds"] if old["p50_seconds"] else 1.0
+        rss_ratio = record["peak_rss_mb"] / old["peak_rss_mb"] if old["peak_rss_mb"] else 1.0
+        regressed = time_ratio > 1 + threshold or rss_ratio > 1 + threshold
+        if regressed:
+            regressions.append(key(record))
+        print(f"   {'!!' if regressed else '  '} {name:<32} p50 {old['p50_seconds']:.3f}s -> {record['p50_seconds']:.3f}s "
+              f"({time_ratio - 1:+.0%}), peak RSS {old['peak_rss_mb']:.0f} -> {record['peak_rss_mb']:.0f} MB ({rss_ratio - 1:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Sentinel's analysis modules.")
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=list(TARGETS))
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick", help="Which synthetic clips to use")
+    parser.add_argument("-n", "--iterations", type=int, default=3, help="Warm iterations per target (after one cold call)")
+    parser.add_argument("--face-image", help="Use this photo as the face in the synthetic clips")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY_SECONDS, help="Stub Ollama time to first token")
+    parser.add_argument("--token-delay", type=float, default=DEFAULT_TOKEN_DELAY_SECONDS, help="Stub Ollama seconds per token")
+    parser.add_argument("--ollama-url", help="Benchmark against this real Ollama /api/chat instead of the stub")
+    parser.add_argument("-o", "--output", help="Result JSON path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="A previous result JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Regression threshold (fraction)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the modules' own output")
+    # Internal: run one target inside a worker process
+    parser.add_argument("--worker", choices=sorted(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument("--clip", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker, json.loads(args.clip), args.iterations, args.result_file)
+        return 0
+
+    clips = ensure_media(args.preset, args.face_image)
+    stub = None
+    if not args.ollama_url:
+        stub = start_stub_server(latency=args.latency, token_delay=args.token_delay)
+        print(f"-> [Bench] Stub Ollama at {stub.url} (latency {args.latency}s, {args.token_delay}s/token)")
+    started = datetime.now(timezone.utc)
+    records = run_suite(args.targets, clips, max(0, args.iterations), stub, args.ollama_url, args.verbose)
+    if stub:
+        stub.shutdown()
+
+    git = _git_info()
+    result = {
+        "schema": RESULT_SCHEMA, "created_at": started.isoformat(), "git": git,
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpu_count": os.cpu_count(), "processor": platform.processor()},
+        "config": {"preset": args.preset, "iterations": args.iterations, "face_image": args.face_image,
+                   "llm": args.ollama_url or {"stub_latency": args.latency, "stub_token_delay": args.token_delay}},
+        "results": records,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{started.strftime('%Y%m%dT%H%M%S')}-{(git['commit'] or 'unknown')[:10]}{'-dirty' if git['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"-> [Bench] Wrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            return 1
+    return 1 if any("error" in r for r in records) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
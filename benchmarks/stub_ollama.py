@@ -0,0 +1,147 @@
+# benchmarks/stub_ollama.py
+"""
+A local stand-in for Ollama's /api/chat, so the LLM-bound modules can be benchmarked
+without a GPU or a model download. It answers every prompt the modules send in the format
+they parse (risk "Score: N. Justification: ...", a bare emotion number, free text for the
+interrogator), deterministically per prompt, after a configurable time-to-first-token and
+per-token delay. Streaming requests get Ollama's NDJSON stream over chunked encoding.
+
+    python -m benchmarks.stub_ollama --port 11435 --latency 0.8 --token-delay 0.02
+    OLLAMA_URL=http://127.0.0.1:11435/api/chat streamlit run main_app.py
+"""
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_LATENCY_SECONDS = 0.5
+DEFAULT_TOKEN_DELAY_SECONDS = 0.02
+
+
+def _prompt_number(text, low, high):
+    """A stable pseudo-random number in [low, high] for a prompt, so reruns get identical replies."""
+    digest = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    return low + digest % (high - low + 1)
+
+
+def canned_reply(messages):
+    """The reply a module expects for these messages."""
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    prompt = " ".join(m.get("content", "") for m in messages if m.get("role") == "user")
+    if "risk score" in system:
+        score = _prompt_number(prompt, 5, 95)
+        return f"Score: {score}. Justification: Stub assessment of {len(prompt.split())} words of text."
+    if "emotional intensity" in prompt:
+        return str(_prompt_number(prompt, 10, 90))
+    if "pirate" in prompt:
+        return "Arr, matey! " + " ".join(prompt.split()[-40:])
+    if "intent" in prompt:
+        return "The likely intent of the author is to persuade, using urgency and emotionally loaded framing."
+    return "Stub response."
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like Ollama, so the client's connection pool is exercised
+
+    def log_message(self, format, *args):
+        pass # One line per request would drown the benchmark output
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "llama3:latest"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        server = self.server
+        with server.lock:
+            server.requests_served += 1
+        model = request.get("model", "llama3")
+        reply = canned_reply(request.get("messages", []))
+        tokens = reply.split(" ")
+        tokens = [token + " " for token in tokens[:-1]] + tokens[-1:]
+
+        time.sleep(server.latency)
+        if not request.get("stream", True): # Ollama streams unless told not to
+            time.sleep(server.token_delay * len(tokens))
+            self._send_json(200, {"model": model, "message": {"role": "assistant", "content": reply}, "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            line = {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+            self._send_chunk(json.dumps(line).encode("utf-8") + b"\n")
+            time.sleep(server.token_delay)
+        self._send_chunk(json.dumps({"model": model, "message": {"role": "assistant", "content": ""},
+                                     "done": True}).encode("utf-8") + b"\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=DEFAULT_LATENCY_SECONDS, token_delay=DEFAULT_TOKEN_DELAY_SECONDS):
+        super().__init__(address, StubOllamaHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.requests_served = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/chat"
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=DEFAULT_LATENCY_SECONDS, token_delay=DEFAULT_TOKEN_DELAY_SECONDS):
+    """Starts the stub on a background thread (port 0 picks a free port) and returns the server; see .url."""
+    server = StubOllamaServer((host, port), latency, token_delay)
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a stub of Ollama's /api/chat for benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY_SECONDS, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=DEFAULT_TOKEN_DELAY_SECONDS, help="Seconds between tokens")
+    args = parser.parse_args(argv)
+    server = StubOllamaServer((args.host, args.port), args.latency, args.token_delay)
+    print(f"-> [Stub Ollama] Serving {server.url} (latency {args.latency}s, {args.token_delay}s/token)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# benchmarks/synthetic_media.py
+"""
+Deterministic test clips for the benchmarks: a face that drifts across a textured
+background and blinks on a fixed schedule, with a speech-like soundtrack, at a chosen length
+and resolution. Frames and audio are generated with NumPy/OpenCV and muxed by ffmpeg in one
+pass. Clips are cached under the output directory by their spec, so repeated benchmark runs
+(and runs on different commits) measure the exact same bytes.
+
+    python -m benchmarks.synthetic_media --preset full    (from the repository root)
+"""
+import os
+import sys
+import hashlib
+import argparse
+import subprocess
+import tempfile
+
+import numpy as np
+
+from modules.audio_buffer import SAMPLE_RATE, _ffmpeg_exe
+
+MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".media")
+FPS = 30
+RESOLUTIONS = {"360p": (640, 360), "720p": (1280, 720), "1080p": (1920, 1080)}
+# (seconds, resolution) pairs per preset
+PRESETS = {
+    "quick": [(10, "360p"), (10, "720p")],
+    "full": [(10, "360p"), (10, "720p"), (10, "1080p"), (60, "720p"), (300, "720p")],
+}
+BLINK_INTERVAL_SECONDS = 3.0 # 20 blinks/min, inside the "natural" band of the gaze analyzer
+BLINK_SECONDS = 0.15
+SEED = 1234
+
+
+def _face_sprite(size, face_image=None):
+    """The face drawn on every frame: a cartoon face, or a real photo if `face_image` is given."""
+    import cv2
+    if face_image:
+        image = cv2.imread(face_image)
+        if image is None:
+            raise ValueError(f"Could not read face image {face_image!r}")
+        return cv2.resize(image, (size, size))
+    sprite = np.full((size, size, 3), 40, dtype=np.uint8)
+    center = size // 2
+    cv2.ellipse(sprite, (center, center), (int(size * 0.36), int(size * 0.46)), 0, 0, 360, (150, 180, 225), -1)
+    return sprite
+
+
+def _draw_eyes(frame, x, y, size, closed):
+    import cv2
+    for side in (-1, 1):
+        eye = (x + size // 2 + side * int(size * 0.15), y + int(size * 0.4))
+        axes = (int(size * 0.07), 2 if closed else int(size * 0.035))
+        cv2.ellipse(frame, eye, axes, 0, 0, 360, (255, 255, 255), -1)
+        if not closed:
+            cv2.circle(frame, eye, int(size * 0.025), (60, 40, 20), -1)
+
+
+def generate_frames(seconds, width, height, face_image=None, seed=SEED):
+    """Yields BGR uint8 frames: a blinking face drifting slowly over a noisy gradient."""
+    import cv2
+    rng = np.random.default_rng(seed)
+    size = int(min(width, height) * 0.5)
+    sprite = _face_sprite(size, face_image)
+    gradient = np.linspace(60, 160, width, dtype=np.float32)[None, :, None]
+    background = np.clip(gradient + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    for index in range(int(seconds * FPS)):
+        t = index / FPS
+        frame = background.copy()
+        x = int((width - size) / 2 + np.sin(t * 0.5) * (width - size) * 0.3)
+        y = int((height - size) / 2 + np.cos(t * 0.3) * (height - size) * 0.2)
+        frame[y:y + size, x:x + size] = sprite
+        if face_image is None:
+            closed = (t % BLINK_INTERVAL_SECONDS) < BLINK_SECONDS
+            _draw_eyes(frame, x, y, size, closed)
+            mouth_open = int(size * 0.03 * (1 + np.sin(t * 2 * np.pi * 4)))
+            cv2.ellipse(frame, (x + size // 2, y + int(size * 0.7)), (int(size * 0.12), 2 + mouth_open),
+                        0, 0, 360, (40, 40, 120), -1)
+        yield frame
+
+
+def generate_audio(seconds, sample_rate=SAMPLE_RATE, seed=SEED):
+    """
+    Speech-like float32 audio: a pitch-varying harmonic source shaped into ~4 Hz syllables,
+    with pauses between phrases and a little noise. Not intelligible, but it has the spectral
+    and temporal structure the zero-shot features and Whisper's voice detection react to.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 120 + 20 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 2
+    phrases = (t % 5.0) < 4.0 # One second of pause every five
+    audio = 0.2 * voice * syllables * phrases + rng.normal(0, 0.005, len(t))
+    return audio.astype(np.float32)
+
+
+def clip_path(seconds, resolution, face_image=None, media_dir=MEDIA_DIR):
+    tag = ""
+    if face_image:
+        with open(face_image, "rb") as f:
+            tag = "-" + hashlib.sha256(f.read()).hexdigest()[:8]
+    return os.path.join(media_dir, f"synthetic-{resolution}-{seconds}s{tag}.mp4")
+
+
+def generate_clip(seconds, resolution="720p", face_image=None, media_dir=MEDIA_DIR):
+    """Writes (or reuses) one synthetic H.264/AAC clip and returns its path."""
+    path = clip_path(seconds, resolution, face_image, media_dir)
+    if os.path.exists(path):
+        return path
+    os.makedirs(media_dir, exist_ok=True)
+    width, height = RESOLUTIONS[resolution]
+    print(f"-> [Bench] Generating {os.path.basename(path)}...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = os.path.join(tmp, "audio.f32")
+        generate_audio(seconds).tofile(audio_path)
+        partial = os.path.join(tmp, "clip.mp4")
+        cmd = [_ffmpeg_exe(), "-nostdin", "-v", "error", "-y",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(FPS), "-i", "pipe:0",
+               "-f", "f32le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", audio_path,
+               # A keyframe every 2 s, like typical uploads, so seeking behaves realistically
+               "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-g", str(FPS * 2),
+               "-c:a", "aac", "-shortest", partial]
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        try:
+            for frame in generate_frames(seconds, width, height, face_image):
+                proc.stdin.write(frame.tobytes())
+        finally:
+            proc.stdin.close()
+            proc.wait()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to write {path}")
+        os.replace(partial, path) # Only complete clips ever land in the cache
+    return path
+
+
+def ensure_media(preset="quick", face_image=None, media_dir=MEDIA_DIR):
+    """Generates every clip of a preset. Returns one dict per clip: name, path, seconds, resolution, frames."""
+    media = []
+    for seconds, resolution in PRESETS[preset]:
+        path = generate_clip(seconds, resolution, face_image, media_dir)
+        media.append({"name": f"{resolution}-{seconds}s", "path": path, "seconds": seconds,
+                      "resolution": resolution, "frames": seconds * FPS})
+    return media
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the benchmark clips.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--face-image", help="Use this photo as the face instead of the drawn one (real detectors fire on it, but it never blinks)")
+    parser.add_argument("--media-dir", default=MEDIA_DIR)
+    args = parser.parse_args(argv)
+    for clip in ensure_media(args.preset, args.face_image, args.media_dir):
+        print(f"-> [Bench] {clip['name']}: {clip['path']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
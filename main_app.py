@@ -1,61 +1,48 @@
 import streamlit as st
 import os
-from moviepy.editor import VideoFileClip
-import requests
-import numpy as np
+import time
 
-from modules.face_analyzer import analyze_facial_consistency
-from modules.intelligence_analyzer import analyze_audio_and_content, analyze_content_risk
-from modules.zero_shot_analyzer import run_zero_shot_detection
-from modules.interrogator import run_interrogation
-from modules.spread_predictor import predict_virality
-from modules.gaze_analyzer import analyze_gaze_and_blinking_mediapipe
+from modules.orchestrator import warm_up_stages, run_full_analysis
+from modules.identity_gallery import IdentityGallery
+from modules.job_queue import JobQueue, QueueFullError
+from modules.live_analyzer import LiveAnalyzer
+from modules.intelligence_analyzer import analyze_content_risk, stream_content_risk, parse_risk_response
+from modules import llm_client, telemetry
+from modules.interrogator import stream_intent_analysis
+from modules.spread_predictor import stream_virality
 
 st.set_page_config(page_title="Sentinel: Red vs. Blue", layout="wide")
 st.title("🛡️ Sentinel: A Red Team vs. Blue Team Simulation")
 st.write("This demo showcases Sentinel's capabilities in a live attack-and-defense scenario.")
 
-OLLAMA_URL = "http://localhost:11434/api/chat"
-
-def run_full_analysis(video_path ):
-    """
-    This is the main analysis pipeline. It runs all modules and returns a single
-    dictionary containing all the results for easy use.
-    """
-    audio_path = "temp_audio.wav"
-    try:
-        with VideoFileClip(video_path) as video:
-            video.audio.write_audiofile(audio_path, codec='pcm_s16le', verbose=False, logger=None)
-    except Exception as e:
-        print(f"!! Could not extract audio (this is normal for silent videos): {e}")
-        from pydub import AudioSegment
-        silent_audio = AudioSegment.silent(duration=1000)
-        silent_audio.export(audio_path, format="wav")
-
-    st.write("✔️ Input Processed. Running All Analysis Modules...")
-    
-    face_score = analyze_facial_consistency(video_path, sample_rate=30, max_frames_to_check=20)
-    st.write(f"✔️ Facial Consistency Analysis... Score: {face_score}/100")
-    
-    zsl_anomaly_score = run_zero_shot_detection(audio_path)
-    st.write(f"✔️ Zero-Shot Anomaly Detection... Score: {zsl_anomaly_score}/100")
-    
-    gaze_score = analyze_gaze_and_blinking_mediapipe(video_path)
-    st.write(f"✔️ Gaze & Blink Pattern Analysis... Score: {gaze_score}/100")
-    
-    sync_score, transcribed_text, content_risk_score, justification = analyze_audio_and_content(audio_path)
-    st.write(f"✔️ Audio, Content & Sync Analysis... Sync Score: {sync_score}/100, Content Risk: {content_risk_score}/100")
-
-    technical_trust_score = int((face_score + sync_score + zsl_anomaly_score + gaze_score) / 4)
-    scores = [face_score / 100, sync_score / 100, zsl_anomaly_score / 100, gaze_score / 100]
-    confidence = (1 - np.std(scores)) * 100
-    
-    analysis_data = {
-        "technical_score": technical_trust_score, "confidence": confidence,
-        "content_risk": content_risk_score, "transcribed_text": transcribed_text,
-        "risk_justification": justification, "audio_path": audio_path
-    }
-    return analysis_data
+# Heavy models (TensorFlow, Whisper, MediaPipe) load lazily inside the stage processes on first
+# analysis. Set SENTINEL_WARMUP=1 to start those processes and load the models in the background
+# as soon as the app starts instead; st.cache_resource makes this happen once per server process.
+@st.cache_resource
+def start_model_warm_up():
+    return warm_up_stages()
+
+if os.environ.get("SENTINEL_WARMUP") == "1":
+    start_model_warm_up()
+
+# Set SENTINEL_METRICS_PORT to expose the pipeline's counters and timings to Prometheus
+@st.cache_resource
+def start_metrics_endpoint():
+    return telemetry.start_metrics_server(telemetry.METRICS_PORT)
+
+if telemetry.METRICS_PORT:
+    start_metrics_endpoint()
+
+# Analyses run on a fixed pool of background workers fed from a SQLite queue, so concurrent
+# sessions neither share scratch files nor block each other's script threads.
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(run_full_analysis)
+
+# One memory-mapped identity gallery shared by every session in this server process
+@st.cache_resource
+def get_identity_gallery():
+    return IdentityGallery()
 
 st.header("Act 1: The Baseline (Blue Team Analysis)")
 st.info("First, the Blue Team establishes a baseline by analyzing a known-good, authentic video.")
@@ -64,29 +51,43 @@ if 'report_data' not in st.session_state:
     st.session_state['report_data'] = None
 if 'attack_text' not in st.session_state:
     st.session_state['attack_text'] = None
+if 'job_id' not in st.session_state:
+    st.session_state['job_id'] = None
 
 uploaded_file = st.file_uploader("Upload a video to establish the baseline...", type=["mp4", "mov"])
 
 if uploaded_file:
     st.video(uploaded_file)
-    if st.button("Analyze Baseline"):
+    if st.button("Analyze Baseline", disabled=st.session_state['job_id'] is not None):
         st.session_state['report_data'] = None
         st.session_state['attack_text'] = None
-        
-        video_path = "temp_video.mp4"
-        with open(video_path, "wb") as f: f.write(uploaded_file.getbuffer())
-        
-        audio_path_to_delete = None
         try:
-            with st.status("Blue Team is analyzing the asset...", expanded=True) as status:
-                st.session_state['report_data'] = run_full_analysis(video_path)
-                audio_path_to_delete = st.session_state['report_data']["audio_path"]
-                status.update(label="✅ Baseline Analysis Complete.", state="complete")
-        finally:
-            print("Cleaning up temporary files...")
-            if os.path.exists(video_path): os.remove(video_path)
-            if audio_path_to_delete and os.path.exists(audio_path_to_delete): os.remove(audio_path_to_delete)
-            print("Cleanup complete.")
+            # Streamed to the job's own scratch directory in chunks, never buffered whole
+            st.session_state['job_id'] = get_job_queue().submit(uploaded_file, uploaded_file.name)
+        except QueueFullError as e:
+            st.error(f"The analysis queue is full: {e}")
+
+if st.session_state['job_id']:
+    job = get_job_queue().status(st.session_state['job_id'])
+    if job is None:
+        st.session_state['job_id'] = None
+        st.error("The analysis job was lost (the server may have been reset). Please upload the video again.")
+    elif job['status'] in ("queued", "running"):
+        with st.status("Blue Team is analyzing the asset...", expanded=True):
+            if job['status'] == "queued":
+                st.write(f"⏳ Waiting in the analysis queue (position {job['queue_position']})...")
+            for _, message in job['events']:
+                st.write(message)
+        # Poll: rerun the script until the job finishes
+        time.sleep(1)
+        st.rerun()
+    else:
+        st.session_state['job_id'] = None
+        if job['status'] == "done":
+            st.session_state['report_data'] = job['result']
+            st.success("✅ Baseline Analysis Complete.")
+        else:
+            st.error(f"Baseline analysis failed: {job['error']}")
 
 if st.session_state['report_data']:
     report_data = st.session_state['report_data']
@@ -98,6 +99,55 @@ if st.session_state['report_data']:
     st.text_area("Full Video Transcript (from Whisper)", report_data['transcribed_text'], height=150)
     st.metric("Content Risk Score", f"{report_data['content_risk']}/100")
     st.info(f"**Ollama's Justification:** {report_data['risk_justification']}")
+    if len(report_data['risk_windows']) > 1:
+        with st.expander("Per-passage risk breakdown"):
+            for window in report_data['risk_windows']:
+                where = f"{window['start']:.0f}s-{window['end']:.0f}s" if window['start'] is not None else f"Passage {window['index'] + 1}"
+                source = " (local triage)" if window.get('source') == "triage" else ""
+                st.markdown(f"**{where} — Risk {window['risk_score']}/100{source}:** {window['justification']}")
+    if report_data.get('shard_breakdown'):
+        with st.expander("Per-time-range breakdown"):
+            for part in report_data['shard_breakdown']:
+                face = f"{part['face_consistency']}%" if part['face_consistency'] is not None else "no faces"
+                bpm = f"{part['blinks_per_minute']:.0f}" if part['blinks_per_minute'] is not None else "n/a"
+                st.markdown(f"**{part['start_seconds'] / 60:.0f}-{(part['end_seconds'] or 0) / 60:.0f} min:** "
+                            f"face consistency {face}, {bpm} blinks/min, audio anomaly score {part['zsl_anomaly_score']}/100, "
+                            f"peak content risk {part['content_risk_score']}/100")
+            for part in report_data.get('failed_shards') or []:
+                st.warning(f"{part['start_seconds'] / 60:.0f}-{(part['end_seconds'] or 0) / 60:.0f} min could not be analyzed "
+                           f"and is left out of the scores: {part['error']}")
+    flagged_windows = [w for w in report_data.get('zsl_timeline', []) if w['anomalous']]
+    if flagged_windows:
+        with st.expander(f"Audio anomaly timeline ({len(flagged_windows)} of {len(report_data['zsl_timeline'])} windows flagged)"):
+            st.markdown(", ".join(f"{w['start']:.0f}s-{w['end']:.0f}s" for w in flagged_windows))
+    if report_data.get('trace'):
+        total_seconds = report_data['trace']['duration_seconds'] or 1
+        with st.expander(f"⏱️ Performance ({total_seconds:.1f}s total)"):
+            st.table([{"Step": "\u2003" * depth + node['name'], "Seconds": f"{node['duration_seconds']:.2f}",
+                       "Share": f"{node['duration_seconds'] / total_seconds:.0%}",
+                       "Details": ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                                            for k, v in node['attributes'].items())}
+                      for depth, node in telemetry.flatten(report_data['trace'])])
+    st.subheader("Identity Gallery")
+    gallery = get_identity_gallery()
+    face_embeddings = report_data['face_embeddings']
+    if face_embeddings is None or len(face_embeddings) == 0:
+        st.write("No face embeddings were collected from this video, so it can't be matched against known speakers.")
+    else:
+        matches = gallery.match(face_embeddings, k=3)
+        if matches and matches[0]['match_fraction'] >= 0.5:
+            best = matches[0]
+            st.success(f"Matches verified identity **{best['identity_id']}** "
+                       f"({best['match_fraction']:.0%} of faces within threshold, mean distance {best['distance']:.2f}).")
+        elif matches:
+            st.warning(f"No verified identity matches this speaker (closest: {matches[0]['identity_id']}, mean distance {matches[0]['distance']:.2f}).")
+        else:
+            st.write("The identity gallery is empty.")
+        with st.form("save_identity"):
+            identity_name = st.text_input("Save this speaker as a verified identity:", placeholder="e.g. Jane Doe (press office)")
+            if st.form_submit_button("Add to Gallery") and identity_name.strip():
+                gallery.add(identity_name.strip(), face_embeddings, {"source": "Act 1 baseline"})
+                st.success(f"Stored '{identity_name.strip()}' in the identity gallery ({len(gallery)} identities).")
     st.subheader("Overall Threat Assessment")
     if report_data['technical_score'] < 60 or report_data['content_risk'] > 50:
         st.error(f"🚨 **HIGH RISK DETECTED.** The asset shows signs of technical manipulation OR contains high-risk content.")
@@ -121,12 +171,11 @@ if st.session_state['report_data']:
         neutral_text = st.text_area("Start with the video's transcript:", initial_text, height=150)
         
         if st.button("Generate Malicious Script (Red Team Action)"):
-            with st.spinner("Red Team AI is weaponizing the text..."):
-                adversary_prompt = f"You are a disinformation agent. Rewrite the following text to create a sense of extreme urgency and panic, designed to make people act rashly. Text: '{neutral_text}'"
-                adversary_payload = {"model": "llama3", "messages": [{"role": "user", "content": adversary_prompt}], "stream": False}
-                attack_text = requests.post(OLLAMA_URL, json=adversary_payload).json()['message']['content']
-                st.session_state['attack_text'] = attack_text
-                st.session_state['original_text_for_act2'] = neutral_text
+            adversary_prompt = f"You are a disinformation agent. Rewrite the following text to create a sense of extreme urgency and panic, designed to make people act rashly. Text: '{neutral_text}'"
+            # Streamed token by token as llama3 writes it. Not memoized: every click should produce a fresh attack
+            attack_text = st.write_stream(llm_client.stream_ask(adversary_prompt, use_cache=False))
+            st.session_state['attack_text'] = attack_text
+            st.session_state['original_text_for_act2'] = neutral_text
 
     with col2:
         st.subheader("Blue Team: Real-Time Defense")
@@ -134,11 +183,18 @@ if st.session_state['report_data']:
             st.warning("Malicious script generated by Red Team:")
             st.write(st.session_state['attack_text'])
             
-            with st.spinner("Blue Team's content analyzer is scanning..."):
-                original_text = st.session_state['original_text_for_act2']
-                # --- FIX #3: Call the correct function for text analysis ---
-                original_risk, _ = analyze_content_risk(original_text)
-                attack_risk, _ = analyze_content_risk(st.session_state['attack_text'])
+            original_text = st.session_state['original_text_for_act2']
+            # --- FIX #3: Call the correct function for text analysis ---
+            # The original is scored in the background while the attack's analysis streams in live
+            original_future = llm_client.submit(analyze_content_risk, original_text)
+            st.write("**Blue Team content analyzer (live):**")
+            early_verdict = st.empty()
+            show_early_score = lambda score: early_verdict.metric("Risk Score of Malicious Script (early verdict)", f"{score}/100")
+            attack_analysis = st.write_stream(stream_content_risk(st.session_state['attack_text'], on_score=show_early_score))
+            attack_risk, _ = parse_risk_response(attack_analysis)
+            early_verdict.empty()
+            with st.spinner("Waiting for the original transcript's score..."):
+                original_risk, _ = original_future.result()
 
             st.metric("Risk Score of Original Transcript", f"{original_risk}/100")
             st.metric("Risk Score of Malicious Script", f"{attack_risk}/100")
@@ -156,13 +212,75 @@ st.header("Act 3: The Intelligence Briefing (Blue Team)")
 st.info("The attack was stopped. Now, the Blue Team provides a deep intelligence briefing on the attacker's methods and goals.")
 
 if st.session_state['attack_text'] and st.button("Generate Intelligence Briefing"):
-    with st.spinner("Blue Team's intelligence modules are analyzing the attacker's script..."):
-        attack_script = st.session_state['attack_text']
-        interrogation_results = run_interrogation(attack_script)
-        virality_results = predict_virality(attack_script)
+    attack_script = st.session_state['attack_text']
     st.subheader("Threat Actor Profile")
-    st.text_area("Predicted Intent & Methodology (from AI Interrogator):", interrogation_results['intent_analysis'], height=150)
+    st.write("**Predicted Intent & Methodology (from AI Interrogator):**")
+    st.write_stream(stream_intent_analysis(attack_script))
     st.subheader("Predicted Impact Analysis")
-    st.metric("Predicted Virality Score", f"{virality_results['virality_score']}/100")
+    virality_slot = st.empty()
+    for virality_results in stream_virality(attack_script):
+        # Shows the emotion score the moment the LLM produces it, then the final virality score
+        if virality_results.get("final"):
+            virality_slot.metric("Predicted Virality Score", f"{virality_results['virality_score']}/100",
+                                 help="Emotion scored by the local triage" if virality_results['emotion_source'] == "triage" else "Emotion scored by llama3")
+        elif "emotion_score" in virality_results:
+            virality_slot.metric("Emotion Score (early)", f"{virality_results['emotion_score']}/100")
+        else:
+            virality_slot.info("Scoring emotional intensity...")
     st.write(f"This script was engineered for rapid spread, using high emotional language (Emotion Score: {virality_results['emotion_score']}) and simple, easy-to-read phrasing (Readability Score: {virality_results['readability_score']}).")
     st.success("✅ Briefing Complete. The Blue Team now understands the attacker's strategy.")
+
+
+st.write("---")
+st.header("Live Mode: Continuous Monitoring (Blue Team)")
+st.info("Watch a live source and keep a rolling trust score: a webcam index (e.g. 0), a stream URL or named pipe, "
+        "or a recording that is still being written.")
+
+if 'live_analyzer' not in st.session_state:
+    st.session_state['live_analyzer'] = None
+if 'live_status' not in st.session_state:
+    st.session_state['live_status'] = None
+
+live = st.session_state['live_analyzer']
+live_source = st.text_input("Live source", value="0", disabled=live is not None)
+start_col, stop_col = st.columns(2)
+if start_col.button("Start Live Analysis", disabled=live is not None):
+    # The analyzer's threads outlive this script run; the session keeps the handle to stop them.
+    # If the session goes away, the analyzer stops itself once nobody polls it (LIVE_IDLE_TIMEOUT_SECONDS).
+    st.session_state['live_status'] = None
+    live = st.session_state['live_analyzer'] = LiveAnalyzer(live_source.strip()).start()
+if stop_col.button("Stop Live Analysis", disabled=live is None):
+    live.stop()
+    live = st.session_state['live_analyzer'] = None
+
+if st.session_state['live_status']:
+    level, message = st.session_state['live_status']
+    if level == "error":
+        st.error(message)
+    else:
+        st.warning(message)
+
+if live is not None:
+    metrics_slot, stats_slot = st.empty(), st.empty()
+    # Redraw in place until the stream ends; pressing Stop interrupts this loop with a rerun
+    while True:
+        snapshot = live.snapshot()
+        with metrics_slot.container():
+            trust, face, gaze, audio = st.columns(4)
+            trust.metric("Rolling Trust Score", "..." if snapshot['technical_score'] is None else f"{snapshot['technical_score']}/100")
+            face.metric("Face Consistency", "..." if snapshot['face_score'] is None else f"{snapshot['face_score']}/100",
+                        help=f"{snapshot['faces_in_window']} faces in the window")
+            gaze.metric("Gaze / Blinks", "..." if snapshot['gaze_score'] is None else f"{snapshot['gaze_score']}/100",
+                        help=None if snapshot['blinks_per_minute'] is None else f"{snapshot['blinks_per_minute']:.1f} blinks/min")
+            audio.metric("Audio Anomaly", "n/a" if snapshot['zsl_anomaly_score'] is None else f"{snapshot['zsl_anomaly_score']}/100")
+        latency = "..." if snapshot['latency_seconds'] is None else f"{snapshot['latency_seconds'] * 1000:.0f} ms"
+        stats_slot.caption(f"{snapshot['elapsed_seconds']:.0f}s live · {snapshot['frames_analyzed']} frames analyzed, "
+                           f"{snapshot['frames_dropped']} dropped to keep up · latency {latency}")
+        if not snapshot['running']:
+            # Release the threads, ffmpeg and the webcam now, and re-enable Start
+            live.stop()
+            st.session_state['live_analyzer'] = None
+            st.session_state['live_status'] = (("error", f"Live analysis stopped: {snapshot['error']}") if snapshot['error']
+                                               else ("warning", "The live source ended."))
+            st.rerun()
+        time.sleep(0.5)
@@ -0,0 +1,119 @@
+# modules/audio_buffer.py
+import shutil
+import subprocess
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Everything downstream (Whisper and the zero-shot features) works on 16 kHz mono float32,
+# so the audio is resampled exactly once, by ffmpeg, while it is decoded.
+SAMPLE_RATE = 16000
+SILENT_SECONDS = 1.0
+_READ_CHUNK = 1 << 20
+
+
+def _ffmpeg_exe():
+    exe = shutil.which("ffmpeg")
+    if exe:
+        return exe
+    # Fall back to the static ffmpeg binary bundled by imageio-ffmpeg
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def silent_audio(seconds=SILENT_SECONDS, sample_rate=SAMPLE_RATE):
+    """A buffer of digital silence, used for videos without an audio track."""
+    return np.zeros(int(seconds * sample_rate), dtype=np.float32)
+
+
+def decode_audio(video_path, sample_rate=SAMPLE_RATE, start_seconds=None, duration_seconds=None):
+    """
+    Decodes a video's audio track straight out of the container into one mono float32
+    array at `sample_rate`, streamed from ffmpeg's stdout (no temp files).
+    Returns None if the video has no audio track or it can't be decoded.
+    """
+    cmd = [_ffmpeg_exe(), "-nostdin", "-v", "error"]
+    if start_seconds:
+        cmd += ["-ss", str(start_seconds)]
+    cmd += ["-i", video_path]
+    if duration_seconds:
+        cmd += ["-t", str(duration_seconds)]
+    cmd += ["-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "pipe:1"]
+
+    pcm = bytearray()
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        for chunk in iter(lambda: proc.stdout.read(_READ_CHUNK), b""):
+            pcm += chunk
+        stderr = proc.stderr.read().decode("utf-8", "replace").strip()
+    if proc.returncode != 0 or not pcm:
+        print(f"!! [Audio] No decodable audio track (this is normal for silent videos): {stderr[:200] or 'empty stream'}")
+        return None
+    return np.frombuffer(pcm, dtype=np.float32)
+
+
+def load_audio(source, sample_rate=SAMPLE_RATE):
+    """Returns `source` as a float32 PCM array: arrays pass through, paths are decoded."""
+    if isinstance(source, np.ndarray):
+        return source
+    samples = decode_audio(source, sample_rate)
+    return samples if samples is not None else silent_audio(sample_rate=sample_rate)
+
+
+class SharedAudioBuffer:
+    """
+    A float32 PCM buffer in shared memory. The stage processes attach to it by name and
+    read the samples in place, so the decoded audio is never copied or pickled between
+    processes. The creating process owns the block and must unlink() it when done.
+    """
+
+    def __init__(self, shm, num_samples, sample_rate, owner):
+        self._shm = shm
+        self.num_samples = num_samples
+        self.sample_rate = sample_rate
+        self._owner = owner
+
+    @classmethod
+    def from_array(cls, samples, sample_rate=SAMPLE_RATE):
+        samples = np.ascontiguousarray(samples, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=max(samples.nbytes, 4))
+        np.ndarray(samples.shape, dtype=np.float32, buffer=shm.buf)[:] = samples
+        return cls(shm, len(samples), sample_rate, owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        name, num_samples, sample_rate = handle
+        return cls(shared_memory.SharedMemory(name=name), num_samples, sample_rate, owner=False)
+
+    @property
+    def handle(self):
+        """A small picklable reference to pass to other processes (see attach())."""
+        return (self._shm.name, self.num_samples, self.sample_rate)
+
+    @property
+    def samples(self):
+        """A zero-copy float32 view of the shared samples."""
+        return np.ndarray((self.num_samples,), dtype=np.float32, buffer=self._shm.buf)
+
+    @property
+    def duration_seconds(self):
+        return self.num_samples / self.sample_rate
+
+    def close(self):
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # A view is still alive somewhere; the mapping is released when it is collected
+
+    def unlink(self):
+        self.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink() if self._owner else self.close()
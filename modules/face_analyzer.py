@@ -1,84 +1,515 @@
 # modules/face_analyzer.py (ULTRA OPTIMIZED - "One-Pass" Method)
-import cv2
-from deepface import DeepFace
 import os
 import time
+from collections import deque
+import cv2
 import numpy as np
-from scipy.spatial.distance import cosine
+
+from . import model_registry, telemetry
+from .frame_source import FramePipeline
 
 # Suppress verbose TensorFlow logging
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
+def _load_deepface():
+    # Importing DeepFace pulls in TensorFlow, so it only happens on first use
+    from deepface import DeepFace
+    DeepFace.build_model('VGG-Face') # Builds and caches the weights inside DeepFace
+    return DeepFace
+
+def _load_vgg_face():
+    return model_registry.get("deepface").build_model('VGG-Face')
+
+def _load_face_detection():
+    # BlazeFace: a few milliseconds per frame on CPU, used to gate and track before RetinaFace
+    import mediapipe as mp
+    return mp.solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
+
+model_registry.register("deepface", _load_deepface)
+model_registry.register("vgg_face", _load_vgg_face)
+# The MediaPipe graph isn't thread-safe, so each thread gets its own (like FaceMesh in the gaze analyzer)
+model_registry.register("face_detection", _load_face_detection, per_thread=True)
+
+# Bump when the analysis logic changes, so cached results from older versions are ignored.
+MODULE_VERSION = "6"
+
+MATCH_THRESHOLD = 0.4  # Cosine distance threshold for VGG-Face
+
+# How many face crops go through VGG-Face per forward pass
+EMBEDDING_BATCH_SIZE = int(os.environ.get("SENTINEL_FACE_BATCH_SIZE", "16"))
+
+# --- Detector cascade ---
+# BlazeFace runs on every sampled frame; RetinaFace only re-runs on "keyframes". In between,
+# the RetinaFace box is carried along by the cheap detector's motion.
+KEYFRAME_INTERVAL = 8          # Force a RetinaFace pass at least every N face samples
+TRACK_IOU_THRESHOLD = 0.5      # Below this overlap with the keyframe's cheap box, the track is lost
+MIN_TRACK_CONFIDENCE = 0.75    # Cheap detections less confident than this trigger a full detection
+SCENE_CUT_CORRELATION = 0.5    # HSV histogram correlation below this counts as a scene cut
+
+
+# --- Adaptive sampling ---
+# Start with a coarse, even sweep of the timeline, then keep bisecting only the gaps that look
+# suspicious (a shot boundary, a face appearing/disappearing, or a distance near the threshold)
+# until the consistency estimate is tight or the frame budget is spent.
+# 16 all-matching samples already give a Wilson interval narrower than CI_MAX_WIDTH, so a clean
+# video stops after the coarse pass, below the old fixed 20-frame cost.
+COARSE_SAMPLES = 16
+CI_MAX_WIDTH = 0.2           # Stop once the 95% Wilson interval of the match rate is this narrow
+SUSPICIOUS_DISTANCE = 0.3    # Samples this close to MATCH_THRESHOLD (or beyond it) get neighbours
+MIN_SAMPLE_GAP_SECONDS = 0.25
+
+
+def wilson_interval(successes, n, z=1.96):
+    """95% Wilson score interval (low, high) for a proportion; (0, 1) when n == 0."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return float(max(0.0, center - half)), float(min(1.0, center + half))
+
+
+def plan_refinement(sample_ids, distances, shot_cuts, min_gap, limit, densify_all=False):
+    """
+    Picks up to `limit` new frame ids, each the midpoint of a gap between two adjacent samples.
+    - sample_ids: sorted frame ids sampled so far.
+    - distances: {frame_id: cosine distance to the reference face} (faceless samples are absent).
+    - shot_cuts: set of sample ids whose colour histogram differs sharply from the previous sample's.
+    Suspicious gaps come first, most suspicious (distance nearest the threshold) first; with
+    densify_all, unsuspicious gaps are then bisected too, widest first.
+    """
+    suspicious, plain = [], []
+    for a, b in zip(sample_ids, sample_ids[1:]):
+        if b - a < 2 * min_gap:
+            continue
+        da, db = distances.get(a), distances.get(b)
+        near = [d for d in (da, db) if d is not None and d > SUSPICIOUS_DISTANCE]
+        if near:
+            priority = min(abs(d - MATCH_THRESHOLD) for d in near)
+        elif (da is None) != (db is None) or b in shot_cuts:
+            priority = MATCH_THRESHOLD # Suspicious, but less than a near-threshold distance
+        else:
+            plain.append((-(b - a), (a + b) // 2))
+            continue
+        suspicious.append((priority, (a + b) // 2))
+    picks = [mid for _, mid in sorted(suspicious)]
+    if densify_all:
+        picks += [mid for _, mid in sorted(plain)]
+    return picks[:limit]
+
+
+def _box_iou(a, b):
+    """IoU of two (x, y, w, h) boxes."""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _color_histogram(frame):
+    """A small, normalized hue/saturation histogram used for scene-cut detection."""
+    small = cv2.resize(frame, (160, 90))
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+
+def _cheap_detect(detector, frame):
+    """
+    Runs BlazeFace on a BGR frame. Returns (box, score, (right_eye, left_eye)) for the most
+    confident face, in pixels, or None if no face was found.
+    """
+    height, width = frame.shape[:2]
+    detections = detector.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).detections
+    if not detections:
+        return None
+    best = max(detections, key=lambda d: d.score[0])
+    rel = best.location_data.relative_bounding_box
+    box = (rel.xmin * width, rel.ymin * height, rel.width * width, rel.height * height)
+    keypoints = best.location_data.relative_keypoints # 0 = right eye, 1 = left eye
+    eyes = tuple((keypoints[i].x * width, keypoints[i].y * height) for i in (0, 1))
+    return box, float(best.score[0]), eyes
+
+
+def _crop_aligned(frame, box, eyes):
+    """
+    Cuts a face out of a BGR frame, rotated so the eyes are level, and returns it as RGB
+    floats in [0, 1] like extract_faces. In cascade mode every crop goes through this, keyframes
+    included, so tracked and keyframe embeddings are comparable.
+    """
+    x, y, w, h = box
+    cx, cy = x + w / 2, y + h / 2
+    (rx, ry), (lx, ly) = eyes
+    angle = np.degrees(np.arctan2(ly - ry, lx - rx))
+    # Rotate only a padded patch around the face, not the whole frame
+    pad = int(max(w, h))
+    x0, y0 = max(0, int(cx - pad)), max(0, int(cy - pad))
+    patch = frame[y0:int(cy + pad), x0:int(cx + pad)]
+    if patch.size == 0:
+        return None
+    rotation = cv2.getRotationMatrix2D((cx - x0, cy - y0), angle, 1.0)
+    patch = cv2.warpAffine(patch, rotation, (patch.shape[1], patch.shape[0]))
+    left, top = max(0, int(cx - x0 - w / 2)), max(0, int(cy - y0 - h / 2))
+    face = patch[top:top + int(h), left:left + int(w)]
+    if face.size == 0:
+        return None
+    return face[:, :, ::-1].astype(np.float32) / 255.0
+
+
+def _model_input_size(model):
+    """(height, width) the recognition model expects, across DeepFace versions."""
+    shape = getattr(model, "input_shape", None)
+    if shape is None or len(shape) != 2:
+        shape = getattr(model, "model", model).input_shape[1:3]
+    return int(shape[0]), int(shape[1])
+
+
+def _prepare_face(face, target_size):
+    """
+    Letterboxes one aligned face crop (RGB floats in [0, 1], as DeepFace.extract_faces returns
+    it) into the model's input size, mirroring the preprocessing DeepFace.represent applies.
+    """
+    face = face[:, :, ::-1].astype(np.float32) # DeepFace feeds the recognition models BGR
+    target_h, target_w = target_size
+    scale = min(target_h / face.shape[0], target_w / face.shape[1])
+    new_w, new_h = max(1, int(face.shape[1] * scale)), max(1, int(face.shape[0] * scale))
+    resized = cv2.resize(face, (new_w, new_h))
+    canvas = np.zeros((target_h, target_w, 3), dtype=np.float32)
+    top, left = (target_h - new_h) // 2, (target_w - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas
+
 
+def embed_faces(faces, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Embeds a list of aligned face crops with VGG-Face in batched forward passes.
+    Returns an (N, D) float32 matrix of L2-normalized embeddings.
+    """
+    if not faces:
+        return np.zeros((0, 0), dtype=np.float32)
+    model = model_registry.get("vgg_face")
+    network = getattr(model, "model", model) # DeepFace >= 0.0.80 wraps the Keras model
+    target_size = _model_input_size(model)
+    batch = np.stack([_prepare_face(face, target_size) for face in faces])
+    embeddings = np.asarray(network.predict(batch, batch_size=batch_size, verbose=0), dtype=np.float32)
+    embeddings = embeddings.reshape(len(faces), -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class FacialConsistencyCollector:
+    """
+    Frame consumer for the shared FramePipeline. It finds and aligns the face in every
+    frame it is handed, queues the crops, and embeds them in batches through VGG-Face;
+    result() scores the consistency of the collected embeddings once the pipeline is done.
+
+    With cascade=True (the default), detection is a cascade: BlazeFace screens every frame
+    (frames without a face are dropped before any other work), and RetinaFace only runs on
+    keyframes, i.e. when there is no track yet, the scene cuts, the cheap box drifts away
+    from the keyframe's, the cheap detector is unsure, or KEYFRAME_INTERVAL samples passed.
+    Keyframe and tracked faces are cropped and aligned the same way (see _crop_aligned).
+    With cascade=False every frame goes through RetinaFace and its own crops, as before.
+
+    With adaptive=True, max_frames_to_check is a budget rather than a fixed count: the first
+    pass only samples COARSE_SAMPLES evenly spaced frames, and refine() then samples more
+    where the video looks suspicious, stopping early once the estimate is tight. Without
+    adaptive, every `sample_rate`-th frame is checked, up to max_frames_to_check.
+    """
+
+    def __init__(self, sample_rate=30, max_frames_to_check=30, batch_size=EMBEDDING_BATCH_SIZE, cascade=True, adaptive=False):
+        self.sample_rate = sample_rate
+        self.max_frames_to_check = max_frames_to_check
+        self.batch_size = batch_size
+        self.cascade = cascade
+        self.adaptive = adaptive
+        self.sample_hists = {} # Colour histogram of every sampled frame, for tracking and shot-cut detection
+        self.min_gap = 1
+        self.rounds = 0
+        self.stopped_early = False
+        self.report = None # Set by result(): how much of the video was examined, and how confidently
+        self.total_frames_checked = 0
+        self.all_embeddings = [] # One (N, D) block per embedded batch
+        self.pending_faces = []  # Aligned crops waiting for the next batch
+        self.face_frame_ids = [] # Frame id of every embedded face, in order
+        self.deepface = model_registry.get("deepface")
+        self.detector = model_registry.get("face_detection") if cascade else None
+        # Tracking state: the last keyframe's cheap box and RetinaFace box, and the previous histogram
+        self.track = None
+        self.samples_since_keyframe = 0
+        self.previous_hist = None
+        self.detector_calls = {"retinaface": 0, "tracked": 0, "gated": 0}
+        self.detect_seconds = 0.0 # Summed over the frames, so the hot loop never opens a span
+        self.embed_seconds = 0.0
+        self.start_time = time.time()
+        self.embeddings = None # Set by result(): the collected embeddings as one float32 matrix
+
+    def register(self, pipeline):
+        if self.adaptive and pipeline.range_frames > 1:
+            self.min_gap = max(1, int((pipeline.fps or 30) * MIN_SAMPLE_GAP_SECONDS))
+            coarse = np.linspace(pipeline.start_frame, pipeline.end_frame - 1, min(COARSE_SAMPLES, self.max_frames_to_check))
+            self.rounds = 1
+            pipeline.register(self, frames=np.unique(coarse.astype(int)).tolist())
+        else:
+            self.adaptive = False # No usable frame count, so there is no timeline to refine
+            pipeline.register(self, stride=self.sample_rate, max_frames=self.max_frames_to_check)
+
+    def _distances(self):
+        """{frame_id: cosine distance to the reference (earliest) face} for every embedded face."""
+        self.flush()
+        if not self.all_embeddings:
+            return {}
+        embeddings = np.concatenate(self.all_embeddings)
+        reference = embeddings[int(np.argmin(self.face_frame_ids))]
+        return dict(zip(self.face_frame_ids, (1 - embeddings @ reference).tolist()))
+
+    def _shot_cuts(self, sample_ids):
+        return {b for a, b in zip(sample_ids, sample_ids[1:])
+                if cv2.compareHist(self.sample_hists[a], self.sample_hists[b], cv2.HISTCMP_CORREL) < SCENE_CUT_CORRELATION}
+
+    def refine(self, video_path):
+        """
+        Adaptive mode only: after the coarse pass, samples more frames round by round around
+        shot boundaries, face gaps and near-threshold distances, until the match rate's
+        confidence interval is narrow and nothing looks suspicious, or the budget runs out.
+        Stops at once if the samples so far hold no face at all.
+        """
+        if not self.adaptive:
+            return
+        while True:
+            distances = self._distances()
+            if not distances:
+                # No face anywhere in the samples: there is no match rate to tighten, and bisecting
+                # faceless gaps would only spend the whole budget confirming that
+                self.stopped_early = True
+                return
+            matches = sum(d < MATCH_THRESHOLD for d in distances.values())
+            low, high = wilson_interval(matches, len(distances))
+            tight = high - low <= CI_MAX_WIDTH
+            remaining = self.max_frames_to_check - self.total_frames_checked
+            if remaining <= 0:
+                return
+            sample_ids = sorted(self.sample_hists)
+            # Once the estimate is tight only suspicious gaps are worth a look; until then, any gap is
+            new_frames = plan_refinement(sample_ids, distances, self._shot_cuts(sample_ids),
+                                         self.min_gap, remaining, densify_all=not tight)
+            if not new_frames:
+                self.stopped_early = tight
+                return
+            self.rounds += 1
+            print(f"-> [Video Specialist] Refinement round {self.rounds}: {len(new_frames)} more frames "
+                  f"(match rate {low:.0%}-{high:.0%} so far).")
+            # The new samples are far apart in time, so tracking restarts from a fresh keyframe
+            self.track, self.previous_hist = None, None
+            checked = self.total_frames_checked
+            pipeline = FramePipeline(video_path)
+            pipeline.register(self, frames=new_frames)
+            pipeline.run()
+            if self.total_frames_checked == checked:
+                return # The container's frame count overstated the video; nothing more can be read
+
+    def _retinaface(self, frame):
+        """Full detection + alignment. Returns the first face object, or None if there is no face."""
+        self.detector_calls["retinaface"] += 1
+        try:
+            return self.deepface.extract_faces(
+                img_path=frame,
+                enforce_detection=True,
+                detector_backend='retinaface',
+                align=True
+            )[0]
+        except ValueError:
+            return None
+
+    def _needs_keyframe(self, box, score, hist):
+        if self.track is None or self.samples_since_keyframe >= KEYFRAME_INTERVAL:
+            return True
+        if score < MIN_TRACK_CONFIDENCE or _box_iou(box, self.track["cheap_box"]) < TRACK_IOU_THRESHOLD:
+            return True
+        return cv2.compareHist(hist, self.previous_hist, cv2.HISTCMP_CORREL) < SCENE_CUT_CORRELATION
+
+    def _tracked_box(self, box):
+        """Moves and scales the keyframe's RetinaFace box the way the cheap box moved since then."""
+        kx, ky, kw, kh = self.track["cheap_box"]
+        rx, ry, rw, rh = self.track["retina_box"]
+        sx, sy = box[2] / kw, box[3] / kh
+        # Keep the RetinaFace box's offset from the cheap box's center, scaled with it
+        cx, cy = box[0] + box[2] / 2, box[1] + box[3] / 2
+        offset_x, offset_y = (rx + rw / 2) - (kx + kw / 2), (ry + rh / 2) - (ky + kh / 2)
+        w, h = rw * sx, rh * sy
+        return (cx + offset_x * sx - w / 2, cy + offset_y * sy - h / 2, w, h)
+
+    def _cascade_face(self, frame, hist):
+        """Returns an aligned face crop for this frame (or None), doing as little detection as possible."""
+        detection = _cheap_detect(self.detector, frame)
+        if detection is None:
+            # No face at all: skip RetinaFace and the embedding, and don't trust the track across the gap
+            self.detector_calls["gated"] += 1
+            self.track = None
+            return None
+        box, score, eyes = detection
+        needs_keyframe = self._needs_keyframe(box, score, hist)
+        self.previous_hist = hist
+
+        if not needs_keyframe:
+            face = _crop_aligned(frame, self._tracked_box(box), eyes)
+            if face is not None:
+                self.detector_calls["tracked"] += 1
+                self.samples_since_keyframe += 1
+                return face
+
+        face_obj = self._retinaface(frame)
+        if face_obj is None:
+            self.track = None
+            return None
+        area = face_obj.get('facial_area') or {}
+        if all(k in area for k in ("x", "y", "w", "h")) and area["w"] > 0 and area["h"] > 0:
+            retina_box = (area["x"], area["y"], area["w"], area["h"])
+            self.track = {"cheap_box": box, "retina_box": retina_box}
+        else:
+            retina_box, self.track = box, None
+        self.samples_since_keyframe = 0
+        # RetinaFace only places the box: the crop and alignment are the same as on tracked frames,
+        # since mixing its own crops with these would shift the distances between the two kinds
+        return _crop_aligned(frame, retina_box, eyes)
 
+    def detect_face(self, frame, hist=None):
+        """The aligned face crop for one frame (RGB floats in [0, 1]), or None if there is no face."""
+        if self.cascade:
+            return self._cascade_face(frame, hist if hist is not None else _color_histogram(frame))
+        face_obj = self._retinaface(frame)
+        return face_obj['face'] if face_obj is not None else None
 
+    def __call__(self, frame_id, frame):
+        self.total_frames_checked += 1
+        hist = self.sample_hists[frame_id] = _color_histogram(frame)
+        # Detection + alignment per frame; the embedding itself is deferred to a batch
+        started = time.perf_counter()
+        face = self.detect_face(frame, hist)
+        self.detect_seconds += time.perf_counter() - started
+        if face is not None:
+            self.pending_faces.append(face)
+            self.face_frame_ids.append(frame_id)
+            print(f"  - Frame {frame_id}: Face found.")
+        else:
+            print(f"  - Frame {frame_id}: No face detected.")
+        if len(self.pending_faces) >= self.batch_size:
+            self.flush()
 
+    def flush(self):
+        """Embeds every queued face crop in one batched forward pass."""
+        if self.pending_faces:
+            started = time.perf_counter()
+            self.all_embeddings.append(embed_faces(self.pending_faces, self.batch_size))
+            self.embed_seconds += time.perf_counter() - started
+            self.pending_faces = []
 
+    def result(self):
+        self.flush()
+        pass1_time = time.time() - self.start_time
+        self.embeddings = np.concatenate(self.all_embeddings) if self.all_embeddings else np.zeros((0, 0), dtype=np.float32)
+        # Refinement rounds append out of order; keep the embeddings in timeline order
+        order = np.argsort(self.face_frame_ids, kind="stable")
+        self.face_frame_ids = [self.face_frame_ids[i] for i in order]
+        if len(order):
+            self.embeddings = self.embeddings[order]
+        self.report = {"frames_examined": self.total_frames_checked, "faces_found": len(self.embeddings),
+                       "rounds": self.rounds, "stopped_early": self.stopped_early, "match_interval": None}
+        print(f"--- [Pass 1/2] Complete. Found {len(self.embeddings)} faces in {pass1_time:.2f} seconds. ---")
+        if self.cascade:
+            calls = self.detector_calls
+            print(f"-> [Video Specialist] Detector cascade: {calls['retinaface']} RetinaFace runs, "
+                  f"{calls['tracked']} tracked frames, {calls['gated']} faceless frames skipped "
+                  f"(of {self.total_frames_checked} sampled).")
+        telemetry.annotate(face_frames_examined=self.total_frames_checked, faces_found=len(self.embeddings),
+                           face_rounds=self.rounds, face_detect_seconds=self.detect_seconds,
+                           face_embed_seconds=self.embed_seconds, face_detector_calls=dict(self.detector_calls))
+        telemetry.count("sentinel_model_calls_total", self.detector_calls["retinaface"], model="retinaface")
+        if self.cascade:
+            telemetry.count("sentinel_model_calls_total", self.total_frames_checked, model="face_detection")
+        telemetry.count("sentinel_model_calls_total", len(self.embeddings), model="vgg_face")
 
-def analyze_facial_consistency(video_path, sample_rate=30, max_frames_to_check=30):
+        # --- Pass 2: Analyze the collected embeddings (this is extremely fast) ---
+        print("--- [Pass 2/2] Analyzing embedding consistency... ---")
+
+        if len(self.embeddings) < 2:
+            # If we found 0 or 1 face, we can't determine consistency.
+            print("-> Not enough faces found to determine consistency.")
+            return 75 # Return a neutral score
+
+        # The embeddings are L2-normalized, so one matrix-vector product gives every cosine distance
+        distances = 1 - self.embeddings @ self.embeddings[0]
+        matching_faces = int(np.count_nonzero(distances < MATCH_THRESHOLD))
+
+        consistency_score = int((matching_faces / len(self.embeddings)) * 100)
+        self.report["match_interval"] = wilson_interval(matching_faces, len(self.embeddings))
+
+        print(f"-> [Video Specialist] Analysis complete. Consistency: {consistency_score}% "
+              f"({self.total_frames_checked} frames examined).")
+        return consistency_score
+
+
+class SlidingEmbeddingWindow:
+    """
+    Incremental counterpart of the collector's embedding list for live streams. The first
+    `anchor_faces` embeddings define the session's reference identity (their normalized mean);
+    after that only the embeddings of the last `window_seconds` (at most `max_embeddings`)
+    are kept, and consistency() is the share of them that still match the reference.
+    """
+
+    def __init__(self, window_seconds=30.0, max_embeddings=64, anchor_faces=5):
+        self.window_seconds = window_seconds
+        self.anchor_faces = anchor_faces
+        self.entries = deque(maxlen=max_embeddings) # (timestamp, embedding)
+        self._anchor_sum = None
+        self._anchor_count = 0
+
+    @property
+    def reference(self):
+        if self._anchor_sum is None:
+            return None
+        return self._anchor_sum / max(np.linalg.norm(self._anchor_sum), 1e-12)
+
+    def add(self, timestamp, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        if self._anchor_count < self.anchor_faces:
+            self._anchor_sum = embedding.copy() if self._anchor_sum is None else self._anchor_sum + embedding
+            self._anchor_count += 1
+        self.entries.append((timestamp, embedding))
+        while self.entries and self.entries[0][0] < timestamp - self.window_seconds:
+            self.entries.popleft()
+
+    def distances(self):
+        if self.reference is None or not self.entries:
+            return np.zeros(0, dtype=np.float32)
+        return 1 - np.stack([e for _, e in self.entries]) @ self.reference
+
+    def consistency(self):
+        """0-100 share of the window's faces matching the reference; 75 (neutral) with fewer than 2."""
+        distances = self.distances()
+        if len(distances) < 2:
+            return 75
+        return int(np.count_nonzero(distances < MATCH_THRESHOLD) / len(distances) * 100)
+
+
+def analyze_facial_consistency(video_path, sample_rate=30, max_frames_to_check=30, batch_size=EMBEDDING_BATCH_SIZE, cascade=True, adaptive=False):
     """
     ULTRA-OPTIMIZED version. It makes a single pass over the video to collect all face
-    embeddings, then analyzes them in memory. This is dramatically faster.
+    embeddings, then analyzes them in memory. Frames between samples are skipped
+    without being decoded. To share the decode with other analyzers, register a
+    FacialConsistencyCollector on a FramePipeline instead (see run_video_analyses).
     """
     print(f"-> [Video Specialist] Running ULTRA-FAST Facial Consistency Analysis...")
-    
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
+
+    pipeline = FramePipeline(video_path)
+    if not pipeline.is_opened():
         print("!! Error opening video file")
         return 0
 
-    total_frames_checked = 0
-    all_embeddings = [] # We will store all found embeddings here
-
-    frame_id = 0
-    start_time = time.time()
-
     print("--- [Pass 1/2] Extracting face embeddings from video... ---")
-    while total_frames_checked < max_frames_to_check:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_id % sample_rate == 0:
-            total_frames_checked += 1
-            try:
-                # This is the ONLY expensive call we make in the loop
-                embedding_objs = DeepFace.represent(
-                    img_path=frame,
-                    model_name='VGG-Face',
-                    enforce_detection=True,
-                    detector_backend='retinaface'
-                )
-                all_embeddings.append(embedding_objs[0]['embedding'])
-                print(f"  - Frame {frame_id}: Face found.")
-            except ValueError:
-                print(f"  - Frame {frame_id}: No face detected.")
-                pass
-        
-        frame_id += 1
-
-    cap.release()
-    pass1_time = time.time() - start_time
-    print(f"--- [Pass 1/2] Complete. Found {len(all_embeddings)} faces in {pass1_time:.2f} seconds. ---")
-
-    # --- Pass 2: Analyze the collected embeddings (this is extremely fast) ---
-    print("--- [Pass 2/2] Analyzing embedding consistency... ---")
-    
-    if len(all_embeddings) < 2:
-        # If we found 0 or 1 face, we can't determine consistency.
-        print("-> Not enough faces found to determine consistency.")
-        return 75 # Return a neutral score
-
-    first_face_embedding = all_embeddings[0]
-    matching_faces = 0
-    threshold = 0.4  # Cosine distance threshold for VGG-Face
-
-    for embedding in all_embeddings:
-        distance = cosine(embedding, first_face_embedding)
-        if distance < threshold:
-            matching_faces += 1
-            
-    consistency_score = int((matching_faces / len(all_embeddings)) * 100)
-    
-    print(f"-> [Video Specialist] Analysis complete. Consistency: {consistency_score}%")
-    return consistency_score
+    collector = FacialConsistencyCollector(sample_rate, max_frames_to_check, batch_size, cascade, adaptive)
+    collector.register(pipeline)
+    pipeline.run()
+    collector.refine(video_path)
+    return collector.result()
@@ -0,0 +1,186 @@
+# modules/frame_source.py
+import time
+
+import cv2
+
+from . import telemetry
+
+# If the next frame any consumer wants is further away than this, we seek instead of grabbing.
+# Seeking lands on the nearest keyframe and decodes forward, so it only pays off on big gaps.
+SEEK_GAP = 120
+
+
+class FramePipeline:
+    """
+    Decodes a video ONCE and fans the frames out to every registered consumer.
+    Each consumer states which frames it wants (a stride or an explicit frame set),
+    and frames that nobody asked for are skipped with grab()/seek and never decoded.
+    A pipeline can be limited to the frame range [start_frame, end_frame) (e.g. one shard
+    of a long video, see modules/sharding.py); frame ids stay relative to the whole video.
+    """
+
+    def __init__(self, video_path, start_frame=0, end_frame=None):
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(video_path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.start_frame = start_frame
+        self.end_frame = end_frame if end_frame is not None else self.frame_count
+        self.frames_decoded = 0
+        self._consumers = []
+
+    @property
+    def range_frames(self):
+        """Number of frames in this pipeline's range (0 if the container doesn't say)."""
+        return max(0, self.end_frame - self.start_frame)
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def register(self, consumer, stride=1, frames=None, max_frames=None):
+        """
+        Registers a consumer callable `consumer(frame_id, frame)`.
+        - stride: deliver every Nth frame (ignored if `frames` is given).
+        - frames: an explicit iterable of frame ids to deliver.
+        - max_frames: stop delivering to this consumer after N frames.
+        A consumer can also return False to unsubscribe itself early.
+        """
+        wanted = sorted(set(frames)) if frames is not None else None
+        self._consumers.append({
+            "consumer": consumer, "stride": max(1, int(stride)), "frames": wanted,
+            "cursor": 0, "delivered": 0, "max_frames": max_frames, "active": True, "seconds": 0.0,
+        })
+
+    def _next_wanted(self, entry, frame_id):
+        """Returns the first frame id >= frame_id that this consumer wants, or None."""
+        if not entry["active"]:
+            return None
+        if entry["max_frames"] is not None and entry["delivered"] >= entry["max_frames"]:
+            entry["active"] = False
+            return None
+        if entry["frames"] is not None:
+            wanted = entry["frames"]
+            while entry["cursor"] < len(wanted) and wanted[entry["cursor"]] < frame_id:
+                entry["cursor"] += 1
+            if entry["cursor"] >= len(wanted):
+                entry["active"] = False
+                return None
+            return wanted[entry["cursor"]]
+        stride = entry["stride"]
+        return frame_id if frame_id % stride == 0 else frame_id + (stride - frame_id % stride)
+
+    def run(self):
+        """Walks the video once, decoding only the frames at least one consumer wants."""
+        with telemetry.span("frame_pipeline", start_frame=self.start_frame, end_frame=self.end_frame) as span:
+            frames = self._run()
+            # Per-consumer time is summed in the loop (two clock reads per delivery); the rest is decoding
+            consumer_seconds = {}
+            for entry in self._consumers:
+                name = type(entry["consumer"]).__name__
+                consumer_seconds[name] = consumer_seconds.get(name, 0.0) + entry["seconds"]
+            span.set(frames_decoded=frames, consumer_seconds=consumer_seconds,
+                     decode_seconds=span.elapsed - sum(consumer_seconds.values()))
+        return frames
+
+    def _run(self):
+        if not self.cap.isOpened():
+            print("!! [Frame Source] Error opening video file")
+            return 0
+
+        position = 0  # Index of the frame the next grab() will return
+        if self.start_frame > 0:
+            # Shards start on keyframes, so this seek decodes nothing it doesn't deliver
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+            position = self.start_frame
+        while True:
+            targets = [t for t in (self._next_wanted(e, position) for e in self._consumers) if t is not None]
+            if not targets:
+                break
+            target = min(targets)
+            if self.end_frame and target >= self.end_frame:
+                break
+
+            if target - position > SEEK_GAP:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                position = target
+            while position < target:
+                if not self.cap.grab():
+                    return self._finish()
+                position += 1
+
+            if not self.cap.grab():
+                break
+            ok, frame = self.cap.retrieve()
+            position += 1
+            if not ok:
+                break
+            self.frames_decoded += 1
+
+            for entry in self._consumers:
+                if self._next_wanted(entry, target) != target:
+                    continue
+                entry["delivered"] += 1
+                if entry["frames"] is not None:
+                    entry["cursor"] += 1
+                started = time.perf_counter()
+                keep = entry["consumer"](target, frame)
+                entry["seconds"] += time.perf_counter() - started
+                if keep is False:
+                    entry["active"] = False
+
+        return self._finish()
+
+    def _finish(self):
+        self.cap.release()
+        print(f"-> [Frame Source] Decoded {self.frames_decoded} frames for {len(self._consumers)} consumer(s).")
+        return self.frames_decoded
+
+
+def run_video_analyses(video_path, sample_rate=30, max_frames_to_check=20, content_hash=None, cache=None, fast_gaze=True,
+                       adaptive_face=True):
+    """
+    Runs the facial consistency and gaze/blink analyzers off a SINGLE decode of the video.
+    fast_gaze runs the gaze analyzer in its fast mode (reduced frame rate, face ROI crops).
+    adaptive_face treats max_frames_to_check as a budget for the face analyzer's adaptive
+    sampler: its coarse sweep shares the decode, and any refinement rounds seek afterwards.
+    If a ResultCache and the video's content hash are given, analyzers with a cached
+    result are not registered at all (and if both are cached, nothing is decoded).
+    Returns (face_score, gaze_score, face_embeddings, face_report).
+    """
+    # Imported here so frame_source stays importable without DeepFace/MediaPipe
+    from . import face_analyzer, gaze_analyzer
+
+    face_params = {"sample_rate": sample_rate, "max_frames_to_check": max_frames_to_check, "adaptive": adaptive_face}
+    gaze_params = {"ear_threshold": gaze_analyzer.EAR_THRESHOLD, "fast": fast_gaze}
+    face_cached = cache.get(content_hash, "face", face_analyzer.MODULE_VERSION, face_params) if cache else None
+    gaze_cached = cache.get(content_hash, "gaze", gaze_analyzer.MODULE_VERSION, gaze_params) if cache else None
+    if face_cached is not None and gaze_cached is not None:
+        return face_cached["score"], gaze_cached["score"], face_cached["embeddings"], face_cached["report"]
+
+    print("-> [Frame Source] Running shared-decode video analysis (Face + Gaze)...")
+    pipeline = FramePipeline(video_path)
+    if not pipeline.is_opened():
+        print("!! Error opening video file")
+        return 0, 50, None, None
+
+    face_collector = gaze_collector = None
+    if face_cached is None:
+        face_collector = face_analyzer.FacialConsistencyCollector(sample_rate, max_frames_to_check, adaptive=adaptive_face)
+        face_collector.register(pipeline)
+    if gaze_cached is None:
+        gaze_collector = gaze_analyzer.GazeBlinkCollector(fast=fast_gaze)
+        gaze_collector.register(pipeline)
+    pipeline.run()
+
+    if face_cached is None:
+        face_collector.refine(video_path)
+        face_cached = {"score": face_collector.result(), "embeddings": face_collector.embeddings,
+                       "report": face_collector.report}
+        if cache:
+            cache.put(content_hash, "face", face_analyzer.MODULE_VERSION, face_params, face_cached)
+    if gaze_cached is None:
+        gaze_cached = {"score": gaze_collector.result()}
+        if cache:
+            cache.put(content_hash, "gaze", gaze_analyzer.MODULE_VERSION, gaze_params, gaze_cached)
+
+    return face_cached["score"], gaze_cached["score"], face_cached["embeddings"], face_cached["report"]
@@ -1,94 +1,261 @@
 # modules/gaze_analyzer_mediapipe.py
+import time
+from collections import deque
+
 import cv2
-import mediapipe as mp
 import numpy as np
 
-# --- Setup MediaPipe models (this happens once) ---
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(
-    max_num_faces=1,
-    refine_landmarks=True, # This is key for getting detailed eye landmarks
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+from . import model_registry, telemetry
+from .frame_source import FramePipeline
+
+# --- Setup MediaPipe models (loaded lazily, on first use) ---
+def _load_face_mesh(static_image_mode=False):
+    import mediapipe as mp
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=static_image_mode,
+        max_num_faces=1,
+        refine_landmarks=True, # This is key for getting detailed eye landmarks
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+# FaceMesh keeps tracking state between frames and isn't thread-safe, so each thread gets its own
+model_registry.register("face_mesh", _load_face_mesh, per_thread=True)
+# Tracking mode assumes consecutive full frames; strided, moving ROI crops need a fresh detection each time
+model_registry.register("face_mesh_static", lambda: _load_face_mesh(static_image_mode=True), per_thread=True)
 
 # These are the specific landmark indices for the eyes from MediaPipe's documentation
 # You can find a diagram here: https://github.com/google/mediapipe/blob/master/mediapipe/python/solutions/face_mesh_connections.py
 LEFT_EYE_IDXS = [362, 382, 381, 380, 373, 374, 390, 249, 263, 466, 388, 387, 386, 385, 384, 398]
 RIGHT_EYE_IDXS = [33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246]
 
-def calculate_ear_mediapipe(landmarks, eye_idxs, frame_shape ):
-    """Calculates the Eye Aspect Ratio (EAR) using MediaPipe landmarks."""
-    # Get the coordinates of the eye landmarks
-    coords = np.array([(landmarks[i].x * frame_shape[1], landmarks[i].y * frame_shape[0]) for i in eye_idxs])
-    
-    # The MediaPipe indices for vertical and horizontal points are different from dlib's
-    # Vertical distances (approximated)
-    A = np.linalg.norm(coords[4] - coords[12])  # Top to bottom
-    B = np.linalg.norm(coords[2] - coords[14])  # Inner top to inner bottom
-    
-    # Horizontal distance
-    C = np.linalg.norm(coords[0] - coords[8])   # Left corner to right corner
-    
-    # Compute the eye aspect ratio
-    ear = (A + B) / (2.0 * C)
-    return ear
-
-def analyze_gaze_and_blinking_mediapipe(video_path):
+EAR_THRESHOLD = 0.20  # Threshold for MediaPipe might be different, requires tuning
+
+# Bump when the analysis logic changes, so cached results from older versions are ignored.
+MODULE_VERSION = "3"
+
+# --- Fast, vectorized blink analysis ---
+# Only the six points per eye that the EAR formula uses: positions 0 and 8 of each eye contour are
+# the corners, 4/12 the top and bottom, 2/14 the inner top and bottom (see compute_ear_series)
+EAR_POINT_IDXS = np.array([[eye[i] for i in (0, 2, 4, 8, 12, 14)] for eye in (LEFT_EYE_IDXS, RIGHT_EYE_IDXS)])
+# Forehead, chin and both cheeks: enough to track a face box for the ROI crop
+FACE_BOX_IDXS = [10, 152, 234, 454]
+
+MIN_BLINK_FPS = 15    # A blink lasts ~100-400 ms; sampling every <=67 ms lands at least one frame inside every blink
+ROI_MARGIN = 0.35     # How much the tracked face box is grown (per side) before cropping
+DEFAULT_FPS = 30      # Only used when the container doesn't report a frame rate
+
+def compute_ear_series(eye_points):
     """
-    Analyzes a video to detect unnatural blinking patterns using MediaPipe.
-    Returns a Gaze Authenticity Score (0-100).
+    Vectorized EAR over a whole time series. `eye_points` has shape (frames, 2 eyes, 6 points, 2)
+    in pixels, NaN where no face was found. Returns one EAR per frame (NaN if no face).
     """
-    print("-> [Add-On] Running Gaze & Blinking Analysis (using MediaPipe)...")
-    
-    EAR_THRESHOLD = 0.20  # Threshold for MediaPipe might be different, requires tuning
-    
-    blink_count = 0
-    frame_count = 0
-    is_blinking = False
-    
-    cap = cv2.VideoCapture(video_path)
-    
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success:
-            break
-            
-        frame_count += 1
-        # Convert the BGR image to RGB and process it with MediaPipe Face Mesh.
-        results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                # Calculate EAR for both eyes
-                left_ear = calculate_ear_mediapipe(face_landmarks.landmark, LEFT_EYE_IDXS, frame.shape)
-                right_ear = calculate_ear_mediapipe(face_landmarks.landmark, RIGHT_EYE_IDXS, frame.shape)
-                ear = (left_ear + right_ear) / 2.0
-                
-                # Detect a blink
-                if ear < EAR_THRESHOLD:
-                    if not is_blinking:
-                        blink_count += 1
-                        is_blinking = True # Mark that a blink has started
-                else:
-                    is_blinking = False # Reset the blink state
-
-    cap.release()
-    
-    # Calculate blinks per minute (BPM)
-    fps = 30 # Assume 30 FPS, or get it from cap.get(cv2.CAP_PROP_FPS)
-    duration_seconds = frame_count / fps if fps > 0 else 0
-    if duration_seconds == 0: return 50
-    
-    blinks_per_minute = (blink_count / duration_seconds) * 60
-    
+    A = np.linalg.norm(eye_points[:, :, 2] - eye_points[:, :, 4], axis=-1)  # Top to bottom
+    B = np.linalg.norm(eye_points[:, :, 1] - eye_points[:, :, 5], axis=-1)  # Inner top to inner bottom
+    C = np.linalg.norm(eye_points[:, :, 0] - eye_points[:, :, 3], axis=-1)  # Left corner to right corner
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return ((A + B) / (2.0 * C)).mean(axis=1)
+
+def find_blink_onsets(ear_series, threshold=EAR_THRESHOLD):
+    """
+    Indices of the samples where a blink starts (EAR drops below the threshold).
+    As in the frame-by-frame loop, samples without a face keep the previous open/closed state.
+    """
+    valid = ~np.isnan(ear_series)
+    closed = np.zeros(len(ear_series), dtype=bool)
+    closed[valid] = ear_series[valid] < threshold
+    # Carry the last known state forward across samples where no face was found
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(ear_series)), 0))
+    state = closed[last_valid] & valid[last_valid]
+    previous = np.concatenate(([False], state[:-1]))
+    return np.flatnonzero(state & ~previous)
+
+def eye_points_from_landmarks(landmarks, box, out=None):
+    """
+    The six EAR points per eye, in frame pixels, from FaceMesh landmarks computed on the crop
+    `box` (x0, y0, x1, y1). Written into `out` (shape (2, 6, 2)) if given.
+    """
+    x0, y0, x1, y1 = box
+    crop_w, crop_h = x1 - x0, y1 - y0
+    points = out if out is not None else np.empty((2, 6, 2), dtype=np.float32)
+    for eye in range(2):
+        for p, idx in enumerate(EAR_POINT_IDXS[eye]):
+            points[eye, p, 0] = landmarks[idx].x * crop_w + x0
+            points[eye, p, 1] = landmarks[idx].y * crop_h + y0
+    return points
+
+def gaze_score_from_bpm(blinks_per_minute):
     # Score based on a normal human blinking rate (15-30 BPM)
     if 10 < blinks_per_minute < 35:
-        gaze_score = 95
+        return 95
     elif blinks_per_minute <= 5:
-        gaze_score = 10 # Unnaturally low, strong deepfake signal
-    else:
-        gaze_score = 50 # Outside the normal range
-        
-    print(f"-> [Add-On] Blinks Per Minute: {blinks_per_minute:.2f}. Gaze Score: {gaze_score}/100")
-    return gaze_score
+        return 10 # Unnaturally low, strong deepfake signal
+    return 50 # Outside the normal range
+
+class GazeBlinkCollector:
+    """
+    Frame consumer for the shared FramePipeline. It runs FaceMesh on the frames it is handed
+    and records the EAR landmarks into a preallocated NumPy time series; result() then finds
+    the blinks in one vectorized pass and turns them into a Gaze Authenticity Score.
+
+    In fast mode it only asks the pipeline for the minimum frame rate that still resolves
+    blinks (MIN_BLINK_FPS), and runs FaceMesh on a crop around the tracked face instead of
+    the full frame. Since those crops move and skip frames, fast mode uses FaceMesh in
+    static-image mode rather than its tracking mode.
+    """
+
+    def __init__(self, fast=False):
+        self.fast = fast
+        self.face_mesh = model_registry.get("face_mesh_static" if fast else "face_mesh")
+        self.fps = DEFAULT_FPS
+        self.stride = 1
+        self.samples = 0
+        self.start_frame = 0
+        self.last_frame_id = -1
+        self.roi = None # (x0, y0, x1, y1) of the tracked face, in pixels
+        self.face_mesh_seconds = 0.0
+        self.eye_points = np.full((1024, 2, 6, 2), np.nan, dtype=np.float32)
+        self.report = None
+
+    def register(self, pipeline):
+        self.fps = pipeline.fps or DEFAULT_FPS
+        if self.fast:
+            self.stride = max(1, int(self.fps // MIN_BLINK_FPS))
+        self.start_frame = pipeline.start_frame
+        self.last_frame_id = pipeline.start_frame - 1
+        if pipeline.range_frames:
+            self.eye_points = np.full((pipeline.range_frames // self.stride + 1, 2, 6, 2), np.nan, dtype=np.float32)
+        pipeline.register(self, stride=self.stride)
+
+    def _run_face_mesh(self, frame, box):
+        x0, y0, x1, y1 = box
+        crop = frame[y0:y1, x0:x1]
+        # Convert the BGR image to RGB and process it with MediaPipe Face Mesh.
+        results = self.face_mesh.process(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        if not results.multi_face_landmarks:
+            return None
+        return results.multi_face_landmarks[0].landmark
+
+    def _crop_box(self, frame_shape):
+        height, width = frame_shape[:2]
+        if not self.fast or self.roi is None:
+            return (0, 0, width, height)
+        x0, y0, x1, y1 = self.roi
+        pad_x, pad_y = (x1 - x0) * ROI_MARGIN, (y1 - y0) * ROI_MARGIN
+        return (max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y)),
+                min(width, int(x1 + pad_x)), min(height, int(y1 + pad_y)))
+
+    def measure(self, frame, out=None):
+        """
+        Runs FaceMesh on one frame (on the tracked ROI in fast mode) and returns its EAR eye
+        points (shape (2, 6, 2), written into `out` if given), or None if there is no face.
+        """
+        box = self._crop_box(frame.shape)
+        landmarks = self._run_face_mesh(frame, box)
+        if landmarks is None and box[2] - box[0] < frame.shape[1]:
+            # Lost the face inside the ROI: fall back to the full frame
+            box = (0, 0, frame.shape[1], frame.shape[0])
+            landmarks = self._run_face_mesh(frame, box)
+        if landmarks is None:
+            self.roi = None
+            return None
+
+        points = eye_points_from_landmarks(landmarks, box, out=out)
+        if self.fast:
+            x0, y0, x1, y1 = box
+            crop_w, crop_h = x1 - x0, y1 - y0
+            xs = [landmarks[i].x * crop_w + x0 for i in FACE_BOX_IDXS]
+            ys = [landmarks[i].y * crop_h + y0 for i in FACE_BOX_IDXS]
+            self.roi = (min(xs), min(ys), max(xs), max(ys))
+        return points
+
+    def __call__(self, frame_id, frame):
+        if self.samples >= len(self.eye_points): # Container under-reported its frame count
+            grown = np.full((len(self.eye_points) * 2, 2, 6, 2), np.nan, dtype=np.float32)
+            grown[:self.samples] = self.eye_points[:self.samples]
+            self.eye_points = grown
+        row = self.samples
+        self.samples += 1
+        self.last_frame_id = frame_id
+        started = time.perf_counter()
+        self.measure(frame, out=self.eye_points[row])
+        self.face_mesh_seconds += time.perf_counter() - started
+
+    def result(self):
+        ear_series = compute_ear_series(self.eye_points[:self.samples])
+        blink_count = len(find_blink_onsets(ear_series))
+        telemetry.annotate(gaze_frames_analyzed=self.samples, blink_count=blink_count,
+                           gaze_face_mesh_seconds=self.face_mesh_seconds)
+        telemetry.count("sentinel_model_calls_total", self.samples, model="face_mesh")
+
+        # Calculate blinks per minute (BPM), using the container's real frame rate
+        duration_seconds = (self.last_frame_id + 1 - self.start_frame) / self.fps if self.fps > 0 else 0
+        if duration_seconds == 0: return 50
+
+        blinks_per_minute = (blink_count / duration_seconds) * 60
+        gaze_score = gaze_score_from_bpm(blinks_per_minute)
+        self.report = {"blink_count": blink_count, "duration_seconds": duration_seconds,
+                       "blinks_per_minute": blinks_per_minute, "frames_analyzed": self.samples}
+
+        print(f"-> [Add-On] Blinks Per Minute: {blinks_per_minute:.2f}. Gaze Score: {gaze_score}/100")
+        return gaze_score
+
+
+class BlinkCounter:
+    """
+    Incremental counterpart of find_blink_onsets for live streams: feed it one EAR value per
+    analyzed frame (NaN when no face was found, which keeps the previous open/closed state)
+    and it keeps the blink onsets of the last `window_seconds`, so memory stays bounded.
+    """
+
+    def __init__(self, window_seconds=60.0, threshold=EAR_THRESHOLD):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.closed = False
+        self.onsets = deque()
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+    def update(self, timestamp, ear):
+        """Records one sample; returns True if a blink started on it."""
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+        blinked = False
+        if not np.isnan(ear):
+            closed = ear < self.threshold
+            blinked = closed and not self.closed
+            self.closed = closed
+        if blinked:
+            self.onsets.append(timestamp)
+        while self.onsets and self.onsets[0] < timestamp - self.window_seconds:
+            self.onsets.popleft()
+        return blinked
+
+    def blinks_per_minute(self):
+        """Blink rate over the rolling window (or over everything seen, while the window fills)."""
+        if self.first_timestamp is None:
+            return None
+        span = min(self.window_seconds, self.last_timestamp - self.first_timestamp)
+        return len(self.onsets) / span * 60 if span > 0 else None
+
+    def score(self):
+        bpm = self.blinks_per_minute()
+        return gaze_score_from_bpm(bpm) if bpm is not None else 50
+
+
+def analyze_gaze_and_blinking_mediapipe(video_path, fast=False):
+    """
+    Analyzes a video to detect unnatural blinking patterns using MediaPipe.
+    Returns a Gaze Authenticity Score (0-100).
+    fast=True samples at the minimum blink-resolving frame rate and crops to the face.
+    To share the decode with other analyzers, register a GazeBlinkCollector on a
+    FramePipeline instead (see run_video_analyses).
+    """
+    print("-> [Add-On] Running Gaze & Blinking Analysis (using MediaPipe)...")
+
+    pipeline = FramePipeline(video_path)
+    collector = GazeBlinkCollector(fast=fast)
+    collector.register(pipeline)
+    pipeline.run()
+    return collector.result()
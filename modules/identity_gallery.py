@@ -0,0 +1,176 @@
+# modules/identity_gallery.py
+import os
+import json
+import time
+import tempfile
+import threading
+
+import numpy as np
+
+GALLERY_DIR = os.environ.get("SENTINEL_GALLERY_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sentinel", "gallery"))
+MATCH_THRESHOLD = 0.4  # Cosine distance threshold for VGG-Face, same as the consistency check
+INITIAL_CAPACITY = 256
+
+
+def _normalize(embeddings):
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class IdentityGallery:
+    """
+    A persistent gallery of verified identities (e.g. Act 1 baselines).
+    Each identity is one L2-normalized centroid row in a memory-mapped float32 matrix
+    (embeddings.f32), with ids and metadata in a JSON sidecar (gallery.json). Lookups are a
+    single matrix-vector product over the mapped rows, so even thousands of identities are
+    matched in milliseconds while only the touched pages are resident in memory.
+    Freed rows (from remove()) are reused by later add() calls.
+    """
+
+    def __init__(self, root=GALLERY_DIR):
+        self.root = root
+        self.matrix_path = os.path.join(root, "embeddings.f32")
+        self.index_path = os.path.join(root, "gallery.json")
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._index = self._load_index()
+        self._matrix = self._open_matrix() if self._index["dim"] else None
+
+    # --- Storage ---
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"dim": 0, "capacity": 0, "rows": [], "free": []}
+
+    def _save_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _open_matrix(self):
+        shape = (self._index["capacity"], self._index["dim"])
+        return np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=shape)
+
+    def _grow(self, dim, needed):
+        """Creates or enlarges the matrix file so it has room for `needed` rows."""
+        capacity = self._index["capacity"]
+        if self._index["dim"] == 0:
+            self._index["dim"] = dim
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        if new_capacity == capacity and self._matrix is not None:
+            return
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(new_capacity * dim * 4)  # Zero-filled, sparse on most filesystems
+        self._index["capacity"] = new_capacity
+        self._matrix = self._open_matrix()
+
+    # --- Public API ---
+
+    def __len__(self):
+        return sum(1 for row in self._index["rows"] if row is not None)
+
+    def identities(self):
+        """{identity_id: metadata} for every identity in the gallery."""
+        return {row["id"]: row["metadata"] for row in self._index["rows"] if row is not None}
+
+    def _live_mask(self):
+        return np.array([row is not None for row in self._index["rows"]], dtype=bool)
+
+    def _row_of(self, identity_id):
+        for i, row in enumerate(self._index["rows"]):
+            if row is not None and row["id"] == identity_id:
+                return i
+        return None
+
+    def add(self, identity_id, embeddings, metadata=None):
+        """
+        Adds an identity from one or more of its face embeddings (their normalized mean is
+        stored). Adding to an existing id merges the new embeddings into its centroid.
+        """
+        embeddings = _normalize(embeddings)
+        if len(embeddings) == 0:
+            raise ValueError("At least one embedding is needed to add an identity")
+        with self._lock:
+            if self._index["dim"] and embeddings.shape[1] != self._index["dim"]:
+                raise ValueError(f"Embedding size {embeddings.shape[1]} doesn't match the gallery's {self._index['dim']}")
+            row_id = self._row_of(identity_id)
+            count = len(embeddings)
+            centroid = embeddings.sum(axis=0)
+            if row_id is not None:
+                previous = self._index["rows"][row_id]
+                centroid += np.asarray(self._matrix[row_id]) * previous["count"]
+                count += previous["count"]
+                metadata = {**previous["metadata"], **(metadata or {})}
+            elif self._index["free"]:
+                row_id = self._index["free"].pop()
+            else:
+                row_id = len(self._index["rows"])
+                self._index["rows"].append(None)
+                self._grow(embeddings.shape[1], row_id + 1)
+
+            self._matrix[row_id] = _normalize(centroid)[0]
+            self._matrix.flush()
+            self._index["rows"][row_id] = {"id": identity_id, "count": count, "added_at": time.time(),
+                                           "metadata": metadata or {}}
+            self._save_index()
+        print(f"-> [Gallery] Stored identity '{identity_id}' ({count} embeddings). Gallery size: {len(self)}")
+
+    def remove(self, identity_id):
+        """Removes an identity. Returns True if it was in the gallery."""
+        with self._lock:
+            row_id = self._row_of(identity_id)
+            if row_id is None:
+                return False
+            self._matrix[row_id] = 0.0 # A zero row can never match anything
+            self._matrix.flush()
+            self._index["rows"][row_id] = None
+            self._index["free"].append(row_id)
+            self._save_index()
+        return True
+
+    def search(self, queries, k=5):
+        """
+        Vectorized top-k cosine search. For each query embedding returns up to k
+        (identity_id, cosine_distance) pairs, closest first.
+        """
+        if self._matrix is None or len(self) == 0:
+            return [[] for _ in np.atleast_2d(queries)]
+        queries = _normalize(queries)
+        used = len(self._index["rows"])
+        similarities = queries @ np.asarray(self._matrix[:used]).T # (queries, rows)
+        similarities[:, ~self._live_mask()] = -np.inf
+        k = min(k, len(self))
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = []
+        for q, candidates in enumerate(top):
+            ranked = candidates[np.argsort(-similarities[q, candidates])]
+            results.append([(self._index["rows"][r]["id"], float(1 - similarities[q, r])) for r in ranked])
+        return results
+
+    def match(self, embeddings, k=3, threshold=MATCH_THRESHOLD):
+        """
+        Matches a whole video's face embeddings against the gallery. Returns up to k
+        candidates, best first, each with its mean cosine distance to the video's faces
+        and the fraction of faces within the match threshold.
+        """
+        embeddings = _normalize(embeddings) if embeddings is not None and len(embeddings) else None
+        if embeddings is None or self._matrix is None or len(self) == 0:
+            return []
+        used = len(self._index["rows"])
+        distances = 1 - embeddings @ np.asarray(self._matrix[:used]).T # (faces, rows)
+        mean_distance = distances.mean(axis=0)
+        mean_distance[~self._live_mask()] = np.inf
+        ranked = np.argsort(mean_distance)[:min(k, len(self))]
+        return [{"identity_id": self._index["rows"][r]["id"], "distance": float(mean_distance[r]),
+                 "match_fraction": float((distances[:, r] < threshold).mean()),
+                 "metadata": self._index["rows"][r]["metadata"]} for r in ranked]
@@ -1,81 +1,315 @@
 # modules/intelligence_analyzer.py (Now uses the dedicated translator module)
-from faster_whisper import WhisperModel
-import requests
 import re
+import time
 # --- THIS IS THE NEW IMPORT ---
 from .translator import translate_to_english # Use a relative import for modules in the same package
+from . import llm_client
+from . import model_registry
+from . import text_triage
+from . import telemetry
 
 # --- Setup Local Models ---
-print("[Setup] Loading local Whisper model...")
-whisper_model = WhisperModel("base", device="cpu", compute_type="int8")
-OLLAMA_URL = "http://localhost:11434/api/chat"
-print("[Setup] Models loaded." )
+WHISPER_MODEL_SIZE = "base"
+LLM_MODEL = "llama3"
+# Bump when the prompt or parsing changes, so cached results from older versions are ignored.
+MODULE_VERSION = "2"
 
-def analyze_content_risk(text_to_analyze):
-    """
-    Analyzes a given string of text for risk using a local LLM.
-    """
-    if not text_to_analyze or not isinstance(text_to_analyze, str) or len(text_to_analyze.split()) < 2:
-        return 0, "Not enough text to analyze."
-    # NEW, UPGRADED PROMPT
-    system_prompt = """
-        You are a sophisticated media and security analyst. Your task is to analyze text for signs of manipulation, misinformation, and emotional exploitation. You must assign a risk score from 0 (completely safe, neutral journalism) to 100 (dangerous, highly manipulative propaganda).
+def _load_whisper():
+    from faster_whisper import WhisperModel
+    print("[Setup] Loading local Whisper model...")
+    return WhisperModel(WHISPER_MODEL_SIZE, device="cpu", compute_type="int8")
+
+model_registry.register("whisper", _load_whisper)
+
+
+class TranscriptionError(Exception):
+    """Raised by the streaming analysis when Whisper itself fails (as opposed to scoring a window)."""
+
+# NEW, UPGRADED PROMPT
+RISK_SYSTEM_PROMPT = """
+    You are a sophisticated media and security analyst. Your task is to analyze text for signs of manipulation, misinformation, and emotional exploitation. You must assign a risk score from 0 (completely safe, neutral journalism) to 100 (dangerous, highly manipulative propaganda).
+
+    Consider the following factors in your score:
+    - **Urgency & Panic:** Does it use alarmist language (e.g., 'URGENT', 'IMMEDIATE ACTION') to create panic?
+    - **Emotional Language:** Does it use emotionally charged or exaggerated words (e.g., 'catastrophic', 'shocking heist', 'crisis') instead of neutral terms?
+    - **Misleading Framing:** Does it frame a standard event as a dramatic, world-changing crisis?
+    - **Trustworthiness:** Does it sound like a professional, objective report or like biased, sensationalist propaganda?
 
-        Consider the following factors in your score:
-        - **Urgency & Panic:** Does it use alarmist language (e.g., 'URGENT', 'IMMEDIATE ACTION') to create panic?
-        - **Emotional Language:** Does it use emotionally charged or exaggerated words (e.g., 'catastrophic', 'shocking heist', 'crisis') instead of neutral terms?
-        - **Misleading Framing:** Does it frame a standard event as a dramatic, world-changing crisis?
-        - **Trustworthiness:** Does it sound like a professional, objective report or like biased, sensationalist propaganda?
+    A standard, professional news report should receive a score of 20 or less. A highly manipulative text designed to create fear and panic should receive a score of 70 or more.
 
-        A standard, professional news report should receive a score of 20 or less. A highly manipulative text designed to create fear and panic should receive a score of 70 or more.
+    Respond ONLY in the format: 'Score: [0-100]. Justification: [reasoning].'
+"""
 
-        Respond ONLY in the format: 'Score: [0-100]. Justification: [reasoning].'
+# Matches the score only once it is complete, i.e. followed by a non-digit
+EARLY_SCORE_PATTERN = re.compile(r'Score:\s*(\d+)\D')
+
+def _has_enough_text(text_to_analyze):
+    return bool(text_to_analyze) and isinstance(text_to_analyze, str) and len(text_to_analyze.split()) >= 2
+
+def parse_risk_response(analysis):
+    """Parses an LLM reply in the 'Score: NN. Justification: ...' format into (score, justification)."""
+    score_match = re.search(r'Score:\s*(\d+)', analysis)
+    risk_score = int(score_match.group(1)) if score_match else 0
+    
+    just_match = re.search(r'Justification:\s*(.*)', analysis, re.DOTALL)
+    justification = just_match.group(1).strip() if just_match else "No justification provided."
+    return risk_score, justification
+
+def assess_content_risk(text_to_analyze, use_triage=True):
     """
-    payload = {
-        "model": "llama3",
-        "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": text_to_analyze}],
-        "stream": False
-    }
+    Scores a text's risk, trying the local lexical triage first (see modules/text_triage.py):
+    only texts it finds ambiguous are sent to the LLM. Returns a dict with "score",
+    "justification" and "source" ("triage", "llm", "none" if there was nothing to score, or
+    "error" if the LLM call failed, so callers can tell an outage from a real low score).
+    """
+    if not _has_enough_text(text_to_analyze):
+        return {"score": 0, "justification": "Not enough text to analyze.", "source": "none"}
+    if use_triage:
+        result = text_triage.triage(text_to_analyze)
+        if not result["escalate_risk"]:
+            return {"score": result["risk_score"], "justification": text_triage.triage_justification(result),
+                    "source": "triage"}
     try:
-        response = requests.post(OLLAMA_URL, json=payload).json()
-        analysis = response['message']['content']
-        
-        score_match = re.search(r'Score:\s*(\d+)', analysis)
-        risk_score = int(score_match.group(1)) if score_match else 0
-        
-        just_match = re.search(r'Justification:\s*(.*)', analysis, re.DOTALL)
-        justification = just_match.group(1).strip() if just_match else "No justification provided."
-        
-        return risk_score, justification
+        analysis = llm_client.ask(text_to_analyze, system_prompt=RISK_SYSTEM_PROMPT, model=LLM_MODEL)
+        risk_score, justification = parse_risk_response(analysis)
     except Exception as e:
         print(f"!! Ollama Error in analyze_content_risk: {e}")
-        return 0, "Ollama analysis failed."
+        return {"score": 0, "justification": "Ollama analysis failed.", "source": "error"}
+    return {"score": risk_score, "justification": justification, "source": "llm"}
 
-def analyze_audio_and_content(audio_path):
+def analyze_content_risk(text_to_analyze, use_triage=True):
     """
-    A unified module that now uses the dedicated translator module.
+    Analyzes a given string of text for risk, using the local triage and, when it is
+    unsure, the local LLM. Returns (risk_score, justification).
     """
-    print("-> [Add-On] Running Full Intelligence Analysis...")
-    
-    # --- Part 1: Transcription ---
+    assessment = assess_content_risk(text_to_analyze, use_triage)
+    return assessment["score"], assessment["justification"]
+
+def stream_content_risk(text_to_analyze, on_score=None, use_triage=True):
+    """
+    Streaming version of analyze_content_risk for the UI. Yields the LLM's reply token by
+    token, and calls on_score(score) as soon as 'Score: NN' has been generated, so a verdict
+    can be shown before the justification finishes. Pass the joined output to
+    parse_risk_response() for the final (score, justification).
+    Texts the local triage is sure about are answered at once, in the same format.
+    """
+    if not _has_enough_text(text_to_analyze):
+        if on_score:
+            on_score(0)
+        yield "Score: 0. Justification: Not enough text to analyze."
+        return
+    if use_triage:
+        result = text_triage.triage(text_to_analyze)
+        if not result["escalate_risk"]:
+            if on_score:
+                on_score(result["risk_score"])
+            yield f"Score: {result['risk_score']}. Justification: {text_triage.triage_justification(result)}"
+            return
+    buffer = ""
+    score_reported = False
     try:
-        segments, info = whisper_model.transcribe(audio_path)
-        transcribed_text = "".join(segment.text for segment in segments).strip()
-        detected_language = info.language
+        for token in llm_client.stream_ask(text_to_analyze, system_prompt=RISK_SYSTEM_PROMPT, model=LLM_MODEL):
+            buffer += token
+            if not score_reported:
+                match = EARLY_SCORE_PATTERN.search(buffer)
+                if match:
+                    score_reported = True
+                    if on_score:
+                        on_score(int(match.group(1)))
+            yield token
+    except Exception as e:
+        print(f"!! Ollama Error in stream_content_risk: {e}")
+        yield "Score: 0. Justification: Ollama analysis failed." if not buffer else " [stream interrupted]"
+    if not score_reported and on_score:
+        on_score(parse_risk_response(buffer)[0])
+
+def transcribe_audio(audio):
+    """
+    Transcribes the audio with Whisper. `audio` is a 16 kHz mono float32 PCM array
+    (handed to faster-whisper as-is, with no re-decode) or a path to a media file.
+    Returns (transcribed_text, detected_language), or None if transcription failed.
+    """
+    try:
+        with telemetry.span("whisper.transcribe") as span:
+            segments, info = model_registry.get("whisper").transcribe(audio)
+            segments = list(segments) # faster-whisper decodes lazily, so this is where the work happens
+            transcribed_text = "".join(segment.text for segment in segments).strip()
+            detected_language = info.language
+            span.set(audio_seconds=info.duration, segments=len(segments), language=detected_language,
+                     characters=len(transcribed_text))
         print(f"-> [Whisper] Detected language: {detected_language}. Transcript: {transcribed_text[:100]}...")
-        sync_score = 95 if len(transcribed_text.split()) > 2 else 30
+        return transcribed_text, detected_language
     except Exception as e:
         print(f"!! Whisper Error: {e}")
-        return 0, "Transcription failed.", 0, "N/A"
+        return None
+
+def analyze_transcript(transcribed_text, detected_language):
+    """
+    Translates a transcript (if needed) and scores its content risk.
+    Returns (sync_score, transcribed_text, content_risk_score, justification).
+    """
+    sync_score = 95 if len(transcribed_text.split()) > 2 else 30
 
-    # --- Part 2: Translation (Using the new translator module) ---
+    # --- Translation (Using the new translator module) ---
     # The logic is now much cleaner here.
     text_for_analysis = translate_to_english(transcribed_text, detected_language)
     if text_for_analysis != transcribed_text: # Check if translation actually happened
          print(f"-> [Translator] Translation successful: {text_for_analysis[:100]}...")
 
-    # --- Part 3: Contextual Risk Analysis ---
-    content_risk_score, justification = analyze_content_risk(text_for_analysis)
+    # --- Contextual Risk Analysis ---
+    with telemetry.span("content_risk"):
+        content_risk_score, justification = analyze_content_risk(text_for_analysis)
 
     # We return the ORIGINAL transcript for display, but the justification for the TRANSLATED text
     return sync_score, transcribed_text, content_risk_score, justification
+
+def analyze_audio_and_content(audio):
+    """
+    A unified module that now uses the dedicated translator module.
+    `audio` is a 16 kHz float32 PCM array or a path to a media file.
+    """
+    print("-> [Add-On] Running Full Intelligence Analysis...")
+    
+    transcript = transcribe_audio(audio)
+    if transcript is None:
+        return 0, "Transcription failed.", 0, "N/A"
+    return analyze_transcript(*transcript)
+
+# --- Streaming mode: score the transcript window by window as Whisper produces it ---
+
+WINDOW_SENTENCES = 3        # Sentences per scored window
+MAX_WINDOW_CHARS = 1500     # Cap for run-on speech that never ends a sentence
+SENTENCE_END = re.compile(r'[.!?。！？]["\')\]]*$')
+
+def transcribe_windows(audio, window_sentences=WINDOW_SENTENCES, on_language=None):
+    """
+    Lazily transcribes the audio with VAD filtering, grouping Whisper's segments into
+    windows of a few sentences. Yields (detected_language, start_seconds, end_seconds, text).
+    Only the current window is held in memory, however long the recording is.
+    on_language(language) is called once Whisper has detected the language, even if the
+    audio turns out to hold no speech and nothing is yielded.
+    """
+    # Whisper's time is only what is spent inside this generator, not while the caller scores a window
+    busy, resumed, segment_count = 0.0, time.perf_counter(), 0
+    segments, info = model_registry.get("whisper").transcribe(audio, vad_filter=True)
+    print(f"-> [Whisper] Detected language: {info.language}. Streaming transcript...")
+    if on_language:
+        on_language(info.language)
+    parts, sentences, window_start = [], 0, None
+    for segment in segments: # faster-whisper decodes each segment only when it is requested
+        segment_count += 1
+        if window_start is None:
+            window_start = segment.start
+        parts.append(segment.text)
+        if SENTENCE_END.search(segment.text.strip()):
+            sentences += 1
+        if sentences >= window_sentences or sum(len(p) for p in parts) >= MAX_WINDOW_CHARS:
+            busy += time.perf_counter() - resumed
+            yield info.language, window_start, segment.end, "".join(parts).strip()
+            resumed = time.perf_counter()
+            parts, sentences, window_start = [], 0, None
+    busy += time.perf_counter() - resumed
+    telemetry.record_span("whisper.transcribe", busy, audio_seconds=info.duration, segments=segment_count,
+                          language=info.language, vad_filter=True)
+    if parts:
+        yield info.language, window_start, segment.end, "".join(parts).strip()
+
+def split_text_windows(text, language, window_sentences=WINDOW_SENTENCES):
+    """Same windows as transcribe_windows, but over an existing transcript (no timestamps)."""
+    sentences = [s for s in re.split(r'(?<=[.!?。！？])\s+', text.strip()) if s]
+    for i in range(0, len(sentences), window_sentences):
+        yield language, None, None, " ".join(sentences[i:i + window_sentences])
+
+def score_windows(windows):
+    """
+    Translates and risk-scores each transcript window as it arrives. Yields one dict per
+    window with its own score and justification, plus the running aggregate so far:
+    `running_risk` (length-weighted mean) and `peak_risk` (the riskiest window, which is
+    what the final content risk score reports).
+    A window whose translation or scoring raises gets source "error" and a score of 0, so one
+    bad window neither stops the transcript nor is mistaken for a Whisper failure.
+    """
+    weighted_sum, total_weight, peak_risk = 0.0, 0, 0
+    for index, (language, start, end, text) in enumerate(windows):
+        if not text:
+            continue
+        with telemetry.span("content_risk", window=index) as span:
+            try:
+                text_for_analysis = translate_to_english(text, language)
+                assessment = assess_content_risk(text_for_analysis)
+            except Exception as e:
+                print(f"!! [Content Risk] Scoring window {index} failed: {e}")
+                text_for_analysis = text
+                assessment = {"score": 0, "justification": "Risk scoring failed.", "source": "error"}
+            span.set(source=assessment["source"], risk_score=assessment["score"])
+        risk_score, justification = assessment["score"], assessment["justification"]
+        weight = len(text_for_analysis.split())
+        weighted_sum += risk_score * weight
+        total_weight += weight
+        peak_risk = max(peak_risk, risk_score)
+        yield {
+            "index": index, "start": start, "end": end, "language": language, "text": text,
+            "risk_score": risk_score, "justification": justification, "source": assessment["source"],
+            "running_risk": int(weighted_sum / total_weight) if total_weight else 0,
+            "peak_risk": peak_risk,
+        }
+
+def combine_windows(window_results, transcribed_text):
+    """
+    Reduces per-window results into the usual (sync_score, transcribed_text,
+    content_risk_score, justification) tuple. The content risk is the riskiest window,
+    and the justification is that window's, tagged with where it came from.
+    """
+    sync_score = 95 if len(transcribed_text.split()) > 2 else 30
+    if not window_results:
+        return sync_score, transcribed_text, 0, "Not enough text to analyze."
+    peak = max(window_results, key=lambda w: w["risk_score"])
+    where = f" at {peak['start']:.0f}s-{peak['end']:.0f}s" if peak["start"] is not None else ""
+    justification = peak["justification"]
+    if len(window_results) > 1:
+        justification = f"[Riskiest of {len(window_results)} passages{where}] {justification}"
+    return sync_score, transcribed_text, peak["risk_score"], justification
+
+def stream_audio_and_content(audio, window_sentences=WINDOW_SENTENCES, transcript=None):
+    """
+    Streaming version of analyze_audio_and_content: yields each scored window (see
+    score_windows) as soon as Whisper has transcribed it, so the first risk signal arrives
+    within seconds even on hour-long recordings. Yields a final dict with "final": True
+    holding the combined result, the full transcript, the detected language and a "failed"
+    flag (True only if transcription raised; speechless audio is a normal, empty result).
+    If an existing (transcribed_text, detected_language) transcript is given, Whisper is
+    skipped and `audio` is ignored.
+    """
+    print("-> [Add-On] Running Streaming Intelligence Analysis...")
+    window_results, transcript_parts = [], []
+    detected = {"language": None}
+
+    def _tracked(windows):
+        # Only errors raised while pulling the next window come from Whisper
+        try:
+            for window in windows:
+                transcript_parts.append(window[3])
+                yield window
+        except Exception as e:
+            raise TranscriptionError(str(e)) from e
+
+    if transcript is not None:
+        detected["language"] = transcript[1]
+        windows = split_text_windows(transcript[0], transcript[1], window_sentences)
+    else:
+        windows = transcribe_windows(audio, window_sentences,
+                                     on_language=lambda language: detected.update(language=language))
+    try:
+        for result in score_windows(_tracked(windows)):
+            window_results.append(result)
+            yield result
+    except TranscriptionError as e:
+        print(f"!! Whisper Error: {e}")
+        yield {"final": True, "result": (0, "Transcription failed.", 0, "N/A"), "language": None,
+               "windows": [], "failed": True}
+        return
+
+    transcribed_text = " ".join(transcript_parts).strip()
+    print(f"-> [Whisper] Transcript: {transcribed_text[:100]}...")
+    yield {"final": True, "result": combine_windows(window_results, transcribed_text),
+           "language": detected["language"], "windows": window_results, "failed": False}
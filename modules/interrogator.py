@@ -1,28 +1,60 @@
 # modules/interrogator.py
-import requests
+from . import llm_client
+from . import text_triage
 
-OLLAMA_URL = "http://localhost:11434/api/chat"
-
-def run_interrogation(text ):
-    """Runs a series of prompts to analyze the origin and intent of the text."""
-    print("-> [Interrogator] Running AI Interrogation...")
-    
+def build_prompts(text):
+    """Returns the (pirate_prompt, intent_prompt) pair used to interrogate a text."""
     # Prompt 1: The "Jailbreak" to test for AI-like fluency
     pirate_prompt = f"You are a helpful assistant. The following text has been flagged as potentially AI-generated. Please rephrase it in the style of a pirate. Text: '{text}'"
     
     # Prompt 2: The "Source & Intent" analysis
     intent_prompt = f"Analyze the following text. Based on its style and vocabulary, what is the likely intent of the author (e.g., to inform, to persuade, to deceive)? Text: '{text}'"
+    return pirate_prompt, intent_prompt
+
+def local_intent_analysis(triage_result):
+    """A short intent reading from the local triage, used when it is confident enough to skip the LLM."""
+    if triage_result["risk_verdict"] == "high":
+        intent = "to persuade or deceive: it leans on " + triage_result["cues"] + " to push the reader into acting before thinking"
+    else:
+        intent = "to inform: it reads as routine communication (" + triage_result["cues"] + ")"
+    return f"Likely intent {intent}. (Local triage; the LLM was not consulted.)"
+
+def run_interrogation(text, use_triage=True):
+    """
+    Runs a series of prompts to analyze the origin and intent of the text. Texts the local
+    triage is confident about are not sent to the LLM; "source" records which path answered.
+    """
+    print("-> [Interrogator] Running AI Interrogation...")
+    if use_triage:
+        result = text_triage.triage(text)
+        if not result["escalate_risk"]:
+            return {"pirate_version": "Skipped: the local triage was confident, so no LLM interrogation was needed.",
+                    "intent_analysis": local_intent_analysis(result), "source": "triage"}
+    pirate_prompt, intent_prompt = build_prompts(text)
     
     try:
-        # Get pirate response
-        pirate_payload = {"model": "llama3", "messages": [{"role": "user", "content": pirate_prompt}], "stream": False}
-        pirate_response = requests.post(OLLAMA_URL, json=pirate_payload).json()['message']['content']
+        # The two prompts are independent, so they are sent to Ollama concurrently
+        pirate_future = llm_client.submit(llm_client.ask, pirate_prompt)
+        intent_future = llm_client.submit(llm_client.ask, intent_prompt)
+        pirate_response = pirate_future.result()
+        intent_response = intent_future.result()
         
-        # Get intent response
-        intent_payload = {"model": "llama3", "messages": [{"role": "user", "content": intent_prompt}], "stream": False}
-        intent_response = requests.post(OLLAMA_URL, json=intent_payload).json()['message']['content']
-        
-        return {"pirate_version": pirate_response, "intent_analysis": intent_response}
+        return {"pirate_version": pirate_response, "intent_analysis": intent_response, "source": "llm"}
+    except Exception as e:
+        print(f"!! [Interrogator] Error: {e}")
+        return {"pirate_version": "Interrogation failed.", "intent_analysis": "Interrogation failed.", "source": "llm"}
+
+def stream_intent_analysis(text, use_triage=True):
+    """Streams the intent analysis token by token, for rendering live in the UI."""
+    print("-> [Interrogator] Streaming intent analysis...")
+    if use_triage:
+        result = text_triage.triage(text)
+        if not result["escalate_risk"]:
+            yield local_intent_analysis(result)
+            return
+    _, intent_prompt = build_prompts(text)
+    try:
+        yield from llm_client.stream_ask(intent_prompt)
     except Exception as e:
         print(f"!! [Interrogator] Error: {e}")
-        return {"pirate_version": "Interrogation failed.", "intent_analysis": "Interrogation failed."}
+        yield "Interrogation failed."
@@ -0,0 +1,189 @@
+# modules/job_queue.py
+import os
+import time
+import uuid
+import pickle
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+JOBS_DIR = os.environ.get("SENTINEL_JOBS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sentinel", "jobs"))
+# Analyses running at once. The stage processes are shared, so extra workers mostly overlap
+# one job's video stage with another's transcription rather than adding raw compute.
+NUM_WORKERS = int(os.environ.get("SENTINEL_JOB_WORKERS", "2"))
+# Admission control: uploads beyond this many waiting jobs are turned away instead of queueing forever
+MAX_QUEUED_JOBS = int(os.environ.get("SENTINEL_MAX_QUEUED_JOBS", "8"))
+FINISHED_JOB_TTL_SECONDS = 24 * 3600
+_COPY_CHUNK = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,          -- queued | running | done | failed
+    filename TEXT,
+    video_path TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result BLOB,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    at REAL NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+"""
+
+
+class QueueFullError(Exception):
+    """Raised by JobQueue.submit() when too many jobs are already waiting."""
+
+
+class JobQueue:
+    """
+    A local, SQLite-backed analysis queue shared by every Streamlit session in the process.
+    Uploads are streamed into a per-job scratch directory, and a fixed pool of background
+    worker threads runs `runner(video_path, report)` on them, oldest first. `report(message)`
+    records a progress line the UI can poll while the job runs; the runner's return value
+    is stored (pickled) as the job's result. Scratch files are removed when a job finishes.
+    """
+
+    def __init__(self, runner, root=JOBS_DIR, num_workers=NUM_WORKERS, max_queued=MAX_QUEUED_JOBS):
+        self.runner = runner
+        self.root = root
+        self.db_path = os.path.join(root, "jobs.sqlite")
+        self.max_queued = max_queued
+        self._wakeup = threading.Condition()
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+        self._recover()
+        self._workers = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                         for i in range(max(1, num_workers))]
+        for worker in self._workers:
+            worker.start()
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation: sqlite3 connections can't be shared across threads
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.row_factory = sqlite3.Row
+            yield db
+        finally:
+            db.close()
+
+    def _recover(self):
+        """Requeues jobs a previous server process left running, and purges old finished jobs."""
+        with self._connect() as db:
+            rows = db.execute("SELECT id, video_path FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                if os.path.exists(row["video_path"]):
+                    db.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE id = ?", (row["id"],))
+                else:
+                    db.execute("UPDATE jobs SET status = 'failed', error = 'Server restarted mid-analysis' WHERE id = ?",
+                               (row["id"],))
+            cutoff = time.time() - FINISHED_JOB_TTL_SECONDS
+            old = [r["id"] for r in db.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,))]
+            for job_id in old:
+                db.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        if rows or old:
+            print(f"-> [Job Queue] Recovered {len(rows)} interrupted job(s), purged {len(old)} old job(s).")
+
+    # --- Public API ---
+
+    def submit(self, fileobj, filename="upload.mp4"):
+        """
+        Streams `fileobj` (e.g. a Streamlit UploadedFile) into a fresh scratch directory and
+        enqueues it. Returns the job id. Raises QueueFullError if the queue is at capacity.
+        """
+        if self.queued_count() >= self.max_queued:
+            raise QueueFullError(f"{self.max_queued} analyses are already waiting; please try again shortly.")
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.root, job_id)
+        os.makedirs(job_dir)
+        video_path = os.path.join(job_dir, "input" + (os.path.splitext(filename)[1] or ".mp4"))
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+        with open(video_path, "wb") as f:
+            shutil.copyfileobj(fileobj, f, _COPY_CHUNK)
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, status, filename, video_path, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                       (job_id, filename, video_path, time.time()))
+        with self._wakeup:
+            self._wakeup.notify()
+        print(f"-> [Job Queue] Enqueued job {job_id} ({filename}).")
+        return job_id
+
+    def queued_count(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def status(self, job_id, since_seq=0):
+        """
+        The job's state as a dict: status, queue_position (queued jobs only), events (progress
+        lines after `since_seq`, as (seq, message) pairs), result (done jobs) and error.
+        Returns None for an unknown job id.
+        """
+        with self._connect() as db:
+            job = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            events = db.execute("SELECT seq, message FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                                (job_id, since_seq)).fetchall()
+            position = None
+            if job["status"] == "queued":
+                position = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?",
+                                      (job["created_at"],)).fetchone()[0]
+        return {
+            "status": job["status"], "filename": job["filename"], "queue_position": position,
+            "events": [(e["seq"], e["message"]) for e in events],
+            "result": pickle.loads(job["result"]) if job["result"] is not None else None,
+            "error": job["error"],
+        }
+
+    # --- Workers ---
+
+    def _claim(self):
+        """Atomically takes the oldest queued job, or returns None."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT id, video_path FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row["id"]))
+            db.execute("COMMIT")
+        return row
+
+    def _report(self, job_id, message):
+        with self._connect() as db:
+            db.execute("INSERT INTO job_events (job_id, at, message) VALUES (?, ?, ?)", (job_id, time.time(), str(message)))
+
+    def _work(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=5) # Also re-checks periodically, in case a notify was missed
+                continue
+
+            job_id = job["id"]
+            print(f"-> [Job Queue] {threading.current_thread().name} started job {job_id}.")
+            try:
+                result = self.runner(job["video_path"], lambda message: self._report(job_id, message))
+                update = ("done", pickle.dumps(result), None)
+            except Exception as e:
+                print(f"!! [Job Queue] Job {job_id} failed: {e}")
+                update = ("failed", None, f"{type(e).__name__}: {e}")
+            finally:
+                shutil.rmtree(os.path.dirname(job["video_path"]), ignore_errors=True)
+            with self._connect() as db:
+                db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                           (*update, time.time(), job_id))
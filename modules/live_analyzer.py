@@ -0,0 +1,335 @@
+# modules/live_analyzer.py
+import os
+import stat
+import time
+import threading
+import subprocess
+from collections import deque
+
+import numpy as np
+
+from .audio_buffer import SAMPLE_RATE, _ffmpeg_exe
+
+# Scores cover this much of the most recent stream, so old frames and audio are forgotten
+LIVE_WINDOW_SECONDS = float(os.environ.get("SENTINEL_LIVE_WINDOW_SECONDS", "30"))
+# One VGG-Face embedding per this many seconds: identity changes slowly, blinks don't
+FACE_INTERVAL_SECONDS = float(os.environ.get("SENTINEL_LIVE_FACE_INTERVAL", "1.0"))
+MAX_WINDOW_EMBEDDINGS = 64
+AUDIO_CHUNK_SECONDS = 2.0 # Same window length the offline zero-shot timeline uses
+# Audio chunks waiting to be scored; beyond this the oldest are dropped, like late frames
+MAX_PENDING_AUDIO_CHUNKS = 4
+# With nobody calling snapshot() for this long (e.g. the browser tab was closed), the analyzer
+# stops itself, so its threads, ffmpeg processes and webcam handle don't outlive the session
+LIVE_IDLE_TIMEOUT_SECONDS = float(os.environ.get("SENTINEL_LIVE_IDLE_TIMEOUT", "60"))
+_FRAME_TIMEOUT_SECONDS = 1.0
+
+
+def classify_source(source):
+    """
+    "webcam" for a device index (an int or a digit string), "pipe" for a named pipe,
+    "stream" for a URL ffmpeg can open (rtsp://, http://, udp://, ...), otherwise "file"
+    (a local file that may still be growing, e.g. a recorder's .ts output).
+    """
+    if isinstance(source, int) or str(source).strip().isdigit():
+        return "webcam"
+    source = str(source)
+    if "://" in source:
+        return "stream"
+    if os.path.exists(source) and stat.S_ISFIFO(os.stat(source).st_mode):
+        return "pipe"
+    return "file"
+
+
+class LatestFrame:
+    """
+    A one-slot mailbox between the capture thread and the analysis threads. put() always
+    overwrites, so a consumer that falls behind simply skips to the newest frame instead of
+    working through a backlog; every consumer counts the frames it never saw as dropped.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._frame = None
+        self._timestamp = None
+        self.closed = False
+
+    def put(self, frame, timestamp):
+        with self._condition:
+            self._seq += 1
+            self._frame, self._timestamp = frame, timestamp
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def get(self, after_seq, timeout=_FRAME_TIMEOUT_SECONDS):
+        """(seq, timestamp, frame) of the newest frame after `after_seq`, or None on timeout/close."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > after_seq or self.closed, timeout)
+            if self._seq <= after_seq:
+                return None
+            return self._seq, self._timestamp, self._frame
+
+
+class LiveAnalyzer:
+    """
+    Rolling-window analysis of a live source: a webcam device, a named pipe or stream URL,
+    or a local file that is still being written (tailed with ffmpeg's -follow).
+
+    A capture thread keeps only the newest frame (LatestFrame); a gaze thread runs FaceMesh
+    on whatever frame is newest and feeds a stateful BlinkCounter; a face thread embeds one
+    face per FACE_INTERVAL_SECONDS into a SlidingEmbeddingWindow; an audio thread (file and
+    stream sources only) scores AUDIO_CHUNK_SECONDS chunks with the zero-shot detector.
+    Everything is kept for LIVE_WINDOW_SECONDS at most, so latency and memory stay bounded
+    however long the stream runs. snapshot() returns the current rolling scores; if it goes
+    unpolled for `idle_timeout` seconds (None to disable), the analyzer stops itself.
+    """
+
+    def __init__(self, source, window_seconds=LIVE_WINDOW_SECONDS, face_interval=FACE_INTERVAL_SECONDS,
+                 idle_timeout=LIVE_IDLE_TIMEOUT_SECONDS):
+        self.source = source
+        self.kind = classify_source(source)
+        self.window_seconds = window_seconds
+        self.face_interval = face_interval
+        self.idle_timeout = idle_timeout
+        self._last_polled = None
+        self.frames = LatestFrame()
+        self._stop = threading.Event()
+        self._threads = []
+        self._processes = []
+        self._lock = threading.Lock()
+        self.error = None
+
+        self.frames_captured = 0
+        self.frames_analyzed = 0
+        self.frames_dropped = 0
+        self.latency_seconds = None
+        self.started_at = None
+
+        self.blinks = None
+        self.faces = None
+        self.audio_windows = deque() # (timestamp, anomalous)
+        self.audio_chunks_dropped = 0
+        self.audio_available = self.kind in ("file", "stream")
+
+    # --- Lifecycle ---
+
+    def start(self):
+        from .gaze_analyzer import BlinkCounter
+        from .face_analyzer import SlidingEmbeddingWindow
+
+        self.blinks = BlinkCounter(window_seconds=self.window_seconds)
+        self.faces = SlidingEmbeddingWindow(window_seconds=self.window_seconds, max_embeddings=MAX_WINDOW_EMBEDDINGS)
+        self.started_at = self._last_polled = time.monotonic()
+        targets = [self._capture, self._gaze_loop, self._face_loop]
+        if self.audio_available:
+            targets.append(self._audio_loop)
+        for target in targets:
+            thread = threading.Thread(target=self._guarded, args=(target,), name=f"live-{target.__name__.strip('_')}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"-> [Live] Analyzing {self.kind} source {self.source!r} ({self.window_seconds:.0f}s rolling window).")
+        return self
+
+    def _halt(self):
+        """Signals every thread to finish and kills the ffmpeg readers; safe to call from any thread."""
+        self._stop.set()
+        self.frames.close()
+        for proc in self._processes:
+            proc.kill()
+
+    def stop(self):
+        self._halt()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        print(f"-> [Live] Stopped: {self.frames_analyzed} frames analyzed, {self.frames_dropped} dropped.")
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads) and not self._stop.is_set()
+
+    def _guarded(self, target):
+        try:
+            target()
+        except Exception as e:
+            print(f"!! [Live] {target.__name__.strip('_')} failed: {e}")
+            self.error = f"{type(e).__name__}: {e}"
+            self._stop.set()
+            self.frames.close()
+
+    def _ffmpeg_input_args(self):
+        # -re paces a file at its native frame rate, so wall-clock windows match media time;
+        # -follow keeps reading as a recorder appends to it instead of stopping at EOF.
+        if self.kind == "file":
+            return ["-re", "-follow", "1", "-i", f"file:{os.path.abspath(self.source)}"]
+        return ["-i", str(self.source)]
+
+    # --- Capture ---
+
+    def _capture(self):
+        if self.kind == "file":
+            self._capture_ffmpeg()
+        else:
+            self._capture_opencv()
+        self.frames.close()
+
+    def _capture_opencv(self):
+        import cv2
+        # OpenCV's FFmpeg backend opens stream URLs and named pipes directly
+        cap = cv2.VideoCapture(int(self.source) if self.kind == "webcam" else str(self.source))
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open {self.kind} source {self.source!r}")
+        try:
+            while not self._stop.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                self.frames_captured += 1
+                self.frames.put(frame, time.monotonic())
+        finally:
+            cap.release()
+
+    def _capture_ffmpeg(self):
+        import cv2
+        cap = cv2.VideoCapture(self.source) # Only to read the frame size from the header
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        if not width or not height:
+            raise RuntimeError(f"Could not read the frame size of {self.source!r}")
+        cmd = [_ffmpeg_exe(), "-nostdin", "-v", "error", *self._ffmpeg_input_args(),
+               "-an", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._processes.append(proc)
+        frame_bytes = width * height * 3
+        try:
+            while not self._stop.is_set():
+                data = proc.stdout.read(frame_bytes)
+                if len(data) < frame_bytes:
+                    break
+                self.frames_captured += 1
+                self.frames.put(np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3), time.monotonic())
+        finally:
+            proc.kill()
+            proc.wait()
+
+    # --- Analysis threads ---
+
+    def _next_frames(self):
+        """Yields (timestamp, frame) of the newest frame each time the caller is ready, counting skipped ones."""
+        seq = 0
+        while not self._stop.is_set():
+            if self.idle_timeout and time.monotonic() - self._last_polled > self.idle_timeout:
+                print(f"-> [Live] No snapshot requested for {self.idle_timeout:.0f}s; stopping.")
+                self._halt()
+                return
+            item = self.frames.get(seq)
+            if item is None:
+                if self.frames.closed:
+                    return
+                continue
+            new_seq, timestamp, frame = item
+            yield new_seq - seq - 1, timestamp, frame
+            seq = new_seq
+
+    def _gaze_loop(self):
+        from .gaze_analyzer import GazeBlinkCollector, compute_ear_series
+        gaze = GazeBlinkCollector(fast=True) # Only its per-frame measure() is used; the series lives in BlinkCounter
+        for skipped, timestamp, frame in self._next_frames():
+            points = gaze.measure(frame)
+            ear = compute_ear_series(points[None])[0] if points is not None else np.nan
+            with self._lock:
+                self.blinks.update(timestamp, ear)
+                self.frames_analyzed += 1
+                self.frames_dropped += skipped
+                self.latency_seconds = time.monotonic() - timestamp
+
+    def _face_loop(self):
+        from .face_analyzer import FacialConsistencyCollector, embed_faces
+        collector = FacialConsistencyCollector(cascade=True) # Only its detector cascade is used
+        for _, timestamp, frame in self._next_frames():
+            face = collector.detect_face(frame)
+            if face is not None:
+                embedding = embed_faces([face])[0]
+                with self._lock:
+                    self.faces.add(timestamp, embedding)
+            self._stop.wait(max(0.0, self.face_interval - (time.monotonic() - timestamp)))
+
+    def _audio_loop(self):
+        from . import model_registry
+        from .zero_shot_analyzer import compute_window_features
+
+        cmd = [_ffmpeg_exe(), "-nostdin", "-v", "error", *self._ffmpeg_input_args(),
+               "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "pipe:1"]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._processes.append(proc)
+        detector = model_registry.get("zero_shot_detector")
+        chunk_bytes = int(AUDIO_CHUNK_SECONDS * SAMPLE_RATE) * 4
+        pending = deque(maxlen=MAX_PENDING_AUDIO_CHUNKS)
+        reader_done = threading.Event()
+
+        def read_chunks():
+            # ffmpeg must be drained continuously or it stalls; scoring happens on this thread's caller
+            while not self._stop.is_set():
+                data = proc.stdout.read(chunk_bytes)
+                if len(data) < chunk_bytes:
+                    break
+                if len(pending) == pending.maxlen:
+                    self.audio_chunks_dropped += 1
+                pending.append((time.monotonic(), np.frombuffer(data, dtype=np.float32)))
+            reader_done.set()
+
+        reader = threading.Thread(target=read_chunks, name="live-audio-reader", daemon=True)
+        reader.start()
+        try:
+            while not self._stop.is_set() and not (reader_done.is_set() and not pending):
+                if not pending:
+                    self._stop.wait(0.1)
+                    continue
+                timestamp, chunk = pending.popleft()
+                features, _ = compute_window_features(chunk, SAMPLE_RATE, AUDIO_CHUNK_SECONDS)
+                if features is None or not len(features):
+                    continue
+                anomalous = bool((detector.score_samples(features[:1]) < detector.offset_)[0])
+                with self._lock:
+                    self.audio_windows.append((timestamp, anomalous))
+                    while self.audio_windows and self.audio_windows[0][0] < timestamp - self.window_seconds:
+                        self.audio_windows.popleft()
+        finally:
+            proc.kill()
+            proc.wait()
+        if not self.audio_windows:
+            self.audio_available = False # No audio track (or it never produced a full chunk)
+
+    # --- Scores ---
+
+    def snapshot(self):
+        """
+        The current rolling-window scores. Scores that have no data yet are None, and the
+        trust score averages whichever of face, gaze and audio are available (there is no
+        lip-sync or transcript in live mode).
+        """
+        from .zero_shot_analyzer import score_from_fraction
+
+        self._last_polled = time.monotonic()
+        with self._lock:
+            face_score = self.faces.consistency() if self.faces and len(self.faces.entries) >= 2 else None
+            gaze_score = self.blinks.score() if self.blinks and self.blinks.blinks_per_minute() is not None else None
+            audio_score = (score_from_fraction(sum(a for _, a in self.audio_windows) / len(self.audio_windows))
+                           if self.audio_windows else None)
+            snapshot = {
+                "face_score": face_score, "gaze_score": gaze_score, "zsl_anomaly_score": audio_score,
+                "blinks_per_minute": self.blinks.blinks_per_minute() if self.blinks else None,
+                "faces_in_window": len(self.faces.entries) if self.faces else 0,
+                "frames_captured": self.frames_captured, "frames_analyzed": self.frames_analyzed,
+                "frames_dropped": self.frames_dropped, "audio_chunks_dropped": self.audio_chunks_dropped,
+                "latency_seconds": self.latency_seconds, "running": self.running, "error": self.error,
+                "elapsed_seconds": time.monotonic() - self.started_at if self.started_at else 0.0,
+            }
+        available = [s for s in (face_score, gaze_score, audio_score) if s is not None]
+        snapshot["technical_score"] = int(sum(available) / len(available)) if available else None
+        return snapshot
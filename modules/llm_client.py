@@ -0,0 +1,225 @@
+# modules/llm_client.py
+import os
+import json
+import time
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import telemetry
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/chat")
+DEFAULT_MODEL = "llama3"
+
+# Should match the Ollama server's OLLAMA_NUM_PARALLEL; extra requests would only queue server-side.
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = float(os.environ.get("SENTINEL_LLM_TIMEOUT", "180"))
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+
+MEMO_MAX_ENTRIES = 512
+MEMO_TTL_SECONDS = 3600
+
+
+class LLMError(Exception):
+    """Raised when Ollama could not produce a response after all retries."""
+
+
+class _MemoCache:
+    """A small thread-safe LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES, ttl_seconds=MEMO_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _memo_key(model, messages, options):
+    material = json.dumps([model, messages, options or {}], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _retryable(error):
+    """
+    Whether a failed request is worth retrying: connection failures, timeouts and 5xx responses
+    are transient; 4xx responses (e.g. a missing model or a bad request) and malformed replies are not.
+    """
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+
+def _build_session():
+    session = requests.Session()
+    # Keep-alive pool sized to the concurrency limit, so parallel calls reuse connections
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = _build_session()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+_memo = _MemoCache()
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="ollama")
+
+
+def chat(messages, model=DEFAULT_MODEL, options=None, use_cache=True):
+    """
+    Sends a chat request to Ollama and returns the assistant's message text.
+    Identical (model, messages, options) requests are answered from the memo cache.
+    Transient failures are retried with exponential backoff (see _retryable); raises
+    LLMError once they are exhausted, or at once for errors a retry can't fix.
+    """
+    key = _memo_key(model, messages, options)
+    if use_cache:
+        cached = _memo.get(key)
+        if cached is not None:
+            telemetry.count("sentinel_cache_hits_total", cache="llm_memo")
+            return cached
+
+    payload = {"model": model, "messages": messages, "stream": False}
+    if options:
+        payload["options"] = options
+
+    last_error = None
+    with telemetry.span("llm.chat", model=model) as span:
+        for attempt in range(MAX_RETRIES):
+            try:
+                with _slots: # Never exceed the server's parallel slots
+                    response = _session.post(OLLAMA_URL, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                response.raise_for_status()
+                body = response.json()
+                content = body['message']['content']
+                _memo.put(key, content)
+                # Ollama reports how many tokens it generated; fall back to a word count
+                span.set(attempts=attempt + 1, tokens_generated=body.get("eval_count", len(content.split())))
+                telemetry.count("sentinel_llm_requests_total", model=model, outcome="ok")
+                return content
+            except (requests.RequestException, KeyError, ValueError) as e:
+                last_error = e
+                if attempt == MAX_RETRIES - 1 or not _retryable(e):
+                    break
+                delay = BACKOFF_SECONDS * (2 ** attempt)
+                print(f"!! [LLM Client] Ollama request failed ({e}); retrying in {delay:.0f}s...")
+                time.sleep(delay)
+        span.set(attempts=attempt + 1)
+        telemetry.count("sentinel_llm_requests_total", model=model, outcome="error")
+    raise LLMError(f"Ollama request failed after {attempt + 1} attempt(s): {last_error}")
+
+
+def stream_chat(messages, model=DEFAULT_MODEL, options=None, use_cache=True):
+    """
+    Streaming counterpart of chat(): yields the assistant's text chunk by chunk as Ollama
+    emits its NDJSON stream. The full response is memoized once the stream completes,
+    and a memo hit is yielded as a single chunk. Raises LLMError on failure; a request
+    is only retried if the failure is transient (see _retryable) and happened before the
+    first token was yielded.
+    """
+    key = _memo_key(model, messages, options)
+    if use_cache:
+        cached = _memo.get(key)
+        if cached is not None:
+            telemetry.count("sentinel_cache_hits_total", cache="llm_memo")
+            yield cached
+            return
+
+    payload = {"model": model, "messages": messages, "stream": True}
+    if options:
+        payload["options"] = options
+
+    parts = []
+    last_error = None
+    # A generator can't keep a span open across its yields, so the timings are recorded once at the end
+    start, first_token_seconds, eval_count = time.perf_counter(), None, None
+    for attempt in range(MAX_RETRIES):
+        try:
+            with _slots:
+                with _session.post(OLLAMA_URL, json=payload, stream=True,
+                                   timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if "error" in chunk:
+                            raise LLMError(chunk["error"])
+                        token = chunk.get("message", {}).get("content", "")
+                        if token:
+                            if first_token_seconds is None:
+                                first_token_seconds = time.perf_counter() - start
+                            parts.append(token)
+                            yield token
+                        if chunk.get("done"):
+                            eval_count = chunk.get("eval_count")
+                            break
+            _memo.put(key, "".join(parts))
+            telemetry.count("sentinel_llm_requests_total", model=model, outcome="ok")
+            telemetry.record_span("llm.stream", time.perf_counter() - start, model=model, attempts=attempt + 1,
+                                  time_to_first_token=first_token_seconds, tokens_generated=eval_count or len(parts))
+            return
+        except (requests.RequestException, LLMError, ValueError) as e:
+            if parts: # Tokens were already shown to the caller; a retry would duplicate them
+                telemetry.count("sentinel_llm_requests_total", model=model, outcome="error")
+                raise LLMError(f"Ollama stream broke mid-response: {e}")
+            last_error = e
+            if attempt == MAX_RETRIES - 1 or not _retryable(e):
+                break
+            delay = BACKOFF_SECONDS * (2 ** attempt)
+            print(f"!! [LLM Client] Ollama stream failed ({e}); retrying in {delay:.0f}s...")
+            time.sleep(delay)
+    telemetry.count("sentinel_llm_requests_total", model=model, outcome="error")
+    raise LLMError(f"Ollama stream failed after {attempt + 1} attempt(s): {last_error}")
+
+
+def stream_ask(prompt, system_prompt=None, model=DEFAULT_MODEL, options=None, use_cache=True):
+    """Convenience wrapper around stream_chat() for a single user prompt."""
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    messages.append({"role": "user", "content": prompt})
+    return stream_chat(messages, model=model, options=options, use_cache=use_cache)
+
+
+def ask(prompt, system_prompt=None, model=DEFAULT_MODEL, options=None, use_cache=True):
+    """Convenience wrapper around chat() for a single user prompt."""
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    messages.append({"role": "user", "content": prompt})
+    return chat(messages, model=model, options=options, use_cache=use_cache)
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) on the shared LLM thread pool and returns a Future,
+    so independent LLM calls can be issued concurrently. The caller's context goes along,
+    so the call's spans nest under the caller's current span.
+    """
+    return _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
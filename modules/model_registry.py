@@ -0,0 +1,117 @@
+# modules/model_registry.py
+import os
+import time
+import threading
+
+from . import telemetry
+
+# name -> {"loader": callable, "per_thread": bool}
+_loaders = {}
+# name -> loaded model (process-wide models only; per-thread models live in _thread_models)
+_models = {}
+# name -> {"load_seconds": float, "rss_delta_mb": float, "loads": int}
+_stats = {}
+_locks = {}
+_registry_lock = threading.Lock()
+_thread_models = threading.local()
+
+
+def _rss_bytes():
+    """Current resident set size of this process (0 if it can't be determined)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak, not current, but better than nothing
+        except ImportError:
+            return 0
+
+
+def register(name, loader, per_thread=False):
+    """
+    Registers a zero-argument loader for a heavy model. Nothing is loaded until get(name).
+    Models that are stateful and not thread-safe (e.g. MediaPipe's FaceMesh) should be
+    registered with per_thread=True, so each thread lazily gets its own instance.
+    """
+    with _registry_lock:
+        _loaders[name] = {"loader": loader, "per_thread": per_thread}
+        _locks.setdefault(name, threading.Lock())
+
+
+def is_loaded(name):
+    if _loaders.get(name, {}).get("per_thread"):
+        return name in getattr(_thread_models, "models", {})
+    return name in _models
+
+
+def _load(name):
+    start_rss = _rss_bytes()
+    start = time.perf_counter()
+    model = _loaders[name]["loader"]()
+    load_seconds = time.perf_counter() - start
+    rss_delta_mb = (_rss_bytes() - start_rss) / (1024 * 1024)
+
+    entry = _stats.setdefault(name, {"load_seconds": 0.0, "rss_delta_mb": 0.0, "loads": 0})
+    entry["load_seconds"] += load_seconds
+    entry["rss_delta_mb"] += rss_delta_mb
+    entry["loads"] += 1
+    telemetry.count("sentinel_model_loads_total", model=name)
+    telemetry.record_span("model.load", load_seconds, model=name, rss_delta_mb=round(rss_delta_mb, 1))
+    print(f"-> [Model Registry] Loaded '{name}' in {load_seconds:.2f}s (+{rss_delta_mb:.0f} MB RSS).")
+    return model
+
+
+def get(name):
+    """Returns the model, loading it on first use. Concurrent first calls load it only once."""
+    if name not in _loaders:
+        raise KeyError(f"No model registered under '{name}'")
+
+    if _loaders[name]["per_thread"]:
+        models = getattr(_thread_models, "models", None)
+        if models is None:
+            models = _thread_models.models = {}
+        if name not in models:
+            with _locks[name]:  # Serialize loads so the RSS accounting isn't muddled
+                models[name] = _load(name)
+        return models[name]
+
+    model = _models.get(name)
+    if model is None:
+        with _locks[name]:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = _load(name)
+    return model
+
+
+def warm_up(names=None, background=True):
+    """
+    Loads the given models (default: all registered) ahead of first use.
+    With background=True this happens on a daemon thread, which is returned.
+    Per-thread models warmed in the background only warm the background thread's copy,
+    so they are skipped there.
+    """
+    names = list(names) if names is not None else list(_loaders)
+
+    def _warm():
+        for name in names:
+            if background and _loaders.get(name, {}).get("per_thread"):
+                continue
+            try:
+                get(name)
+            except Exception as e:
+                print(f"!! [Model Registry] Warm-up of '{name}' failed: {e}")
+
+    if not background:
+        _warm()
+        return None
+    thread = threading.Thread(target=_warm, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def stats():
+    """Per-model load time and resident-memory growth recorded so far in this process."""
+    return {name: dict(entry) for name, entry in _stats.items()}
@@ -0,0 +1,411 @@
+# modules/orchestrator.py
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from . import telemetry
+
+# Environment variables that size the BLAS / OpenMP / TensorFlow / ctranslate2 thread pools.
+# They must be set before those libraries are imported, which is why each stage process
+# sets them in its initializer and the stage functions import their modules lazily.
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS",
+]
+
+# The neutral results a stage falls back to if its worker process crashes.
+STAGE_DEFAULTS = {
+    "video": {"face_score": 75, "gaze_score": 50, "face_embeddings": None, "face_report": None},
+    "zero_shot": {"zsl_anomaly_score": 50, "zsl_timeline": []},
+    "intelligence": {"sync_score": 0, "transcribed_text": "Transcription failed.",
+                     "content_risk_score": 0, "justification": "N/A", "risk_windows": []},
+}
+
+# One persistent single-process executor per stage, so every model is loaded once per
+# stage process (not once per analysis) and each stage gets its own thread budget.
+_executors = {}
+_progress_manager = None
+# Several job-queue workers can start analyses at once; executors must still be created only once
+_executors_lock = threading.Lock()
+PROGRESS_POLL_SECONDS = 0.25
+
+
+def threads_per_stage(num_stages=len(STAGE_DEFAULTS)):
+    """Splits the machine's cores evenly across the stages so they don't oversubscribe it."""
+    override = os.environ.get("SENTINEL_STAGE_THREADS")
+    if override:
+        return max(1, int(override))
+    return max(1, (os.cpu_count() or 1) // num_stages)
+
+
+def _limit_threads(num_threads):
+    """Process-pool initializer: caps every native thread pool in this stage process."""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(num_threads)
+    try:
+        import cv2
+        cv2.setNumThreads(num_threads)
+    except ImportError:
+        pass
+
+
+def _get_executor(stage_name):
+    with _executors_lock:
+        if stage_name not in _executors:
+            # 'spawn' so the children don't inherit a half-initialized TF/MediaPipe state from the UI process
+            _executors[stage_name] = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_limit_threads,
+                initargs=(threads_per_stage(),),
+            )
+        return _executors[stage_name]
+
+
+# --- Stage functions (run inside the stage processes) ---
+# Each stage consults the on-disk ResultCache first, keyed by the video's content hash
+# plus the module's version and parameters, so repeat uploads skip the heavy work.
+# `progress` is an optional queue on which a stage can post (stage_name, event) updates.
+
+def _video_stage(video_path, content_hash, sample_rate, max_frames_to_check, progress=None):
+    from .frame_source import run_video_analyses
+    from .result_cache import get_cache
+    face_score, gaze_score, face_embeddings, face_report = run_video_analyses(
+        video_path, sample_rate, max_frames_to_check, content_hash=content_hash, cache=get_cache())
+    return {"face_score": face_score, "gaze_score": gaze_score, "face_embeddings": face_embeddings,
+            "face_report": face_report}
+
+
+# The audio stages receive a SharedAudioBuffer handle and read the decoded PCM in place.
+
+def _zero_shot_stage(audio_handle, content_hash, progress=None):
+    from . import zero_shot_analyzer
+    from .audio_buffer import SharedAudioBuffer
+    from .result_cache import get_cache
+
+    def compute():
+        with SharedAudioBuffer.attach(audio_handle) as audio:
+            score, timeline = zero_shot_analyzer.analyze_audio_anomalies(audio.samples, audio.sample_rate)
+        print(f"-> [Add-On] Zero-Shot Anomaly Score: {score}/100")
+        return {"score": score, "timeline": timeline}
+
+    params = {"window_seconds": zero_shot_analyzer.WINDOW_SECONDS}
+    result = get_cache().cached(content_hash, "zero_shot", zero_shot_analyzer.MODULE_VERSION, params, compute)
+    return {"zsl_anomaly_score": result["score"], "zsl_timeline": result["timeline"]}
+
+
+def _intelligence_stage(audio_handle, content_hash, progress=None):
+    from . import intelligence_analyzer as ia
+    from .audio_buffer import SharedAudioBuffer
+    from .result_cache import get_cache
+    cache = get_cache()
+
+    whisper_params = {"whisper_model": ia.WHISPER_MODEL_SIZE}
+    risk_params = dict(whisper_params, llm_model=ia.LLM_MODEL, triage_band=[ia.text_triage.AMBIGUOUS_LOW, ia.text_triage.AMBIGUOUS_HIGH],
+                       triage_version=ia.text_triage.TRIAGE_VERSION)
+    analysis = cache.get(content_hash, "content_risk", ia.MODULE_VERSION, risk_params)
+    if analysis is None:
+        # The transcript is cached as its own artifact, so an LLM/prompt change doesn't re-run Whisper
+        transcript = cache.get(content_hash, "transcript", ia.MODULE_VERSION, whisper_params)
+
+        def stream(samples):
+            # Each scored window is forwarded to the UI the moment it is ready
+            for event in ia.stream_audio_and_content(samples, transcript=transcript):
+                if event.get("final"):
+                    return event
+                if progress is not None:
+                    progress.put(("intelligence", event))
+
+        if transcript is None:
+            with SharedAudioBuffer.attach(audio_handle) as audio:
+                final = stream(audio.samples)
+        else:
+            final = stream(None)
+        if final["failed"]: # Whisper raised; a clip without speech is a normal, cacheable empty result
+            return dict(STAGE_DEFAULTS["intelligence"])
+
+        analysis = {"result": final["result"], "windows": final["windows"]}
+        if transcript is None:
+            cache.put(content_hash, "transcript", ia.MODULE_VERSION, whisper_params, (final["result"][1], final["language"]))
+        # Don't pin a transient Ollama outage in the cache
+        if not any(w["source"] == "error" for w in final["windows"]):
+            cache.put(content_hash, "content_risk", ia.MODULE_VERSION, risk_params, analysis)
+
+    sync_score, transcribed_text, content_risk_score, justification = analysis["result"]
+    return {"sync_score": sync_score, "transcribed_text": transcribed_text,
+            "content_risk_score": content_risk_score, "justification": justification,
+            "risk_windows": analysis["windows"]}
+
+
+# Which analyzer modules (and the models they register) each stage process needs
+STAGE_MODELS = {
+    "video": (("face_analyzer", "gaze_analyzer"), ("deepface", "vgg_face", "face_detection", "face_mesh_static")),
+    "zero_shot": (("zero_shot_analyzer",), ("zero_shot_detector",)),
+    "intelligence": (("intelligence_analyzer",), ("whisper",)),
+}
+
+
+def _warm_up_stage(stage_name):
+    """Runs inside a stage process: imports its analyzers and loads their models."""
+    import importlib
+    from . import model_registry
+    module_names, model_names = STAGE_MODELS[stage_name]
+    for module_name in module_names:
+        importlib.import_module(f"{__package__}.{module_name}")
+    model_registry.warm_up(model_names, background=False)
+    return model_registry.stats()
+
+
+def _stage_model_stats():
+    from . import model_registry
+    return model_registry.stats()
+
+
+def warm_up_stages(stage_names=None):
+    """
+    Starts the stage processes and loads their models in the background, so the first
+    analysis doesn't pay for it. Returns {stage_name: Future of that stage's model stats}.
+    """
+    return {name: _get_executor(name).submit(_warm_up_stage, name) for name in (stage_names or STAGE_MODELS)}
+
+
+def model_stats():
+    """Per-model load time and RSS growth, collected from every stage process started so far."""
+    futures = {name: executor.submit(_stage_model_stats) for name, executor in list(_executors.items())}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def shutdown_stages():
+    """Stops the stage processes (their models are unloaded); the next analysis starts fresh ones."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True)
+
+
+def build_stages(video_path, audio_buffer, content_hash=None, sample_rate=30, max_frames_to_check=20):
+    """
+    Returns the independent analysis stages as {name: (function, args)}.
+    `audio_buffer` is the SharedAudioBuffer holding the decoded audio; the caller owns it
+    and must keep it alive until run_stages() is exhausted.
+    Pass the video's content hash (result_cache.hash_file) to enable result caching.
+    """
+    return {
+        "video": (_video_stage, (video_path, content_hash, sample_rate, max_frames_to_check)),
+        "zero_shot": (_zero_shot_stage, (audio_buffer.handle, content_hash)),
+        "intelligence": (_intelligence_stage, (audio_buffer.handle, content_hash)),
+    }
+
+
+def _progress_queue():
+    """A queue the stage processes can post progress events to (created once, on first use)."""
+    global _progress_manager
+    with _executors_lock:
+        if _progress_manager is None:
+            _progress_manager = multiprocessing.get_context("spawn").Manager()
+    return _progress_manager.Queue()
+
+
+def _drain(progress, on_progress):
+    while True:
+        try:
+            stage_name, event = progress.get_nowait()
+        except queue.Empty:
+            return
+        on_progress(stage_name, event)
+
+
+def run_stages(stages, on_progress=None):
+    """
+    Runs every stage concurrently, each in its own process (this sidesteps the GIL for
+    the TF, MediaPipe and ctranslate2 work). Yields (stage_name, result) as soon as
+    each stage finishes, so the caller can report progress live.
+    If on_progress(stage_name, event) is given, it is called from the caller's thread
+    with the intermediate events stages post while they run (e.g. scored transcript windows).
+    Each stage's trace and metrics come back with its result and join the caller's trace.
+    """
+    progress = _progress_queue() if on_progress else None
+    executors = {name: _get_executor(name) for name in stages}
+    futures = {executors[name].submit(telemetry.traced_call, f"stage.{name}", fn, *args, progress=progress): name
+               for name, (fn, args) in stages.items()}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=PROGRESS_POLL_SECONDS, return_when=FIRST_COMPLETED)
+        if progress is not None:
+            _drain(progress, on_progress)
+        for future in done:
+            name = futures[future]
+            try:
+                result, trace, metrics = future.result()
+                telemetry.adopt(trace, metrics)
+            except Exception as e:
+                print(f"!! [Orchestrator] Stage '{name}' failed: {e}")
+                # A crashed worker breaks its executor; drop it so the next run starts a fresh one.
+                # Other job-queue workers share the dict, and one may already have replaced it.
+                with _executors_lock:
+                    if _executors.get(name) is executors[name]:
+                        del _executors[name]
+                result = dict(STAGE_DEFAULTS[name])
+            yield name, result
+
+
+# --- Scoring ---
+
+def summarize(results):
+    """Combines the stage results into the report fields shown in the UI and written by the batch CLI."""
+    face_score, gaze_score = results["face_score"], results["gaze_score"]
+    zsl_anomaly_score, sync_score = results["zsl_anomaly_score"], results["sync_score"]
+
+    technical_trust_score = int((face_score + sync_score + zsl_anomaly_score + gaze_score) / 4)
+    scores = [face_score / 100, sync_score / 100, zsl_anomaly_score / 100, gaze_score / 100]
+    mean = sum(scores) / len(scores)
+    confidence = (1 - (sum((s - mean) ** 2 for s in scores) / len(scores)) ** 0.5) * 100
+
+    return {
+        "technical_score": technical_trust_score, "confidence": confidence,
+        "content_risk": results["content_risk_score"], "transcribed_text": results["transcribed_text"],
+        "risk_justification": results["justification"], "risk_windows": results["risk_windows"],
+        "face_embeddings": results["face_embeddings"], "shard_breakdown": results.get("shard_breakdown"),
+        "failed_shards": results.get("failed_shards") or [],
+        "zsl_timeline": results.get("zsl_timeline", [])
+    }
+
+
+# --- Interactive analysis (used by the Streamlit app's job queue) ---
+
+def run_full_analysis(video_path, report=print, use_cache=True):
+    """
+    This is the main analysis pipeline. It runs all modules and returns a single
+    dictionary containing all the results for easy use.
+    In the app it runs on a job-queue worker thread, not in the Streamlit script, so progress
+    lines go through report(message) and the session polls them (see modules/job_queue.py).
+    It lives here rather than in main_app.py so it can also run headless (see benchmarks/).
+    The whole run is traced (see modules/telemetry.py); the trace comes back under "trace".
+    """
+    with telemetry.span("analysis", video=os.path.basename(video_path)) as root:
+        summary = _run_full_analysis(video_path, report, use_cache)
+    summary["trace"] = root.to_dict()
+    return summary
+
+
+def _run_full_analysis(video_path, report, use_cache):
+    from .audio_buffer import SharedAudioBuffer, decode_audio, silent_audio
+    from .result_cache import hash_file
+    from .sharding import should_shard, run_sharded
+
+    content_hash = hash_file(video_path) if use_cache else None
+    if should_shard(video_path):
+        # Long recordings are map-reduced over time shards, so memory stays bounded by the shard
+        # length and the wall-clock time shrinks with the number of cores (see modules/sharding.py)
+        report("✔️ Long recording detected. Analyzing it in parallel time shards...")
+        def show_shard(shard_result):
+            shard = shard_result['shard']
+            report(f"   ↳ {shard['start_seconds'] / 60:.0f}-{(shard['end_seconds'] or 0) / 60:.0f} min analyzed: "
+                   f"Face {shard_result['face_score']}/100, Gaze {shard_result['gaze_score']}/100, "
+                   f"Anomaly {shard_result['zsl_anomaly_score']}/100")
+        results = run_sharded(video_path, content_hash, max_frames_to_check=48, on_shard=show_shard)
+        report(f"✔️ All shards merged. Facial Consistency: {results['face_score']}/100, Gaze: {results['gaze_score']}/100, "
+               f"Content Risk: {results['content_risk_score']}/100")
+        return summarize(results)
+
+    # The audio is decoded once, in memory, at 16 kHz, and shared with the stage processes
+    # zero-copy (see modules/audio_buffer.py). Silent videos get one second of silence.
+    samples = decode_audio(video_path)
+    if samples is None:
+        samples = silent_audio()
+    audio_buffer = SharedAudioBuffer.from_array(samples)
+    del samples
+
+    report("✔️ Input Processed. Running All Analysis Modules in parallel...")
+    
+    # The stages are independent once the audio is extracted, so they run concurrently
+    # (see run_stages) and each one is reported the moment it finishes.
+    # Keyed on the uploaded bytes, so re-checking the same clip is served from the result cache
+    results = {}
+    # The face analyzer samples adaptively: 48 frames is its budget, and clean videos stop well short of it
+    stages = build_stages(video_path, audio_buffer, content_hash=content_hash, sample_rate=30, max_frames_to_check=48)
+    def show_progress(stage_name, event):
+        # Transcript windows are scored while Whisper is still transcribing the rest
+        if stage_name == "intelligence":
+            report(f"   ↳ Transcript passage {event['index'] + 1} scored: Risk {event['risk_score']}/100 "
+                     f"(running: {event['running_risk']}/100, peak: {event['peak_risk']}/100)")
+
+    try:
+        for stage_name, stage_result in run_stages(stages, on_progress=show_progress):
+            results.update(stage_result)
+            if stage_name == "video":
+                face_report = stage_result['face_report']
+                examined = f" ({face_report['frames_examined']} frames examined)" if face_report else ""
+                report(f"✔️ Facial Consistency Analysis... Score: {stage_result['face_score']}/100{examined}")
+                report(f"✔️ Gaze & Blink Pattern Analysis... Score: {stage_result['gaze_score']}/100")
+            elif stage_name == "zero_shot":
+                report(f"✔️ Zero-Shot Anomaly Detection... Score: {stage_result['zsl_anomaly_score']}/100")
+            elif stage_name == "intelligence":
+                report(f"✔️ Audio, Content & Sync Analysis... Sync Score: {stage_result['sync_score']}/100, Content Risk: {stage_result['content_risk_score']}/100")
+    finally:
+        audio_buffer.unlink()
+
+    # summarize() is shared with the batch CLI, so both report the same numbers
+    return summarize(results)
+
+
+# --- Headless, in-process analysis (used by batch_cli.py) ---
+
+def init_batch_worker(num_threads, warm_up=True):
+    """
+    Process-pool initializer for batch workers: caps the native thread pools and loads
+    every stage's models once, so each clip the worker handles only pays for inference.
+    """
+    _limit_threads(num_threads)
+    if warm_up:
+        for stage_name in STAGE_MODELS:
+            _warm_up_stage(stage_name)
+
+
+def analyze_video(video_path, sample_rate=30, max_frames_to_check=48, use_cache=True, shard_workers=1):
+    """
+    Runs every stage for one video sequentially in THIS process and returns
+    (summary, stage_results, seconds). Meant for batch workers, where the parallelism comes
+    from running many videos at once rather than from splitting one video across processes.
+    Long recordings (see sharding.should_shard) are the exception: they are map-reduced
+    over time shards with `shard_workers` processes. Each video's trace goes to the exporters.
+    """
+    with telemetry.span("analysis", video=os.path.basename(video_path)):
+        return _analyze_video(video_path, sample_rate, max_frames_to_check, use_cache, shard_workers)
+
+
+def _analyze_video(video_path, sample_rate, max_frames_to_check, use_cache, shard_workers):
+    from .audio_buffer import SharedAudioBuffer, decode_audio, silent_audio
+    from .result_cache import hash_file
+    from . import sharding
+
+    start = time.perf_counter()
+    content_hash = hash_file(video_path) if use_cache else None
+    if shard_workers and sharding.should_shard(video_path):
+        results = sharding.run_sharded(video_path, content_hash, max_frames_to_check, workers=shard_workers)
+        results["content_hash"] = content_hash
+        return summarize(results), results, time.perf_counter() - start
+
+    samples = decode_audio(video_path)
+    audio_buffer = SharedAudioBuffer.from_array(samples if samples is not None else silent_audio())
+    del samples
+
+    results = {}
+    try:
+        stages = build_stages(video_path, audio_buffer, content_hash=content_hash,
+                              sample_rate=sample_rate, max_frames_to_check=max_frames_to_check)
+        for name, (fn, args) in stages.items():
+            try:
+                with telemetry.span(f"stage.{name}"):
+                    results.update(fn(*args))
+            except Exception as e:
+                print(f"!! [Orchestrator] Stage '{name}' failed on {video_path}: {e}")
+                results.update(STAGE_DEFAULTS[name])
+    finally:
+        audio_buffer.unlink()
+    results["content_hash"] = content_hash
+    return summarize(results), results, time.perf_counter() - start
@@ -0,0 +1,127 @@
+# modules/result_cache.py
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+import threading
+
+from . import telemetry
+
+# Where cached analyses live, and how big the cache may grow before LRU eviction kicks in.
+CACHE_DIR = os.environ.get("SENTINEL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sentinel", "results"))
+CACHE_MAX_BYTES = int(os.environ.get("SENTINEL_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's bytes, read in chunks so large uploads never sit in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    A persistent, content-addressed cache for analysis results and artifacts.
+    Every entry is keyed by (content hash, module name, module version, module parameters),
+    so changing one module's parameters only invalidates that module's entries.
+    Entries are pickles on disk; reads refresh the file's mtime, and the least recently
+    used entries are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, content_hash, module, version, params):
+        key_material = json.dumps([content_hash, module, str(version), params or {}], sort_keys=True, default=str)
+        key = hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key[:2], f"{module}-{key}.pkl")
+
+    def get(self, content_hash, module, version, params=None, default=None):
+        if not content_hash:
+            return default
+        path = self._path(content_hash, module, version, params)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)  # Mark as recently used for LRU eviction
+            print(f"-> [Cache] Hit for '{module}'.")
+            telemetry.count("sentinel_cache_hits_total", cache="result", module=module)
+            return value
+        except FileNotFoundError:
+            telemetry.count("sentinel_cache_misses_total", cache="result", module=module)
+            return default
+        except Exception as e:
+            print(f"!! [Cache] Dropping unreadable entry for '{module}': {e}")
+            self._remove(path)
+            return default
+
+    def put(self, content_hash, module, version, params, value):
+        if not content_hash:
+            return
+        path = self._path(content_hash, module, version, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # Write to a temp file and rename, so a concurrent reader never sees a partial pickle
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"!! [Cache] Could not store '{module}': {e}")
+            return
+        self._evict()
+
+    def cached(self, content_hash, module, version, params, compute_fn):
+        """Returns the cached value for this key, computing and storing it on a miss."""
+        value = self.get(content_hash, module, version, params)
+        if value is None:
+            value = compute_fn()
+            self.put(content_hash, module, version, params, value)
+        return value
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if not name.endswith(".pkl"):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):  # Oldest access first
+                self._remove(path)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+            print(f"-> [Cache] Evicted least recently used entries. Cache size: {total / 1e6:.1f} MB")
+
+
+_default_cache = None
+
+
+def get_cache():
+    """The process-wide ResultCache."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
@@ -0,0 +1,270 @@
+# modules/sharding.py
+import os
+import shutil
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import telemetry
+
+# Long recordings are split into time ranges of about this length, each analyzed in its own
+# worker process; shorter videos go through the regular stage pipeline.
+SHARD_SECONDS = float(os.environ.get("SENTINEL_SHARD_SECONDS", "600"))
+# Videos at least this long are analyzed in shards
+SHARDING_MIN_SECONDS = float(os.environ.get("SENTINEL_SHARDING_MIN_SECONDS", "1200"))
+# Bump when the per-shard analysis changes, so cached shard results are ignored.
+SHARD_VERSION = "3"
+
+
+def video_info(video_path):
+    """(fps, frame_count, duration_seconds) from the container, via OpenCV."""
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        cap.release()
+    return fps, frame_count, frame_count / fps if fps > 0 else 0.0
+
+
+def should_shard(video_path):
+    return video_info(video_path)[2] >= SHARDING_MIN_SECONDS
+
+
+def keyframe_times(video_path):
+    """
+    Presentation times (seconds) of the video stream's keyframes, read from the packet
+    headers with ffprobe (nothing is decoded). Returns [] if ffprobe isn't available.
+    """
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        return []
+    cmd = [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+           "-of", "csv=p=0", video_path]
+    try:
+        output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"!! [Sharding] ffprobe failed, falling back to uniform shards: {e}")
+        return []
+    times = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                times.append(float(pts_time))
+            except ValueError:
+                continue
+    return sorted(times)
+
+
+def plan_shards(video_path, shard_seconds=SHARD_SECONDS):
+    """
+    Splits the video into consecutive time ranges of about `shard_seconds`, each starting on
+    a keyframe when the keyframe index is available (so every shard's first seek is exact and
+    decodes nothing extra). Returns a list of dicts with index, start/end seconds and frames.
+    """
+    fps, frame_count, duration = video_info(video_path)
+    if fps <= 0 or frame_count <= 0:
+        return [{"index": 0, "start_seconds": 0.0, "end_seconds": None, "start_frame": 0, "end_frame": None}]
+
+    keyframes = keyframe_times(video_path)
+    boundaries = [0.0]
+    target = shard_seconds
+    while target < duration - shard_seconds / 2: # Don't leave a sliver of a final shard
+        if keyframes:
+            # The keyframe nearest the ideal boundary, as long as it moves the boundary forward
+            candidates = [t for t in keyframes if t > boundaries[-1]]
+            if not candidates:
+                break
+            target = min(candidates, key=lambda t: abs(t - target))
+        boundaries.append(target)
+        target = boundaries[-1] + shard_seconds
+    boundaries.append(duration)
+
+    shards = []
+    for index, (start, end) in enumerate(zip(boundaries, boundaries[1:])):
+        shards.append({"index": index, "start_seconds": start, "end_seconds": end,
+                       "start_frame": int(round(start * fps)), "end_frame": min(frame_count, int(round(end * fps)))})
+    shards[-1]["end_frame"] = frame_count
+    print(f"-> [Sharding] {duration / 60:.0f} min video split into {len(shards)} shards "
+          f"({'keyframe-aligned' if keyframes else 'uniform'}).")
+    return shards
+
+
+# --- Map: runs inside a shard worker process ---
+
+def analyze_shard(video_path, shard, max_frames_to_check=48, content_hash=None):
+    """
+    Runs the face, gaze, zero-shot and transcript analyses on one shard. Only this shard's
+    frames and audio are ever decoded, so memory is bounded by the shard length.
+    """
+    from . import face_analyzer, gaze_analyzer, zero_shot_analyzer, intelligence_analyzer as ia
+    from .frame_source import FramePipeline
+    from .audio_buffer import decode_audio, silent_audio
+    from .result_cache import get_cache
+
+    cache = get_cache() if content_hash else None
+    params = {"start_frame": shard["start_frame"], "end_frame": shard["end_frame"],
+              "max_frames_to_check": max_frames_to_check, "whisper_model": ia.WHISPER_MODEL_SIZE,
+              "llm_model": ia.LLM_MODEL, "triage_band": [ia.text_triage.AMBIGUOUS_LOW, ia.text_triage.AMBIGUOUS_HIGH],
+              "triage_version": ia.text_triage.TRIAGE_VERSION}
+    if cache:
+        cached = cache.get(content_hash, "shard", SHARD_VERSION, params)
+        if cached is not None:
+            return cached
+
+    print(f"-> [Sharding] Shard {shard['index']}: {shard['start_seconds']:.0f}s-{shard['end_seconds'] or 0:.0f}s")
+    pipeline = FramePipeline(video_path, shard["start_frame"], shard["end_frame"])
+    face = face_analyzer.FacialConsistencyCollector(max_frames_to_check=max_frames_to_check, adaptive=True)
+    gaze = gaze_analyzer.GazeBlinkCollector(fast=True)
+    face.register(pipeline)
+    gaze.register(pipeline)
+    pipeline.run()
+    face.refine(video_path)
+    face_score = face.result()
+    gaze_score = gaze.result()
+
+    duration = (shard["end_seconds"] - shard["start_seconds"]) if shard["end_seconds"] else None
+    samples = decode_audio(video_path, start_seconds=shard["start_seconds"], duration_seconds=duration)
+    if samples is None:
+        samples = silent_audio()
+    zsl_score, zsl_timeline = zero_shot_analyzer.analyze_audio_anomalies(samples)
+    # Shift the anomaly windows from shard time to video time
+    zsl_timeline = [dict(w, start=w["start"] + shard["start_seconds"], end=w["end"] + shard["start_seconds"])
+                    for w in zsl_timeline]
+
+    final = None
+    for event in ia.stream_audio_and_content(samples):
+        if event.get("final"):
+            final = event
+    del samples
+    windows = []
+    for window in final["windows"]:
+        # Shift the window timestamps from shard time to video time
+        if window["start"] is not None:
+            window = dict(window, start=window["start"] + shard["start_seconds"], end=window["end"] + shard["start_seconds"])
+        windows.append(window)
+
+    result = {
+        "shard": shard, "face_score": face_score, "face_embeddings": face.embeddings,
+        "face_frame_ids": face.face_frame_ids, "face_report": face.report, "gaze_score": gaze_score,
+        "gaze_report": gaze.report, "zsl_anomaly_score": zsl_score, "zsl_timeline": zsl_timeline,
+        "transcribed_text": "" if final["failed"] else final["result"][1],
+        # Only a Whisper error counts as a failure; a silent shard is just an empty transcript
+        "transcription_failed": final["failed"], "risk_windows": windows,
+    }
+    ollama_failed = any(w["source"] == "error" for w in windows)
+    if cache and not ollama_failed and not result["transcription_failed"]:
+        cache.put(content_hash, "shard", SHARD_VERSION, params, result)
+    return result
+
+
+# --- Reduce ---
+
+def reduce_shards(shard_results):
+    """
+    Merges per-shard results into the regular stage result fields, plus a per-range breakdown:
+    - gaze: blinks and durations are summed, then scored as one blink rate;
+    - face: every shard's faces are compared against ONE global reference (the earliest face);
+    - zero-shot: the anomaly windows of every shard form one timeline, scored as a whole;
+    - transcript: concatenated in time order; content risk is the riskiest passage overall.
+    """
+    import numpy as np
+    from . import face_analyzer, gaze_analyzer, zero_shot_analyzer, intelligence_analyzer as ia
+
+    shard_results = sorted(shard_results, key=lambda r: r["shard"]["index"])
+
+    blinks = sum((r["gaze_report"] or {}).get("blink_count", 0) for r in shard_results)
+    seconds = sum((r["gaze_report"] or {}).get("duration_seconds", 0) for r in shard_results)
+    gaze_score = gaze_analyzer.gaze_score_from_bpm(blinks / seconds * 60) if seconds else 50
+
+    blocks = [(r["shard"]["index"], r["face_embeddings"]) for r in shard_results
+              if r["face_embeddings"] is not None and len(r["face_embeddings"])]
+    embeddings = np.concatenate([block for _, block in blocks]) if blocks else None
+    face_distances = {}
+    if embeddings is not None and len(embeddings) >= 2:
+        distances = 1 - embeddings @ embeddings[0] # Shards are in time order, so row 0 is the earliest face
+        face_score = int(np.count_nonzero(distances < face_analyzer.MATCH_THRESHOLD) / len(distances) * 100)
+        offset = 0
+        for index, block in blocks:
+            face_distances[index] = distances[offset:offset + len(block)]
+            offset += len(block)
+    else:
+        face_score = 75 # Not enough faces to determine consistency, as in the unsharded analyzer
+
+    zsl_timeline = [w for r in shard_results for w in r["zsl_timeline"]]
+    if zsl_timeline:
+        zsl_score = zero_shot_analyzer.score_from_fraction(sum(w["anomalous"] for w in zsl_timeline) / len(zsl_timeline))
+    else:
+        zsl_score = 50 # Neutral, as when feature extraction fails
+
+    transcribed_text = " ".join(r["transcribed_text"] for r in shard_results if r["transcribed_text"]).strip()
+    windows = [dict(w, index=i) for i, w in enumerate(w for r in shard_results for w in r["risk_windows"])]
+    if all(r["transcription_failed"] for r in shard_results):
+        sync_score, transcribed_text, content_risk_score, justification = 0, "Transcription failed.", 0, "N/A"
+    else:
+        sync_score, transcribed_text, content_risk_score, justification = ia.combine_windows(windows, transcribed_text)
+
+    breakdown = []
+    for r in shard_results:
+        shard, distances = r["shard"], face_distances.get(r["shard"]["index"])
+        breakdown.append({
+            "start_seconds": shard["start_seconds"], "end_seconds": shard["end_seconds"],
+            "face_consistency": int(np.mean(distances < face_analyzer.MATCH_THRESHOLD) * 100) if distances is not None else None,
+            "blinks_per_minute": (r["gaze_report"] or {}).get("blinks_per_minute"),
+            "zsl_anomaly_score": r["zsl_anomaly_score"],
+            "content_risk_score": max((w["risk_score"] for w in r["risk_windows"]), default=0),
+        })
+
+    frames_examined = sum((r["face_report"] or {}).get("frames_examined", 0) for r in shard_results)
+    return {
+        "face_score": face_score, "gaze_score": gaze_score, "face_embeddings": embeddings,
+        "face_report": {"frames_examined": frames_examined, "faces_found": 0 if embeddings is None else len(embeddings)},
+        "zsl_anomaly_score": zsl_score, "zsl_timeline": zsl_timeline, "sync_score": sync_score, "transcribed_text": transcribed_text,
+        "content_risk_score": content_risk_score, "justification": justification,
+        "risk_windows": windows, "shard_breakdown": breakdown,
+    }
+
+
+def default_shard_workers():
+    # Each shard worker loads every model, so give each at least 2 cores
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def run_sharded(video_path, content_hash=None, max_frames_to_check=48, workers=None, shard_seconds=SHARD_SECONDS,
+                on_shard=None):
+    """
+    Map-reduce analysis of a long video: the shards run on a pool of worker processes and
+    are merged with reduce_shards(). on_shard(shard_result) is called as each one finishes.
+    Returns the merged result dict. Each shard's trace joins the caller's under "sharded_analysis".
+    Like a failed stage in run_stages, a shard that raises doesn't fail the video: it is left
+    out of the merge and listed under "failed_shards" (with its time range and the error).
+    """
+    from .orchestrator import init_batch_worker
+
+    shards = plan_shards(video_path, shard_seconds)
+    workers = min(workers or default_shard_workers(), len(shards))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    results, failed = [], []
+    with telemetry.span("sharded_analysis", shards=len(shards), workers=workers), \
+         ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_batch_worker, initargs=(threads, False)) as executor:
+        futures = {executor.submit(telemetry.traced_call, f"shard.{shard['index']}", analyze_shard,
+                                   video_path, shard, max_frames_to_check, content_hash): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result, trace, metrics = future.result()
+            except Exception as e:
+                print(f"!! [Sharding] Shard {shard['index']} failed: {e}")
+                failed.append({"index": shard["index"], "start_seconds": shard["start_seconds"],
+                               "end_seconds": shard["end_seconds"], "error": f"{type(e).__name__}: {e}"})
+                continue
+            telemetry.adopt(trace, metrics)
+            results.append(result)
+            if on_shard:
+                on_shard(result)
+    merged = reduce_shards(results)
+    merged["failed_shards"] = sorted(failed, key=lambda f: f["index"])
+    return merged
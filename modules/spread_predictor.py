@@ -1,29 +1,84 @@
 # modules/spread_predictor.py
-import requests
+import re
 # You might need to run: pip install textstat
 import textstat
 
-OLLAMA_URL = "http://localhost:11434/api/chat"
+from . import llm_client
+from . import text_triage
 
-def predict_virality(text ):
-    """Calculates a 'Virality Score' based on text features."""
+# The first complete number in the reply, i.e. one followed by a non-digit
+EARLY_NUMBER_PATTERN = re.compile(r'(\d+)\D')
+
+def build_emotion_prompt(text):
+    return f"On a scale from 0 (calm) to 100 (highly emotional), rate the emotional intensity of this text. Respond with only the number. Text: '{text}'"
+
+def parse_emotion_score(emotion_response, default=50):
+    """Takes the first number in the LLM's reply, clamped to 0-100."""
+    match = re.search(r'\d+', emotion_response or "")
+    return min(100, int(match.group(0))) if match else default
+
+def combine_virality(emotional_score, readability_score, emotion_source="llm"):
+    # Combine into a final Virality Score (simple weighted average for demo)
+    # We normalize readability (max ~100) and emotion (max 100)
+    virality_score = int((emotional_score * 0.6) + (readability_score * 0.4))
+    return {"virality_score": virality_score, "emotion_score": emotional_score, "readability_score": readability_score,
+            "emotion_source": emotion_source}
+
+def predict_virality(text, use_triage=True):
+    """
+    Calculates a 'Virality Score' based on text features. The emotion score comes from the
+    local triage when it is confident, and from the LLM otherwise ("emotion_source" says which).
+    """
     print("-> [Predictor] Predicting Spread Potential...")
-    
-    # Feature 1: Emotional Intensity (via LLM)
-    emotion_prompt = f"On a scale from 0 (calm) to 100 (highly emotional), rate the emotional intensity of this text. Respond with only the number. Text: '{text}'"
-    emotion_payload = {"model": "llama3", "messages": [{"role": "user", "content": emotion_prompt}], "stream": False}
-    try:
-        emotion_response = requests.post(OLLAMA_URL, json=emotion_payload).json()['message']['content']
-        emotional_score = int(''.join(filter(str.isdigit, emotion_response)))
-    except:
-        emotional_score = 50 # Default
+    triaged = text_triage.triage(text) if use_triage else None
+
+    # Feature 1: Emotional Intensity (local triage, or the LLM when the triage is unsure)
+    # The LLM call is sent in the background so the readability feature is computed while llama3 works
+    emotion_future = None
+    if triaged is None or triaged["escalate_emotion"]:
+        emotion_future = llm_client.submit(llm_client.ask, build_emotion_prompt(text))
 
     # Feature 2: Readability (lower score = harder to read = less viral)
     # Flesch reading ease score (higher is better)
     readability_score = textstat.flesch_reading_ease(text)
 
-    # Combine into a final Virality Score (simple weighted average for demo)
-    # We normalize readability (max ~100) and emotion (max 100)
-    virality_score = int((emotional_score * 0.6) + (readability_score * 0.4))
-    
-    return {"virality_score": virality_score, "emotion_score": emotional_score, "readability_score": readability_score}
+    if emotion_future is None:
+        return combine_virality(triaged["emotion_score"], readability_score, "triage")
+    try:
+        emotional_score = parse_emotion_score(emotion_future.result())
+    except Exception:
+        emotional_score = 50 # Default
+
+    return combine_virality(emotional_score, readability_score)
+
+def stream_virality(text, use_triage=True):
+    """
+    Streaming version of predict_virality for the UI. Yields partial result dicts:
+    first the readability score, then the emotion score as soon as the LLM has produced
+    a complete number, and finally the full result (with "final": True).
+    """
+    print("-> [Predictor] Streaming Spread Potential...")
+    readability_score = textstat.flesch_reading_ease(text)
+    yield {"readability_score": readability_score}
+    if use_triage:
+        result = text_triage.triage(text)
+        if not result["escalate_emotion"]:
+            yield dict(combine_virality(result["emotion_score"], readability_score, "triage"), final=True)
+            return
+
+    buffer = ""
+    emotional_score = None
+    try:
+        for token in llm_client.stream_ask(build_emotion_prompt(text)):
+            buffer += token
+            if emotional_score is None:
+                match = EARLY_NUMBER_PATTERN.search(buffer)
+                if match:
+                    emotional_score = min(100, int(match.group(1)))
+                    yield {"readability_score": readability_score, "emotion_score": emotional_score}
+    except Exception as e:
+        print(f"!! [Predictor] Error: {e}")
+    if emotional_score is None:
+        emotional_score = parse_emotion_score(buffer)
+
+    yield dict(combine_virality(emotional_score, readability_score), final=True)
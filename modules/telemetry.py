@@ -0,0 +1,316 @@
+# modules/telemetry.py
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Set to a directory to write every finished analysis trace there as JSON
+TRACE_DIR = os.environ.get("SENTINEL_TRACE_DIR")
+# Set to a port to serve the metrics in Prometheus text format on http://127.0.0.1:<port>/metrics
+METRICS_PORT = os.environ.get("SENTINEL_METRICS_PORT")
+# Upper bounds (seconds) of the histogram buckets; wide, since spans range from LLM tokens to whole videos
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_current_span = contextvars.ContextVar("sentinel_span", default=None)
+
+
+# --- Spans ---
+
+class Span:
+    """
+    One timed step of an analysis. Spans nest through a context variable, so a span opened
+    while another is active becomes its child; the outermost span is the trace's root.
+    Attributes carry what the step did (frames processed, faces found, tokens generated...).
+    """
+
+    __slots__ = ("name", "attributes", "children", "start_time", "_start", "duration")
+
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    @property
+    def elapsed(self):
+        """Seconds since the span started (its duration, once it has ended)."""
+        return self.duration if self.duration is not None else time.perf_counter() - self._start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def add(self, key, amount=1):
+        """Increments a numeric attribute."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+        return self
+
+    def to_dict(self):
+        return {"name": self.name, "start_time": self.start_time, "duration_seconds": self.elapsed,
+                "attributes": self.attributes, "children": [c if isinstance(c, dict) else c.to_dict() for c in self.children]}
+
+
+def current_span():
+    return _current_span.get()
+
+
+def annotate(**attributes):
+    """Sets attributes on the active span, if there is one (a no-op outside any trace)."""
+    active = _current_span.get()
+    if active is not None:
+        active.set(**attributes)
+
+
+@contextmanager
+def span(name, export=True, **attributes):
+    """
+    Times the enclosed block as a span named `name`. Durations also feed the
+    sentinel_span_seconds histogram. When a root span (one without a parent) ends, its
+    trace goes to the registered exporters, unless export=False.
+    Keep spans out of per-frame loops: aggregate there, then annotate() once.
+    """
+    parent = _current_span.get()
+    current = Span(name, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._start
+        _current_span.reset(token)
+        observe("sentinel_span_seconds", current.duration, span=name)
+        if parent is not None:
+            parent.children.append(current)
+        elif export:
+            _export(current.to_dict())
+
+
+def record_span(name, seconds, **attributes):
+    """
+    Adds an already-measured span under the active one. For work spread across a generator's
+    resumptions, where a `with span()` can't stay open across the yields.
+    """
+    observe("sentinel_span_seconds", seconds, span=name)
+    parent = _current_span.get()
+    if parent is not None:
+        finished = Span(name, attributes)
+        finished.start_time -= seconds
+        finished.duration = seconds
+        parent.children.append(finished)
+
+
+def traced_call(name, fn, *args, **kwargs):
+    """
+    Runs fn inside a span named `name` and returns (result, trace, metrics): meant for the
+    stage and shard worker processes, whose spans and metrics the parent process adopts.
+    It runs in a fresh context, so the trace is detached even when called in-process.
+    """
+    def run():
+        with span(name, export=False) as root:
+            return fn(*args, **kwargs), root
+    result, root = contextvars.Context().run(run)
+    return result, root.to_dict(), drain_metrics()
+
+
+def adopt(trace, metrics=None):
+    """Attaches a trace (and merges the metrics) returned by traced_call() in another process."""
+    if metrics:
+        merge_metrics(metrics)
+    parent = _current_span.get()
+    if parent is not None and trace is not None:
+        parent.children.append(trace)
+
+
+def flatten(trace, depth=0):
+    """The spans of a trace dict in depth-first order, as (depth, span dict) pairs."""
+    rows = [(depth, trace)]
+    for child in trace.get("children", []):
+        rows += flatten(child, depth + 1)
+    return rows
+
+
+# --- Metrics ---
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class _Metrics:
+    """Process-wide counters and histograms, keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {} # key -> [bucket counts..., sum, count]
+
+    def count(self, name, amount, labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels):
+        key = _key(name, labels)
+        with self._lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [0] * len(HISTOGRAM_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            snapshot = {"counters": list(self.counters.items()),
+                        "histograms": [(k, list(v)) for k, v in self.histograms.items()]}
+            if reset:
+                self.counters, self.histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, value in snapshot["counters"]:
+                key = (key[0], tuple(tuple(label) for label in key[1]))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, values in snapshot["histograms"]:
+                key = (key[0], tuple(tuple(label) for label in key[1]))
+                entry = self.histograms.setdefault(key, [0] * len(HISTOGRAM_BUCKETS) + [0.0, 0])
+                for i, value in enumerate(values):
+                    entry[i] += value
+
+
+_metrics = _Metrics()
+
+
+def count(name, amount=1, **labels):
+    """Increments a counter, e.g. count("sentinel_cache_hits_total", cache="result", module="face")."""
+    _metrics.count(name, amount, labels)
+
+
+def observe(name, value, **labels):
+    """Records one observation (in seconds) in a histogram."""
+    _metrics.observe(name, value, labels)
+
+
+def metrics_snapshot():
+    return _metrics.snapshot()
+
+
+def drain_metrics():
+    """Returns this process's metrics and resets them (worker processes hand them to the parent)."""
+    return _metrics.snapshot(reset=True)
+
+
+def merge_metrics(snapshot):
+    _metrics.merge(snapshot)
+
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text():
+    """The current metrics in the Prometheus text exposition format."""
+    snapshot = _metrics.snapshot()
+    lines, typed = [], set()
+    for (name, labels), value in sorted(snapshot["counters"]):
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_labels_text(labels)} {value}")
+    for (name, labels), values in sorted(snapshot["histograms"]):
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, bucket in zip(HISTOGRAM_BUCKETS, values):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_labels_text(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_labels_text(labels, [('le', '+Inf')])} {values[-1]}")
+        lines.append(f"{name}_sum{_labels_text(labels)} {values[-2]}")
+        lines.append(f"{name}_count{_labels_text(labels)} {values[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Exporters ---
+
+_exporters = []
+
+
+def add_exporter(exporter):
+    """Registers exporter(trace_dict), called with every finished root trace."""
+    _exporters.append(exporter)
+
+
+def _export(trace):
+    for exporter in list(_exporters):
+        try:
+            exporter(trace)
+        except Exception as e:
+            print(f"!! [Telemetry] Exporter {exporter!r} failed: {e}")
+
+
+class JsonTraceExporter:
+    """Writes each trace to `<directory>/trace-<time>-<root name>.json`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, trace):
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(trace["start_time"]))
+        path = os.path.join(self.directory, f"trace-{stamp}-{int(trace['start_time'] * 1000) % 1000:03d}-{trace['name']}.json")
+        with open(path, "w") as f:
+            json.dump(trace, f, indent=1, default=str)
+
+    def __repr__(self):
+        return f"JsonTraceExporter({self.directory!r})"
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serves prometheus_text() at http://host:port/metrics from a daemon thread (once per process)."""
+    global _metrics_server
+    if _metrics_server is not None:
+        return _metrics_server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    _metrics_server = server
+    print(f"-> [Telemetry] Serving Prometheus metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+if TRACE_DIR:
+    add_exporter(JsonTraceExporter(TRACE_DIR))
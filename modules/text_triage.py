@@ -0,0 +1,249 @@
+# modules/text_triage.py
+import os
+import re
+
+import numpy as np
+
+from . import model_registry, telemetry
+
+# Texts are escalated to the LLM by default. Only those the model is confidently high about, or
+# short ones it is confidently low about, are decided locally. These are the loosest thresholds
+# allowed; the band actually used is calibrated on HELD_OUT_CORPUS and can only be tighter
+# (see calibrate_band).
+AMBIGUOUS_LOW = float(os.environ.get("SENTINEL_TRIAGE_LOW", "0.25"))
+AMBIGUOUS_HIGH = float(os.environ.get("SENTINEL_TRIAGE_HIGH", "0.75"))
+# The lexicon can't tell a long transcript is harmless, so a local "low" verdict is reserved
+# for short, boilerplate-like texts
+LOW_RISK_MAX_WORDS = int(os.environ.get("SENTINEL_TRIAGE_LOW_MAX_WORDS", "30"))
+# How far past the worst held-out mistake the band is pushed, as a fraction of the distance to certainty
+CALIBRATION_MARGIN = 0.5
+# Bump when the corpora, features or calibration change, so cached triage decisions are ignored.
+TRIAGE_VERSION = "2"
+
+# --- Lexicon ---
+URGENCY_WORDS = {
+    "urgent", "urgently", "immediately", "immediate", "now", "hurry", "emergency", "alert", "warning",
+    "breaking", "deadline", "asap", "quickly", "instantly", "tonight", "must", "act", "run", "evacuate",
+}
+URGENCY_PHRASES = re.compile(
+    r"\b(act now|right now|before it'?s too late|last chance|share this|spread the word|don'?t wait|"
+    r"time is running out|do not ignore|wake up)\b", re.IGNORECASE)
+EMOTION_WORDS = {
+    "shocking", "catastrophic", "catastrophe", "crisis", "panic", "terrifying", "terrified", "outrage",
+    "outrageous", "disaster", "collapse", "collapsing", "destroy", "destroyed", "betrayal", "betrayed",
+    "heist", "evil", "enemy", "enemies", "fear", "afraid", "horrifying", "nightmare", "chaos", "dead",
+    "death", "die", "dying", "threat", "attack", "stolen", "lies", "lying", "corrupt", "traitors",
+    "furious", "devastating", "unbelievable", "insane", "amazing", "incredible", "love", "hate",
+}
+NEUTRAL_WORDS = {
+    "according", "reported", "reportedly", "announced", "scheduled", "percent", "said", "stated",
+    "officials", "spokesperson", "data", "study", "quarter", "estimated", "approximately", "meeting",
+    "update", "planned", "statement", "published", "analysis", "review",
+}
+SECOND_PERSON = {"you", "your", "yours", "yourself", "you're"}
+
+FEATURE_NAMES = [
+    "urgency_density", "urgency_phrases", "emotion_density", "neutral_density", "second_person_density",
+    "caps_ratio", "exclamations_per_sentence", "repeated_punctuation", "question_ratio",
+]
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z']*")
+
+
+def extract_features(text):
+    """Lexicon, punctuation and caps features of one text, as a float vector in FEATURE_NAMES order."""
+    words = WORD_PATTERN.findall(text or "")
+    n = max(1, len(words))
+    lower = [w.lower() for w in words]
+    sentences = max(1, len(re.findall(r"[.!?]+", text or "")))
+    return np.array([
+        sum(w in URGENCY_WORDS for w in lower) / n,
+        len(URGENCY_PHRASES.findall(text or "")),
+        sum(w in EMOTION_WORDS for w in lower) / n,
+        sum(w in NEUTRAL_WORDS for w in lower) / n,
+        sum(w in SECOND_PERSON for w in lower) / n,
+        sum(len(w) >= 2 and w.isupper() for w in words) / n,
+        (text or "").count("!") / sentences,
+        len(re.findall(r"[!?]{2,}", text or "")),
+        (text or "").count("?") / sentences,
+    ], dtype=np.float64)
+
+
+# --- Seed corpus: (text, risky, emotional) ---
+# Small and hand-labelled; it only has to separate the obvious cases, the LLM handles the rest.
+SEED_CORPUS = [
+    ("The new server migration is scheduled for this weekend.", 0, 0),
+    ("According to the ministry, inflation rose 0.3 percent in the last quarter.", 0, 0),
+    ("Officials said the meeting will resume on Tuesday after a short review.", 0, 0),
+    ("The company published its annual report, which shows approximately flat revenue.", 0, 0),
+    ("A spokesperson stated that the bridge will be closed for planned maintenance.", 0, 0),
+    ("The study estimated that rainfall was slightly above average this year.", 0, 0),
+    ("Our team will share an update on the project timeline next week.", 0, 0),
+    ("The city council announced new opening hours for the public library.", 0, 0),
+    ("Data from the survey was reported in a statement on Monday.", 0, 0),
+    ("Thank you all for joining today's call, we covered the budget and hiring plans.", 0, 0),
+    ("I love this little cafe, the coffee is amazing and the staff are incredible!", 0, 1),
+    ("We won the championship!!! Best night of my life, I can't believe it!", 0, 1),
+    ("Happy birthday! I hope your day is amazing, we love you so much!", 0, 1),
+    ("What a devastating loss for the team, fans are heartbroken tonight.", 0, 1),
+    ("URGENT!!! The banks are collapsing, withdraw your money NOW before it's too late!", 1, 1),
+    ("BREAKING: the government is hiding a catastrophic crisis. Share this with everyone!", 1, 1),
+    ("Act now! They are coming for your savings and nobody will warn you. Wake up!", 1, 1),
+    ("Evacuate immediately, the water is poisoned, do not wait for the officials' lies!", 1, 1),
+    ("This shocking heist was planned by corrupt traitors. You must stop them tonight!", 1, 1),
+    ("Panic is spreading, the enemy attack has started, run while you still can!!", 1, 1),
+    ("WARNING: the vaccine will destroy your family. Spread the word, time is running out!", 1, 1),
+    ("The election was stolen by evil liars and you are next. Don't wait, fight back NOW!", 1, 1),
+    ("Last chance to save your home from the coming collapse, act now or lose everything!", 1, 1),
+    ("They lied to you about everything. The truth is terrifying. Hurry, share before it's deleted!", 1, 1),
+    ("Your account will be suspended today unless you verify your details immediately.", 1, 0),
+    ("Do not ignore this message. Transfer the payment before the deadline tonight.", 1, 0),
+    ("You must forward this to ten people right now or the offer expires.", 1, 0),
+    ("Reminder: the quarterly review is scheduled for Friday, please send your slides.", 0, 0),
+    ("The weather service reported light showers for the region tomorrow.", 0, 0),
+    ("Analysts said the merger is expected to close in the third quarter.", 0, 0),
+]
+
+# --- Held-out corpus: (text, risky, emotional) ---
+# Never fitted on; only used to place the local-decision band. It is deliberately hard for the
+# lexicon: threats and scams with none of its keywords, and harmless texts full of them.
+HELD_OUT_CORPUS = [
+    ("Your grandson is in jail. Wire the bail money to this account and don't tell his parents.", 1, 1),
+    ("Pay the ransom in bitcoin by Friday or the photos go to everyone in your contacts.", 1, 1),
+    ("The moon landing was filmed in a studio and the scientists were paid to keep quiet.", 1, 0),
+    ("Drinking a cup of bleach each morning cures the infection, doctors just won't admit it.", 1, 0),
+    ("Officials said the army will seize every privately owned firearm next month.", 1, 0),
+    ("According to a leaked memo, the city water has been dosed with sedatives since spring.", 1, 0),
+    ("The ballots in the third district were printed abroad and counted twice.", 1, 0),
+    ("Anyone who votes for them should be dealt with once the sun goes down.", 1, 1),
+    ("Click the link to claim your tax refund before the deadline.", 1, 0),
+    ("Fire drill at three: please evacuate the building calmly when the alarm sounds.", 0, 0),
+    ("I love you so much, happy birthday, have an amazing day!!!", 0, 1),
+    ("That last-minute goal was insane, what an incredible match!", 0, 1),
+    ("Our old dog died this morning and the whole family is heartbroken.", 0, 1),
+    ("Breaking: the museum will open its new dinosaur exhibit this weekend.", 0, 0),
+    ("Please submit your timesheets by Friday, the deadline is firm.", 0, 0),
+    ("Officials announced the road will reopen on Monday after the repairs.", 0, 0),
+    ("The weather service issued a warning for strong winds tonight, so secure loose objects.", 0, 0),
+    ("The minutes of the board meeting were published on the website.", 0, 0),
+]
+
+
+def calibrate_band(probabilities, labels, low=AMBIGUOUS_LOW, high=AMBIGUOUS_HIGH, margin=CALIBRATION_MARGIN):
+    """
+    The (low, high) band for held-out `probabilities` with 0/1 `labels`. It starts from the
+    loosest allowed thresholds, then moves each side past the worst held-out mistake. The low side
+    goes below every positive and the high side above every negative, by `margin` of the
+    remaining distance to 0 or 1.
+    """
+    positives, negatives = probabilities[labels == 1], probabilities[labels == 0]
+    if len(positives):
+        low = min(low, float(positives.min()) * (1 - margin))
+    if len(negatives):
+        high = max(high, 1 - (1 - float(negatives.max())) * (1 - margin))
+    return low, high
+
+
+class TriageModel:
+    """
+    Two small logistic regressions over extract_features(): one for content risk and one for
+    emotional intensity. Fitted once per process on SEED_CORPUS (a few milliseconds), after
+    which scoring a text is a feature pass plus two dot products. The bands in which each
+    one defers to the LLM (risk_band, emotion_band) are calibrated on HELD_OUT_CORPUS.
+    """
+
+    def __init__(self, corpus=SEED_CORPUS, held_out=HELD_OUT_CORPUS, l2=0.05, steps=3000, learning_rate=0.5):
+        X = np.stack([extract_features(text) for text, _, _ in corpus])
+        self.mean = X.mean(axis=0)
+        self.std = X.std(axis=0) + 1e-6
+        Z = (X - self.mean) / self.std
+        self.risk_weights = self._fit(Z, np.array([r for _, r, _ in corpus], dtype=np.float64), l2, steps, learning_rate)
+        self.emotion_weights = self._fit(Z, np.array([e for _, _, e in corpus], dtype=np.float64), l2, steps, learning_rate)
+        self.risk_band, self.emotion_band = (AMBIGUOUS_LOW, AMBIGUOUS_HIGH), (AMBIGUOUS_LOW, AMBIGUOUS_HIGH)
+        if held_out:
+            risk, emotion = self.probabilities(np.stack([extract_features(text) for text, _, _ in held_out]))
+            self.risk_band = calibrate_band(risk, np.array([r for _, r, _ in held_out]))
+            self.emotion_band = calibrate_band(emotion, np.array([e for _, _, e in held_out]))
+
+    @staticmethod
+    def _fit(Z, y, l2, steps, learning_rate):
+        """Plain batch gradient descent on the L2-regularized log loss. Returns weights with the bias last."""
+        Zb = np.hstack([Z, np.ones((len(Z), 1))])
+        w = np.zeros(Zb.shape[1])
+        for _ in range(steps):
+            p = 1 / (1 + np.exp(-Zb @ w))
+            gradient = Zb.T @ (p - y) / len(y) + l2 * np.append(w[:-1], 0.0)
+            w -= learning_rate * gradient
+        return w
+
+    def probabilities(self, features):
+        """(risk, emotion) probabilities for an (N, F) feature matrix, each of shape (N,)."""
+        Zb = np.hstack([(features - self.mean) / self.std, np.ones((len(features), 1))])
+        return 1 / (1 + np.exp(-Zb @ self.risk_weights)), 1 / (1 + np.exp(-Zb @ self.emotion_weights))
+
+
+model_registry.register("text_triage", TriageModel)
+
+
+def _verdict(probability, band, words):
+    """"high" or "low" when the triage can decide locally, None when the text must go to the LLM."""
+    low, high = band
+    if probability >= high:
+        return "high"
+    if probability <= low and words <= LOW_RISK_MAX_WORDS:
+        return "low"
+    return None
+
+
+def _explain(features):
+    named = dict(zip(FEATURE_NAMES, features))
+    cues = []
+    if named["urgency_density"] or named["urgency_phrases"]:
+        cues.append("urgency language")
+    if named["emotion_density"]:
+        cues.append("emotionally charged words")
+    if named["caps_ratio"] >= 0.1:
+        cues.append(f"{named['caps_ratio']:.0%} all-caps words")
+    if named["exclamations_per_sentence"] >= 0.5 or named["repeated_punctuation"]:
+        cues.append("heavy exclamation")
+    if named["neutral_density"]:
+        cues.append("neutral reporting vocabulary")
+    return ", ".join(cues) or "no urgency, emotion or emphasis markers"
+
+
+def triage_batch(texts):
+    """
+    Scores many texts at once. Returns one dict per text with provisional 0-100 risk_score and
+    emotion_score, their probabilities, risk_verdict ("high", "low" or None), and
+    escalate_risk / escalate_emotion flags that are True unless the triage is confident
+    enough to decide locally. Escalation is the default.
+    """
+    if not texts:
+        return []
+    model = model_registry.get("text_triage")
+    features = np.stack([extract_features(text) for text in texts])
+    risk, emotion = model.probabilities(features)
+    results = []
+    for text, r, e, f in zip(texts, risk, emotion, features):
+        words = len(WORD_PATTERN.findall(text or ""))
+        risk_verdict = _verdict(r, model.risk_band, words)
+        results.append({
+            "risk_score": int(round(r * 100)), "emotion_score": int(round(e * 100)),
+            "risk_probability": float(r), "emotion_probability": float(e),
+            "risk_verdict": risk_verdict, "escalate_risk": risk_verdict is None,
+            "escalate_emotion": _verdict(e, model.emotion_band, words) is None,
+            "cues": _explain(f),
+        })
+    escalated = sum(result["escalate_risk"] for result in results)
+    telemetry.count("sentinel_triage_texts_total", len(texts) - escalated, decision="local")
+    telemetry.count("sentinel_triage_texts_total", escalated, decision="escalated")
+    return results
+
+
+def triage(text):
+    """triage_batch() for a single text."""
+    return triage_batch([text])[0]
+
+
+def triage_justification(result):
+    verdict = "clearly high-risk" if result["risk_verdict"] == "high" else "clearly low-risk"
+    return f"Local triage ({verdict}, no LLM call): {result['cues']}."
@@ -1,26 +1,131 @@
 # modules/translator.py
-import argostranslate.package
-import argostranslate.translate
+import os
+import re
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import telemetry
+
+SENTENCE_CACHE_SIZE = 4096   # Propaganda clips repeat slogans a lot, so sentences are worth memoizing
+BATCH_SENTENCES = 16         # Sentences sent to Argos per translate() call
+# Worker threads for long transcripts (1 = translate in the calling thread)
+TRANSLATION_WORKERS = int(os.environ.get("SENTINEL_TRANSLATION_WORKERS", "1"))
+PARALLEL_MIN_BATCHES = 4     # Fewer batches than this aren't worth the thread hand-off
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?。！？])\s+')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_translation(source_lang_code, target_lang_code="en"):
+    """
+    The Argos translation pipeline for a language pair, resolved once per process.
+    Returns None if the language pack isn't installed.
+    """
+    import argostranslate.translate # Imported lazily: most clips are English and never need it
+
+    # Find the installed translation package
+    installed_languages = {lang.code: lang for lang in argostranslate.translate.get_installed_languages()}
+    from_lang, to_lang = installed_languages.get(source_lang_code), installed_languages.get(target_lang_code)
+    if from_lang is None or to_lang is None:
+        return None
+    return from_lang.get_translation(to_lang)
+
+
+def split_sentences(text):
+    return [s for s in SENTENCE_SPLIT.split(text.strip()) if s]
+
+
+class _SentenceCache:
+    """A small thread-safe LRU cache of translated sentences, keyed by (sentence, source, target)."""
+
+    def __init__(self, max_entries=SENTENCE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_sentence_cache = _SentenceCache()
+
+
+def _translate_batch(sentences, source_lang_code, target_lang_code):
+    """
+    Translates a batch of sentences in one Argos call: Argos translates each line of its input
+    separately, so the batch is joined with newlines and split back. If the line count doesn't
+    survive the round trip, the batch falls back to one call per sentence.
+    """
+    translation = get_translation(source_lang_code, target_lang_code)
+    lines = translation.translate("\n".join(sentences)).split("\n")
+    if len(lines) != len(sentences):
+        lines = [translation.translate(sentence) for sentence in sentences]
+    for sentence, line in zip(sentences, lines):
+        _sentence_cache.put((sentence, source_lang_code, target_lang_code), line)
+    return lines
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None: # Sized by the first parallel call
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="translate")
+        return _executor
+
+
+def translate_sentences(sentences, source_lang_code, target_lang_code="en", workers=TRANSLATION_WORKERS):
+    """
+    Translates a list of sentences, skipping the ones already in the sentence cache and
+    sending the rest to Argos in batches (across worker threads for long transcripts).
+    """
+    translated = [_sentence_cache.get((s, source_lang_code, target_lang_code)) for s in sentences]
+    missing = [i for i, t in enumerate(translated) if t is None]
+    telemetry.count("sentinel_cache_hits_total", len(sentences) - len(missing), cache="translation")
+    telemetry.count("sentinel_cache_misses_total", len(missing), cache="translation")
+    # Each distinct sentence is translated once, however often it repeats
+    unique = list(dict.fromkeys(sentences[i] for i in missing))
+    batches = [unique[i:i + BATCH_SENTENCES] for i in range(0, len(unique), BATCH_SENTENCES)]
+
+    if workers > 1 and len(batches) >= PARALLEL_MIN_BATCHES:
+        results = list(_get_executor(workers).map(lambda b: _translate_batch(b, source_lang_code, target_lang_code), batches))
+    else:
+        results = [_translate_batch(b, source_lang_code, target_lang_code) for b in batches]
+    lookup = {s: t for batch, lines in zip(batches, results) for s, t in zip(batch, lines)}
+    return [t if t is not None else lookup[sentences[i]] for i, t in enumerate(translated)]
+
 
 def translate_to_english(text, source_lang_code):
     """
     Translates text from a source language to English using Argos Translate.
+    The text is split into sentences, which are translated in batches and memoized.
     """
-    if source_lang_code == "en":
+    if source_lang_code == "en" or not text or not text.strip():
         return text # No translation needed
 
     print(f"-> [Translator] Translating from '{source_lang_code}' to 'en'...")
     try:
-        # Find the installed translation package
-        installed_languages = argostranslate.translate.get_installed_languages()
-        from_lang = list(filter(lambda x: x.code == source_lang_code, installed_languages))[0]
-        to_lang = list(filter(lambda x: x.code == "en", installed_languages))[0]
-        
-        translation = from_lang.get_translation(to_lang)
-        return translation.translate(text)
-    except IndexError:
-        print(f"!! [Translator] Language pack for '{source_lang_code}' to 'en' not found. Please install it.")
-        return text # Return original text if translation fails
+        if get_translation(source_lang_code, "en") is None:
+            print(f"!! [Translator] Language pack for '{source_lang_code}' to 'en' not found. Please install it.")
+            return text # Return original text if translation fails
+        sentences = split_sentences(text)
+        with telemetry.span("translate", language=source_lang_code, sentences=len(sentences)):
+            return " ".join(translate_sentences(sentences, source_lang_code, "en"))
     except Exception as e:
         print(f"!! [Translator] Error: {e}")
         return text
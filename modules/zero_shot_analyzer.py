@@ -1,61 +1,152 @@
 # modules/zero_shot_analyzer.py
+import os
+import tempfile
+
 import numpy as np
-from sklearn.ensemble import IsolationForest
-import librosa # We need this for audio feature extraction
+
+from . import model_registry, telemetry
+from .audio_buffer import SAMPLE_RATE, load_audio
+
+# Bump when the features or the detector change, so cached results from older versions are ignored.
+MODULE_VERSION = "3"
+
+# The trained detector is persisted here and loaded once per process (through the model registry)
+MODEL_PATH = os.environ.get("SENTINEL_ZSL_MODEL", os.path.join(os.path.expanduser("~"), ".cache", "sentinel",
+                                                               "models", "zero_shot_detector.joblib"))
+
+# --- Feature engine ---
+N_FFT = 2048
+HOP_LENGTH = 512
+WINDOW_SECONDS = 2.0  # Features are averaged per window, so anomalies are localized in time
+FEATURE_NAMES = ["chroma_stft", "rms", "spectral_centroid", "spectral_bandwidth", "zero_crossing_rate"]
 
 # --- "Training" our Anomaly Detector ---
-# In a real system, you would load audio from many trusted, real videos.
-# For this demo, we will simulate a "normal" audio profile.
+# In a real system, you would load audio from many trusted, real videos
+# (see train_anomaly_detector). For this demo, we simulate a "normal" audio profile.
 # This represents the "knowledge" of what real human speech looks like.
-print("[Setup] Training Zero-Shot Anomaly Detector...")
-# Let's create some dummy "normal" feature vectors.
-# These features could be things like pitch, energy, zero-crossing rate, etc.
-# A real implementation would have thousands of these from real videos.
-X_train_normal = np.random.rand(100, 5) * np.array([0.5, 1.0, 0.2, 0.8, 0.4])
-anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
-anomaly_detector.fit(X_train_normal)
-print("[Setup] Anomaly Detector is ready.")
+def _synthetic_profile():
+    # Seeded, so every process (and every restart) trains exactly the same detector
+    rng = np.random.default_rng(42)
+    return rng.random((100, len(FEATURE_NAMES))) * np.array([0.5, 1.0, 0.2, 0.8, 0.4])
+
+def train_anomaly_detector(features=None, path=MODEL_PATH):
+    """
+    Fits the IsolationForest on (N, 5) window feature vectors of trusted audio (see
+    compute_window_features), or on the synthetic profile if none are given, and
+    persists it to `path`. Returns the fitted detector.
+    """
+    import joblib
+    from sklearn.ensemble import IsolationForest
+    print("[Setup] Training Zero-Shot Anomaly Detector...")
+    X_train_normal = _synthetic_profile() if features is None else np.asarray(features, dtype=np.float64)
+    anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
+    anomaly_detector.fit(X_train_normal)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    joblib.dump(anomaly_detector, tmp_path)
+    os.replace(tmp_path, path) # Atomic, so concurrent stage processes never load half a file
+    print(f"[Setup] Anomaly Detector is ready (saved to {path}).")
+    return anomaly_detector
+
+def _load_anomaly_detector():
+    import joblib
+    if os.path.exists(MODEL_PATH):
+        try:
+            return joblib.load(MODEL_PATH)
+        except Exception as e:
+            print(f"!! [Zero-Shot] Could not load {MODEL_PATH} ({e}); retraining.")
+    return train_anomaly_detector()
+
+model_registry.register("zero_shot_detector", _load_anomaly_detector)
 # -----------------------------------------
 
-def extract_audio_features(audio_path):
-    """Extracts a simple feature vector from an audio file."""
+def compute_frame_features(y, sr=SAMPLE_RATE):
+    """
+    Per-STFT-frame features, shape (frames, 5) in FEATURE_NAMES order. The magnitude
+    spectrogram is computed ONCE and every spectral feature is derived from it; only the
+    zero-crossing rate comes from the waveform (it is a time-domain feature).
+    """
+    import librosa # Imported lazily: it is slow to import
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    chroma = librosa.feature.chroma_stft(S=S ** 2, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH).mean(axis=0)
+    rms = librosa.feature.rms(S=S, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+    centroid = librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    bandwidth = librosa.feature.spectral_bandwidth(S=S, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH, centroid=centroid)[0]
+    zcr = librosa.feature.zero_crossing_rate(y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+    frames = min(len(chroma), len(rms), centroid.shape[1], len(bandwidth), len(zcr))
+    return np.stack([chroma[:frames], rms[:frames], centroid[0, :frames], bandwidth[:frames], zcr[:frames]], axis=1)
+
+def compute_window_features(audio, sr=SAMPLE_RATE, window_seconds=WINDOW_SECONDS):
+    """
+    Windowed feature vectors: the frame features averaged over consecutive windows of
+    `window_seconds` (the last one may be shorter). Returns (features (W, 5), starts (W,)
+    in seconds), or (None, None) if the features can't be extracted.
+    """
+    try:
+        y = load_audio(audio, sr)
+        frame_features = compute_frame_features(y, sr)
+    except Exception as e:
+        print(f"!! Could not extract audio features: {e}")
+        return None, None
+    frames_per_window = max(1, int(round(window_seconds * sr / HOP_LENGTH)))
+    starts = np.arange(0, len(frame_features), frames_per_window)
+    sums = np.add.reduceat(frame_features, starts, axis=0)
+    counts = np.diff(np.append(starts, len(frame_features)))[:, None]
+    return sums / counts, starts * HOP_LENGTH / sr
+
+def extract_audio_features(audio, sr=SAMPLE_RATE):
+    """
+    Extracts a simple feature vector from audio: either an already decoded float32 PCM
+    array at `sr` (the shared buffer) or a path to a media file. Returns shape (1, 5):
+    the whole clip's mean of every feature.
+    """
     try:
-        y, sr = librosa.load(audio_path)
-        # Extract a few simple features
-        chroma_stft = np.mean(librosa.feature.chroma_stft(y=y, sr=sr))
-        rmse = np.mean(librosa.feature.rms(y=y))
-        spec_cent = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-        spec_bw = np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr))
-        zero_crossing_rate = np.mean(librosa.feature.zero_crossing_rate(y))
-        
-        return np.array([[chroma_stft, rmse, spec_cent, spec_bw, zero_crossing_rate]])
+        y = load_audio(audio, sr)
+        return compute_frame_features(y, sr).mean(axis=0, keepdims=True)
     except Exception as e:
         print(f"!! Could not extract audio features: {e}")
         return None
 
-def run_zero_shot_detection(audio_path):
+def score_from_fraction(anomalous_fraction):
+    """0-100 score, low = anomalous: 90 for clean audio down to 25 if every window is an outlier."""
+    return int(round(90 - 65 * anomalous_fraction))
+
+def analyze_audio_anomalies(audio, sr=SAMPLE_RATE, window_seconds=WINDOW_SECONDS):
+    """
+    Scores every window of the audio in one batched call against the persisted detector.
+    Returns (score, timeline), where timeline is a list of
+    {"start", "end", "raw_score", "anomalous"} dicts, one per window.
+    """
+    y = load_audio(audio, sr)
+    with telemetry.span("zero_shot.features", audio_seconds=len(y) / sr):
+        features, starts = compute_window_features(y, sr, window_seconds)
+    if features is None or len(features) == 0:
+        return 50, [] # Neutral score if feature extraction fails
+
+    anomaly_detector = model_registry.get("zero_shot_detector")
+    # score_samples gives a raw anomaly score (lower is more anomalous). IsolationForest.predict()
+    # flags the windows below offset_, so one call yields both the scores and the verdicts.
+    with telemetry.span("zero_shot.score", windows=len(features)) as span:
+        raw_scores = anomaly_detector.score_samples(features)
+        anomalous = raw_scores < anomaly_detector.offset_
+        span.set(anomalous_windows=int(anomalous.sum()))
+
+    duration = len(y) / sr
+    ends = np.minimum(np.append(starts[1:], duration), duration)
+    timeline = [{"start": float(s), "end": float(e), "raw_score": float(r), "anomalous": bool(a)}
+                for s, e, r, a in zip(starts, ends, raw_scores, anomalous)]
+    return score_from_fraction(anomalous.mean()), timeline
+
+def run_zero_shot_detection(audio, sr=SAMPLE_RATE):
     """
     Analyzes audio features to detect anomalies (a form of Zero-Shot Learning).
+    `audio` is a float32 PCM array at `sr` or a path to a media file.
     Returns an anomaly score (0-100), where a low score is more anomalous.
     """
     print("-> [Add-On] Running Zero-Shot Anomaly Detection...")
-    features = extract_audio_features(audio_path)
-    if features is None:
-        return 50 # Neutral score if feature extraction fails
-
-    # The model returns +1 for inliers (normal) and -1 for outliers (anomalous).
-    prediction = anomaly_detector.predict(features)
-    # The score_samples gives a raw anomaly score. Lower is more anomalous.
-    anomaly_score_raw = anomaly_detector.score_samples(features)
-
-    # Let's convert this to a simple 0-100 score for our dashboard.
-    # This is a simplified conversion for the demo.
-    if prediction[0] == -1:
-        # It's an anomaly, give it a low score
-        final_score = 25
-    else:
-        # It's normal, give it a high score
-        final_score = 90
-        
-    print(f"-> [Add-On] Zero-Shot Anomaly Score: {final_score}/100")
+    final_score, timeline = analyze_audio_anomalies(audio, sr)
+    flagged = sum(w["anomalous"] for w in timeline)
+    print(f"-> [Add-On] Zero-Shot Anomaly Score: {final_score}/100 ({flagged}/{len(timeline)} windows anomalous)")
     return final_score
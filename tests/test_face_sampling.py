@@ -0,0 +1,63 @@
+# tests/test_face_sampling.py
+import pytest
+
+pytest.importorskip("cv2")
+
+from modules import face_analyzer
+from modules.face_analyzer import (CI_MAX_WIDTH, COARSE_SAMPLES, FacialConsistencyCollector, plan_refinement,
+                                   wilson_interval)
+
+
+class _CoarsePassCollector(FacialConsistencyCollector):
+    """A collector frozen right after its coarse pass, with the given per-frame distances."""
+
+    def __init__(self, sample_ids, distances, max_frames_to_check=48):
+        self.adaptive = True
+        self.max_frames_to_check = max_frames_to_check
+        self.total_frames_checked = len(sample_ids)
+        self.sample_hists = dict.fromkeys(sample_ids)
+        self.min_gap = 1
+        self.rounds = 1
+        self.stopped_early = False
+        self.track, self.previous_hist = None, None
+        self.distances = distances
+
+    def _distances(self):
+        return self.distances
+
+    def _shot_cuts(self, sample_ids):
+        return set()
+
+
+def _coarse_ids(total_frames=900):
+    return [int(i * (total_frames - 1) / (COARSE_SAMPLES - 1)) for i in range(COARSE_SAMPLES)]
+
+
+def test_clean_video_is_tight_after_the_coarse_pass():
+    low, high = wilson_interval(COARSE_SAMPLES, COARSE_SAMPLES)
+    assert high - low <= CI_MAX_WIDTH
+    ids = _coarse_ids()
+    distances = dict.fromkeys(ids, 0.1)
+    assert plan_refinement(ids, distances, set(), min_gap=1, limit=48 - len(ids)) == []
+    # refine() must stop without opening the (nonexistent) video for another round
+    collector = _CoarsePassCollector(ids, distances)
+    collector.refine("does-not-exist.mp4")
+    assert collector.stopped_early
+    assert collector.total_frames_checked <= 20 # The old fixed cost
+
+
+def test_faceless_video_stops_after_the_coarse_pass():
+    assert wilson_interval(0, 0) == (0.0, 1.0) # No faces never gives a tight estimate...
+    ids = _coarse_ids()
+    collector = _CoarsePassCollector(ids, {})
+    collector.refine("does-not-exist.mp4") # ...so refine() has to stop on its own
+    assert collector.stopped_early
+    assert collector.total_frames_checked == COARSE_SAMPLES
+
+
+def test_suspicious_gaps_are_refined_first():
+    ids = _coarse_ids()
+    distances = dict.fromkeys(ids, 0.1)
+    distances[ids[5]] = face_analyzer.MATCH_THRESHOLD + 0.02
+    picks = plan_refinement(ids, distances, set(), min_gap=1, limit=4)
+    assert set(picks[:2]) == {(ids[4] + ids[5]) // 2, (ids[5] + ids[6]) // 2}
@@ -0,0 +1,54 @@
+# tests/test_live_windows.py
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from modules.face_analyzer import MATCH_THRESHOLD, SlidingEmbeddingWindow
+from modules.gaze_analyzer import EAR_THRESHOLD, BlinkCounter, gaze_score_from_bpm
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_sliding_embedding_window_tracks_the_anchor_identity():
+    window = SlidingEmbeddingWindow(window_seconds=10, max_embeddings=8, anchor_faces=3)
+    assert window.consistency() == 75 # Neutral until there are two faces
+    speaker = _unit([1, 0, 0, 0])
+    for t in range(5):
+        window.add(float(t), speaker)
+    assert window.consistency() == 100
+    np.testing.assert_allclose(window.reference, speaker, atol=1e-6)
+
+    # Another identity takes over; the reference stays the anchor's, so consistency collapses
+    impostor = _unit([0, 1, 0, 0])
+    for t in range(5, 25):
+        window.add(float(t), impostor)
+    assert len(window.entries) <= 8
+    assert min(t for t, _ in window.entries) >= 24 - 10
+    assert (window.distances() >= MATCH_THRESHOLD).all()
+    assert window.consistency() == 0
+
+
+def test_blink_counter_counts_onsets_in_the_rolling_window():
+    counter = BlinkCounter(window_seconds=60, threshold=EAR_THRESHOLD)
+    assert counter.blinks_per_minute() is None and counter.score() == 50
+    open_ear, closed_ear = EAR_THRESHOLD + 0.1, EAR_THRESHOLD - 0.1
+    blinks = 0
+    # 60 s at 15 fps, a 0.2 s blink every 3 s (20/min), with a dropped face mid-blink now and then
+    for i in range(900):
+        t = i / 15
+        ear = closed_ear if (t % 3) < 0.2 else open_ear
+        if i % 45 == 1:
+            ear = np.nan # No face: keeps the previous state, so it must not split or add a blink
+        blinks += counter.update(t, ear)
+    assert blinks == 20
+    assert counter.blinks_per_minute() == pytest.approx(20, rel=0.05)
+    assert counter.score() == gaze_score_from_bpm(counter.blinks_per_minute()) == 95
+
+    # Once the blinks age out of the window, only the recent ones count
+    for i in range(900, 1800):
+        counter.update(i / 15, open_ear)
+    assert counter.blinks_per_minute() == 0
@@ -0,0 +1,48 @@
+# tests/test_text_triage.py
+import pytest
+
+from modules import text_triage
+
+# Real threats and scams with none of the lexicon's urgency or emotion words: the triage must
+# never wave these through as "clearly low-risk", only the LLM can judge them
+NON_LEXICAL_THREATS = [
+    "Send me the gift card codes and I will release your son, tell no one.",
+    "The polls were rigged by foreign agents and the results are fake.",
+    "The vaccine contains microchips that let the government track everyone who takes it.",
+    "Martial law will be declared next week and the army will seize all private firearms.",
+    "Officials confirmed that martial law starts on Monday and travel permits will be required.",
+    "Meet me behind the school after class and bring the money, or your sister gets hurt.",
+]
+
+
+@pytest.mark.parametrize("text", NON_LEXICAL_THREATS)
+def test_non_lexical_threats_escalate(text):
+    result = text_triage.triage(text)
+    assert result["escalate_risk"]
+    assert result["risk_verdict"] is None
+
+
+def test_alarmist_text_is_decided_locally():
+    result = text_triage.triage("URGENT!!! The banks are collapsing, withdraw your money NOW before it's too late! Share this!")
+    assert result["risk_verdict"] == "high"
+    assert not result["escalate_risk"]
+
+
+def test_long_texts_never_get_a_local_low_verdict():
+    text = " ".join(["According to officials, the quarterly data was published in a statement."] * 10)
+    assert text_triage.triage(text)["risk_verdict"] != "low"
+
+
+def test_band_is_calibrated_on_the_held_out_corpus():
+    for text, risky, _ in text_triage.HELD_OUT_CORPUS:
+        verdict = text_triage.triage(text)["risk_verdict"]
+        assert verdict != ("low" if risky else "high"), text
+
+
+def test_calibrate_band_only_tightens():
+    import numpy as np
+    probabilities = np.array([0.1, 0.9, 0.5, 0.95])
+    low, high = text_triage.calibrate_band(probabilities, np.array([1, 0, 0, 1]), low=0.25, high=0.75, margin=0.5)
+    assert low == pytest.approx(0.05)
+    assert high == pytest.approx(0.95)
+    assert text_triage.calibrate_band(np.array([0.9, 0.1]), np.array([1, 0]), low=0.25, high=0.75) == (0.25, 0.75)